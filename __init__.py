@@ -1,8 +1,5 @@
 # your_project/__init__.py
 
-# Import necessary modules and classes
-from .scripts.arbitrage_agent import ArbitrageAgent
-
 # Placeholder for configuration settings
 CONFIG = {
     "contract_address": "0xYourContractAddress",  # Replace with your contract address
@@ -23,5 +20,10 @@ def initialize():
     print(f"Provider URL: {provider_url}")
     print(f"Private Key: {private_key}")
 
-# Call the initialization function when the package is imported
-initialize()
+# Import heavy modules only when they are first accessed, so importing the
+# package stays cheap and has no side effects (call initialize() explicitly)
+def __getattr__(name):
+    if name == "ArbitrageAgent":
+        from .script.ArbitrageAgent import ArbitrageAgent
+        return ArbitrageAgent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
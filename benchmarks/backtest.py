@@ -0,0 +1,95 @@
+# /home/uber/Desktop/quantum/benchmarks/backtest.py
+"""
+Record reserve snapshots and replay them through the agent, fully offline.
+
+`record` steps a seeded synthetic market block by block and writes each
+block's reserves with ReserveRecorder. `replay` runs a recording through
+build_graph -> detect_arbitrage -> sizing with stand-in web3/contract objects
+and reports blocks/s, opportunities per block and PnL net of gas, with each
+block's orders filled on the next recorded block.
+
+    python benchmarks/backtest.py record reserves.bin [--tokens 200] [--pools 800] [--blocks 1000]
+    python benchmarks/backtest.py replay reserves.bin [--sizing constant_product] [--max-blocks N] [--fetch]
+                                                      [--gas-token ADDRESS]
+"""
+import argparse
+import json
+import logging
+import sys
+import tempfile
+
+from synthetic_market import SyntheticMarket, make_offline_agent
+
+
+def record(args):
+    from data.ReserveRecorder import ReserveRecorder
+
+    market = SyntheticMarket(args.tokens, args.pools, num_cycles=max(1, args.tokens // 50), seed=args.seed)
+    recorder = ReserveRecorder(args.path)
+    try:
+        for _ in range(args.blocks):
+            recorder.record(market.block_number, market.reserves(), market.timestamp)
+            market.step(args.fraction)
+    finally:
+        recorder.close()
+    print(f"Recorded {args.blocks} blocks of {len(market.pools)} pools to {args.path}")
+    return 0
+
+
+def replay(args):
+    from data.Backtest import Backtester
+    from data.ReserveRecorder import ReserveReplay
+
+    source = ReserveReplay(args.path)
+    with tempfile.TemporaryDirectory() as workdir:
+        agent = make_offline_agent(source, workdir, sizing_backend=args.sizing)
+        try:
+            report = Backtester(agent, source, gas_token=args.gas_token).run(args.max_blocks, fetch=args.fetch)
+        finally:
+            agent.close()
+
+    print(f"{report['blocks']} blocks in {report['seconds']:.2f} s: {report['blocks_per_sec']:.1f} blocks/s, "
+          f"{report['opportunities_per_block']:.2f} opportunities/block, {report['trades']} simulated trades "
+          f"({report['reverted']} reverted, {report['unfilled']} unfilled)")
+    for token, profit in sorted(report["pnl"].items(), key=lambda item: -item[1]):
+        net = report["net_pnl"].get(token)
+        print(f"  PnL {token}: gross {profit:.6g}, net {'unpriced' if net is None else f'{net:.6g}'}")
+    print(f"  Gas cost: {report['gas_cost_wei'] / 1e18:.6f} ETH "
+          f"({report['unpriced_gas_wei'] / 1e18:.6f} ETH on tokens without a rate)")
+    print(f"  Net PnL: {report['net_pnl_gas_token'] / 1e18:.6f} in gas token {report['gas_token']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="record a synthetic market")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--tokens", type=int, default=200)
+    record_parser.add_argument("--pools", type=int, default=800)
+    record_parser.add_argument("--blocks", type=int, default=1000)
+    record_parser.add_argument("--fraction", type=float, default=0.01, help="share of pools swapped per block")
+    record_parser.add_argument("--seed", type=int, default=0)
+    record_parser.set_defaults(handler=record)
+
+    replay_parser = commands.add_parser("replay", help="replay a recording through the agent")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--sizing", default="constant_product", help="ArbitrageAgent sizing backend")
+    replay_parser.add_argument("--max-blocks", type=int)
+    replay_parser.add_argument("--fetch", action="store_true", help="read reserves through the stub contract")
+    replay_parser.add_argument("--gas-token", help="token gas is paid in (default: best-connected token)")
+    replay_parser.add_argument("--json", help="also write the report as JSON")
+    replay_parser.set_defaults(handler=replay)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# /home/uber/Desktop/quantum/benchmarks/detection.py
+"""
+Detection pipeline benchmark over seeded synthetic markets.
+
+For each market size it times build_graph (full and incremental),
+detect_arbitrage, the short-cycle index fast path, path sizing, and the
+DEXAggregator Bellman-Ford and loan sizing, then reports latency percentiles,
+throughput and how many planted cycles were found (failing below
+--min-recall). Results can be saved as a JSON baseline and later runs
+compared against it.
+
+    python benchmarks/detection.py [--sizes 50x150,200x800] [--repeat 20] [--workers 4] [--hubs 8]
+                                   [--save baseline.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from synthetic_market import SyntheticMarket, make_offline_agent
+
+DEFAULT_SIZES = "50x150,200x800,1000x4000,5000x20000"
+AGGREGATOR_MAX_TOKENS = 500  # The aggregator engine is dense (V x V), keep it to small markets
+
+
+def measure(fn, repeat, setup=None):
+    """Latency summary of `repeat` calls to fn, with optional untimed setup before each."""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples = np.array(samples)
+    return {
+        "p50_ms": float(np.percentile(samples, 50) * 1000),
+        "p90_ms": float(np.percentile(samples, 90) * 1000),
+        "p99_ms": float(np.percentile(samples, 99) * 1000),
+        "mean_ms": float(samples.mean() * 1000),
+        "ops_per_sec": float(1.0 / samples.mean()) if samples.mean() > 0 else float("inf"),
+    }
+
+
+def canonical(path):
+    """Rotation-independent key of a closed path."""
+    cycle = list(path[:-1])
+    pivot = cycle.index(min(cycle))
+    return tuple(cycle[pivot:] + cycle[:pivot])
+
+
+def run_size(num_tokens, num_pools, repeat, seed, workers=0, hubs=None):
+    from data.Aggregator import DEXAggregator
+    from data.ShardedDetector import ShardedCycleDetector
+
+    market = SyntheticMarket(num_tokens, num_pools, num_cycles=max(1, num_tokens // 50), seed=seed)
+    results = {"tokens": num_tokens, "pools": len(market.pools), "stages": {}}
+    stages = results["stages"]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        agent = make_offline_agent(market, workdir)
+        try:
+            reserves = market.reserves()
+            stages["build_graph"] = measure(lambda: agent.build_graph(incremental=False, reserves=reserves), repeat)
+
+            pending = {}
+
+            def next_block():
+                market.step(0.01)
+                pending["reserves"] = market.reserves()
+
+            stages["build_graph_incremental"] = measure(
+                lambda: agent.build_graph(incremental=True, reserves=pending["reserves"]), repeat, setup=next_block)
+
+            agent.build_graph(incremental=False, reserves=market.reserves())
+            stages["detect_arbitrage"] = measure(agent.detect_arbitrage, repeat)
+            if workers > 1:
+                graph = agent.arbitrage_graph
+                inline = ShardedCycleDetector(1)
+                stages["detect_sharded_1"] = measure(lambda: inline.negative_cycles(graph), repeat)
+                detector = ShardedCycleDetector(workers, hubs=hubs, min_parallel_edges=0)
+                try:
+                    # The first call pays for starting the pool
+                    results["sharded_match"] = detector.negative_cycles(graph) == inline.negative_cycles(graph)
+                    stages[f"detect_sharded_{workers}"] = measure(lambda: detector.negative_cycles(graph), repeat)
+                finally:
+                    detector.close()
+                results["sharded_speedup"] = (stages["detect_sharded_1"]["p50_ms"]
+                                              / stages[f"detect_sharded_{workers}"]["p50_ms"])
+            paths = agent.detect_arbitrage()
+
+            short_workdir = os.path.join(workdir, "short_cycles")
+            os.makedirs(short_workdir)
+            short_agent = make_offline_agent(market, short_workdir, short_cycles=True)
+            try:
+                short_agent.build_graph(incremental=False, reserves=market.reserves())
+                stages["short_cycles_incremental"] = measure(
+                    lambda: short_agent.build_graph(incremental=True, reserves=pending["reserves"]), repeat,
+                    setup=next_block)
+                stages["detect_short_cycles"] = measure(short_agent.detect_short_cycles, repeat)
+            finally:
+                short_agent.close()
+            stages["size_paths"] = measure(lambda: agent.score_paths(paths), repeat)
+
+            found = {canonical(path) for path in paths}
+            hops = {hop for path in paths for hop in zip(path, path[1:])}
+            results["cycles_found"] = len(paths)
+            results["planted_found"] = sum(canonical(path) in found for path in market.planted_cycles)
+            # A planted cycle is covered when some reported cycle trades its mispriced hop
+            results["planted_covered"] = sum((path[-2], path[0]) in hops for path in market.planted_cycles)
+            results["planted"] = len(market.planted_cycles)
+        finally:
+            agent.close()
+
+    if num_tokens <= AGGREGATOR_MAX_TOKENS:
+        aggregator = DEXAggregator("offline")
+        aggregator.logger.setLevel(logging.WARNING)
+        pairs = market.aggregator_payload()["pairs"]
+        prices = [pair["price"] for pair in pairs]
+        liquidity = [pair["liquidity"] for pair in pairs]
+        stages["bellman_ford_arbitrage"] = measure(lambda: aggregator.bellman_ford_arbitrage(prices, liquidity), repeat)
+        distance, _, _ = aggregator.bellman_ford_arbitrage(prices, liquidity)
+        index = {token: i for i, token in enumerate(market.tokens)}
+        cycles = [[index[token] for token in path[:-1]] for path in market.planted_cycles]
+        pair_reserves = {(index[token0], index[token1]): tuple(reserves)
+                         for (token0, token1), reserves in market.pools.items()}
+        stages["calculate_optimal_loan_size"] = measure(
+            lambda: aggregator.calculate_optimal_loan_size(prices, liquidity, distance, cycles,
+                                                           pair_reserves=pair_reserves), repeat)
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return regressions: stages whose p50 is more than `tolerance` x the baseline p50."""
+    regressions = []
+    previous = {(r["tokens"], r["pools"]): r for r in baseline["results"]}
+    for result in results:
+        base = previous.get((result["tokens"], result["pools"]))
+        if base is None:
+            continue
+        for stage, stats in result["stages"].items():
+            base_stats = base["stages"].get(stage)
+            if base_stats and stats["p50_ms"] > tolerance * base_stats["p50_ms"]:
+                regressions.append(f"{result['tokens']}x{result['pools']} {stage}: "
+                                   f"{stats['p50_ms']:.2f} ms vs {base_stats['p50_ms']:.2f} ms baseline")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated TOKENSxPOOLS list")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="fail if slower than this JSON baseline")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="also time sharded detection on this many processes against one")
+    parser.add_argument("--hubs", type=int, help="block the giant component around this many hub tokens")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed p50 slowdown factor")
+    parser.add_argument("--min-recall", type=float, default=0.9,
+                        help="fail if fewer than this share of planted cycles are covered")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    for size in args.sizes.split(","):
+        num_tokens, num_pools = (int(n) for n in size.lower().split("x"))
+        result = run_size(num_tokens, num_pools, args.repeat, args.seed, args.workers, args.hubs)
+        results.append(result)
+        print(f"{num_tokens} tokens / {result['pools']} pools: "
+              f"{result['planted_found']}/{result['planted']} planted cycles found "
+              f"({result['planted_covered']} covered), {result['cycles_found']} total")
+        if "sharded_speedup" in result:
+            print(f"  sharded detection on {args.workers} workers: {result['sharded_speedup']:.2f}x vs one process, "
+                  f"cycles {'match' if result['sharded_match'] else 'DIFFER'}")
+        for stage, stats in result["stages"].items():
+            print(f"  {stage:<28} p50 {stats['p50_ms']:9.3f} ms  p90 {stats['p90_ms']:9.3f} ms  "
+                  f"p99 {stats['p99_ms']:9.3f} ms  {stats['ops_per_sec']:10.1f} ops/s")
+
+    report = {"python": sys.version.split()[0], "numpy": np.__version__, "seed": args.seed,
+              "repeat": args.repeat, "results": results}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    low_recall = [r for r in results if r["planted_covered"] < args.min_recall * r["planted"]]
+    for result in low_recall:
+        print(f"LOW RECALL {result['tokens']}x{result['pools']}: "
+              f"{result['planted_covered']}/{result['planted']} planted cycles covered")
+    # Sharded detection must find exactly what one process finds
+    mismatched = [r for r in results if r.get("sharded_match") is False]
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 1 if low_recall or mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# /home/uber/Desktop/quantum/benchmarks/import_time.py
+"""
+Import-time budget check.
+
+Imports each module in a fresh interpreter, takes the best of several runs, and
+exits non-zero if any module is slower than its budget or drags in an ML
+framework at import time.
+
+    python benchmarks/import_time.py [--budget SECONDS] [--repeat N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds allowed for a cold import of each module
+BUDGETS = {
+    "data.Metrics": 0.2,
+    "data.Cache": 0.5,
+    "data.TokenGraph": 0.5,
+    "data.FeatureStore": 0.5,
+    "data.TradeJournal": 0.5,
+    "data.NonceManager": 0.5,
+    "data.GasOracle": 0.5,
+    "data.TxBuilder": 1.5,
+    "data.HedgedProvider": 1.5,
+    "data.ConstantProductSolver": 0.5,
+    "data.ShardedDetector": 0.5,
+    "data.ShortCycleIndex": 0.5,
+    "data.PendingState": 0.5,
+    "data.PairStream": 0.5,
+    "data.ReserveRecorder": 0.5,
+    "data.Backtest": 0.5,
+    "data.Aggregator": 1.0,
+    "script.ArbitrageAgent": 2.0,
+    "data.Monitoring": 2.0,
+}
+
+# Modules that must only be loaded when an ML backend is actually used
+FORBIDDEN = ("tensorflow", "keras", "sklearn", "pandas")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": sorted(m for m in {forbidden!r} if m in sys.modules)}}))
+"""
+
+
+def measure(module, repeat):
+    """Best-of-`repeat` cold import time of a module, plus any forbidden modules it loaded."""
+    best, loaded = float("inf"), []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, forbidden=FORBIDDEN)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        best = min(best, sample["seconds"])
+        loaded = sample["loaded"]
+    return best, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", type=float, help="override the per-module budget (seconds)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module, budget in BUDGETS.items():
+        budget = args.budget or budget
+        try:
+            seconds, loaded = measure(module, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"FAIL {module}: import error\n{e.stderr}")
+            failed = True
+            continue
+        ok = seconds <= budget and not loaded
+        failed |= not ok
+        note = f" (loaded {', '.join(loaded)})" if loaded else ""
+        print(f"{'ok  ' if ok else 'FAIL'} {module}: {seconds * 1000:.0f} ms / {budget * 1000:.0f} ms budget{note}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
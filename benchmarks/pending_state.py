@@ -0,0 +1,113 @@
+# /home/uber/Desktop/quantum/benchmarks/pending_state.py
+"""
+Pending-state re-scoring against a stand-in mempool.
+
+Every round the synthetic market moves, the agent detects and sizes its
+orders, and then pending router swaps show up in a StubMempool: competing
+swaps that run through the hops of some of the candidate cycles, plus random
+background swaps. The orders are filtered by ArbitrageAgent.still_profitable,
+the pending swaps are mined into the market, and every order's real outcome
+is computed on the mined reserves. Reports how many orders would have
+reverted with and without the filter and how long the re-scoring takes.
+
+    python benchmarks/pending_state.py [--tokens 500] [--pools 2000] [--rounds 50]
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from synthetic_market import StubMempool, SyntheticMarket, make_offline_agent
+
+
+def realized_profits(market, orders, fee=0.003):
+    """Profit of each (path, amount) order on the market's current reserves."""
+    from data.ConstantProductSolver import ConstantProductSolver
+    from data.TokenGraph import TokenGraph
+
+    graph = TokenGraph()
+    graph.set_pools((token0, token1, reserve0, reserve1) for (token0, token1), (reserve0, reserve1) in market.pools.items())
+    reserve_in, reserve_out, mask, valid = graph.path_reserves([path for path, _ in orders])
+    amount_in = np.array([float(amount) for _, amount in orders])
+    amount_out = ConstantProductSolver(fee).simulate(reserve_in, reserve_out, amount_in, mask)
+    return np.where(valid, amount_out - amount_in, 0.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--pools", type=int, default=2000)
+    parser.add_argument("--cycles", type=int, default=20, help="planted cycles")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--compete", type=float, default=0.5, help="share of candidate cycles hit by a pending swap")
+    parser.add_argument("--background", type=int, default=50, help="random pending swaps per round")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    market = SyntheticMarket(args.tokens, args.pools, num_cycles=args.cycles, edge=0.05, seed=args.seed)
+    mempool = StubMempool(market)
+    rng = np.random.default_rng(args.seed + 1)
+    pairs = list(market.pools)
+    orders_total = kept_total = reverted_without = reverted_with = missed = 0
+    samples = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        agent = make_offline_agent(market, workdir, pending_feed=mempool)
+        try:
+            for round_number in range(args.rounds):
+                market.step(0.01)
+                # Re-open some edges so every round has candidates
+                for cycle in market.planted_cycles:
+                    last, first = cycle[-2], cycle[0]
+                    pool = market.pools.get((last, first))
+                    if pool is not None:
+                        pool[1] *= 1.0 + rng.uniform(0.0, 0.02)
+                agent.on_new_block(market.block_number)
+                agent.build_graph(incremental=round_number > 0, reserves=market.reserves())
+                paths = agent.detect_arbitrage()
+                amounts = agent.score_paths(paths)
+                orders = [(path, amount) for path, amount in zip(paths, amounts) if amount is not None and amount > 0]
+                if not orders:
+                    continue
+
+                # Competing searchers trade along the first hop of some candidate cycles
+                for path, amount in orders:
+                    if rng.random() < args.compete:
+                        mempool.submit(path[:2], amount * rng.uniform(0.5, 5.0))
+                for k in rng.choice(len(pairs), min(args.background, len(pairs)), replace=False):
+                    token0, token1 = pairs[k] if rng.random() < 0.5 else pairs[k][::-1]
+                    reserve_in = market.pools[pairs[k]][0 if token0 == pairs[k][0] else 1]
+                    mempool.submit([token0, token1], reserve_in * rng.uniform(0.0, 0.01))
+
+                start = time.perf_counter()
+                keep = agent.still_profitable(orders)
+                samples.append(time.perf_counter() - start)
+
+                mempool.land()
+                profits = realized_profits(market, orders)
+                orders_total += len(orders)
+                kept_total += sum(keep)
+                reverted_without += int((profits <= 0).sum())
+                reverted_with += sum(ok and profit <= 0 for ok, profit in zip(keep, profits.tolist()))
+                missed += sum(not ok and profit > 0 for ok, profit in zip(keep, profits.tolist()))
+        finally:
+            agent.close()
+
+    samples = np.array(samples) if samples else np.zeros(1)
+    print(f"{args.tokens} tokens / {len(market.pools)} pools, {args.rounds} rounds: {orders_total} orders")
+    print(f"  sent without re-scoring  {orders_total:6d}, reverted {reverted_without:6d}")
+    print(f"  sent with re-scoring     {kept_total:6d}, reverted {reverted_with:6d}, "
+          f"profitable orders dropped {missed}")
+    print(f"  still_profitable         p50 {np.percentile(samples, 50) * 1000:8.3f} ms  "
+          f"p99 {np.percentile(samples, 99) * 1000:8.3f} ms")
+    return 0 if reverted_with <= reverted_without else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
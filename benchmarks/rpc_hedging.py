@@ -0,0 +1,188 @@
+# /home/uber/Desktop/quantum/benchmarks/rpc_hedging.py
+"""
+Hedged RPC provider against local stand-in JSON-RPC nodes with injected delays.
+
+Starts several in-process JSON-RPC servers, each with a base latency and a
+probability of a slow "hiccup" response, then compares read latency through a
+single endpoint with HedgedHTTPProvider over all of them, and checks that a
+raw transaction reaches every node, that a reverting call is answered by the
+first node instead of being hedged, and that a pending-transaction filter
+keeps working across polls (filters only exist on the node that created them).
+
+    python benchmarks/rpc_hedging.py [--requests 300] [--hedge-delay 0.02]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import synthetic_market  # noqa: F401  (puts the repository root on sys.path)
+
+REVERTING_CALL = "0xdeadbeef"  # eth_call data every node answers with "execution reverted"
+
+
+class StubNode:
+    """Local JSON-RPC server answering a few eth_* methods after an injected delay."""
+
+    def __init__(self, delay=0.005, hiccup_rate=0.0, hiccup_delay=0.25, fail_rate=0.0, error_rate=0.0, seed=0):
+        self.delay = delay
+        self.hiccup_rate = hiccup_rate
+        self.hiccup_delay = hiccup_delay
+        self.fail_rate = fail_rate
+        self.error_rate = error_rate  # Share of reads answered with a JSON-RPC error, like a lagging node
+        self.rng = random.Random(seed)
+        self.received = []  # Raw transactions sent to this node
+        self.filters = set()  # Filter ids created on this node
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                roll = node.rng.random()
+                time.sleep(node.hiccup_delay if roll < node.hiccup_rate else node.delay)
+                if node.rng.random() < node.fail_rate:
+                    self.send_error(503)
+                    return
+                if isinstance(request, list):
+                    body = [node.answer(item) for item in request]
+                else:
+                    body = node.answer(request)
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def answer(self, request):
+        method, params = request["method"], request.get("params", [])
+        results = {
+            "eth_blockNumber": hex(1000),
+            "eth_chainId": hex(1337),
+            "eth_gasPrice": hex(30 * 10**9),
+            "eth_getTransactionCount": hex(0),
+            "eth_call": "0x" + "00" * 96,
+            "web3_clientVersion": "stub-node",
+        }
+        if method == "eth_sendRawTransaction":
+            self.received.append(params[0])
+            return {"jsonrpc": "2.0", "id": request["id"], "result": "0x" + "ab" * 32}
+        if method == "eth_newPendingTransactionFilter":
+            filter_id = hex(self.rng.getrandbits(64))
+            self.filters.add(filter_id)
+            return {"jsonrpc": "2.0", "id": request["id"], "result": filter_id}
+        if method == "eth_call" and params[0].get("data") == REVERTING_CALL:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": 3, "message": "execution reverted"}}
+        if method == "eth_getFilterChanges":
+            if params[0] not in self.filters:
+                return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32000, "message": "filter not found"}}
+            return {"jsonrpc": "2.0", "id": request["id"], "result": []}
+        if self.rng.random() < self.error_rate:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32000, "message": "header not found"}}
+        if method not in results:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": "method not found"}}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": results[method]}
+
+    def close(self):
+        self.server.shutdown()
+
+
+def latency_summary(samples):
+    samples = np.array(samples) * 1000
+    return f"p50 {np.percentile(samples, 50):7.2f} ms  p99 {np.percentile(samples, 99):7.2f} ms  max {samples.max():7.2f} ms"
+
+
+def time_reads(read, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        read()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--hedge-delay", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    from web3 import Web3
+
+    from data.HedgedProvider import HedgedHTTPProvider
+
+    nodes = [
+        StubNode(delay=0.004, hiccup_rate=0.05, hiccup_delay=0.3, seed=1),
+        StubNode(delay=0.006, hiccup_rate=0.05, hiccup_delay=0.3, seed=2),
+        StubNode(delay=0.008, fail_rate=0.1, seed=3),
+        StubNode(delay=0.002, error_rate=0.5, seed=4),
+    ]
+    try:
+        single = Web3(Web3.HTTPProvider(nodes[0].url))
+        single_samples = time_reads(lambda: single.eth.block_number, args.requests)
+
+        provider = HedgedHTTPProvider([node.url for node in nodes], hedge_delay=args.hedge_delay)
+        hedged = Web3(provider)
+        read_errors = 0
+
+        def read():
+            nonlocal read_errors
+            try:
+                hedged.eth.block_number
+            except Exception:
+                read_errors += 1
+
+        hedged_samples = time_reads(read, args.requests)
+
+        print(f"single endpoint  {latency_summary(single_samples)}")
+        print(f"hedged x{len(nodes)}        {latency_summary(hedged_samples)}")
+        for url, stats in provider.stats().items():
+            print(f"  {url}: {stats['latency'] * 1000:6.2f} ms avg, {stats['requests']} requests, "
+                  f"{stats['errors']} errors, {stats['wins']} wins")
+        print(f"hedged reads that failed: {read_errors}/{args.requests}")
+
+        # A revert is the node's answer, not a node failure: it is returned without hedging
+        sent_before = sum(stats["requests"] for stats in provider.stats().values())
+        reverting = {"jsonrpc": "2.0", "id": 1, "method": "eth_call",
+                     "params": [{"to": "0x" + "00" * 20, "data": REVERTING_CALL}, "latest"]}
+        reverts = sum("error" in provider.request(reverting) for _ in range(20))
+        sent = sum(stats["requests"] for stats in provider.stats().values()) - sent_before
+        print(f"reverting calls answered with the revert: {reverts}/20, {sent} requests sent")
+
+        pending_filter = hedged.eth.filter("pending")
+        filter_errors = 0
+        for _ in range(20):
+            try:
+                pending_filter.get_new_entries()
+            except Exception:
+                filter_errors += 1
+        print(f"pending filter polls that failed: {filter_errors}/20")
+
+        hedged.eth.send_raw_transaction("0x" + "12" * 40)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and not all(node.received for node in nodes):
+            time.sleep(0.01)
+        reached = sum(bool(node.received) for node in nodes)
+        print(f"raw transaction reached {reached}/{len(nodes)} nodes")
+        provider.close()
+        ok = reached == len(nodes) and read_errors == 0 and filter_errors == 0 and reverts == 20
+        return 0 if ok else 1
+    finally:
+        for node in nodes:
+            node.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
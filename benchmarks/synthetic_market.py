@@ -0,0 +1,243 @@
+# /home/uber/Desktop/quantum/benchmarks/synthetic_market.py
+"""
+Seeded synthetic market and offline stand-ins for the chain.
+
+SyntheticMarket generates N tokens and M constant-product pools whose reserves
+agree with a hidden price vector, then plants a configurable number of
+profitable cycles on top. StubWeb3/StubContract serve that market through the
+small subset of the web3 API ArbitrageAgent uses, and StubMempool stands in
+for the pending transaction feed, so the agent runs fully offline.
+"""
+import os
+import sys
+
+import numpy as np
+from eth_account import Account
+from eth_utils import keccak
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CONTRACT_ADDRESS = "0x" + "c0" * 20
+PRIVATE_KEY = "0x" + "4b" * 32
+ROUTER_ADDRESS = "0x" + "7a" * 20
+
+STUB_ABI = [
+    {"type": "function", "name": "getTokenPairs", "stateMutability": "view", "inputs": [],
+     "outputs": [{"name": "", "type": "address[2][]"}]},
+    {"type": "function", "name": "getReserves", "stateMutability": "view",
+     "inputs": [{"name": "token0", "type": "address"}, {"name": "token1", "type": "address"}],
+     "outputs": [{"name": "reserve0", "type": "uint112"}, {"name": "reserve1", "type": "uint112"},
+                 {"name": "blockTimestampLast", "type": "uint32"}]},
+    {"type": "function", "name": "executeArbitrage", "stateMutability": "nonpayable",
+     "inputs": [{"name": "path", "type": "address[]"}, {"name": "minAmountOut", "type": "uint256"}],
+     "outputs": []},
+]
+
+
+class SyntheticMarket:
+    """
+    Seeded pool market with planted arbitrage cycles.
+
+    Pool depths (in quote value) are log-normal around depth_mean; every pool is
+    priced consistently with a hidden log-normal price vector, except that each
+    planted cycle gets one hop whose output reserve is boosted by `edge`.
+    """
+
+    def __init__(self, num_tokens=100, num_pools=300, num_cycles=5, cycle_length=3, edge=0.02,
+                 depth_mean=1e21, depth_sigma=1.0, seed=0):
+        max_pools = num_tokens * (num_tokens - 1) // 2
+        if num_pools > max_pools:
+            raise ValueError(f"{num_tokens} tokens support at most {max_pools} pools")
+        self.rng = np.random.default_rng(seed)
+        self.tokens = [f"0x{i + 1:040x}" for i in range(num_tokens)]
+        self.prices = self.rng.lognormal(0.0, 1.5, num_tokens)
+        self.depth_mean = depth_mean
+        self.depth_sigma = depth_sigma
+        self.block_number = 1
+        self.timestamp = 1_700_000_000
+
+        self.pools = {}  # (token0, token1) -> [reserve0, reserve1]
+        while len(self.pools) < num_pools:
+            i, j = self.rng.choice(num_tokens, 2, replace=False)
+            if (self.tokens[j], self.tokens[i]) not in self.pools:
+                self._set_consistent_pool(i, j)
+
+        self.planted_cycles = []
+        for _ in range(num_cycles):
+            cycle = self.rng.choice(num_tokens, cycle_length, replace=False).tolist()
+            for i, j in zip(cycle, cycle[1:] + cycle[:1]):
+                self._set_consistent_pool(i, j)
+            last, first = cycle[-1], cycle[0]
+            self.pools[(self.tokens[last], self.tokens[first])][1] *= 1 + edge
+            self.planted_cycles.append([self.tokens[i] for i in cycle + cycle[:1]])
+
+    def _set_consistent_pool(self, i, j):
+        """Create (or replace) the pool i/j with reserves matching the hidden prices."""
+        self.pools.pop((self.tokens[j], self.tokens[i]), None)
+        depth = self.rng.lognormal(np.log(self.depth_mean), self.depth_sigma)
+        self.pools[(self.tokens[i], self.tokens[j])] = [depth / self.prices[i], depth / self.prices[j]]
+
+    def reserves(self):
+        """Reserves in the shape ArbitrageAgent.fetch_reserves returns."""
+        return {pair: [int(r0), int(r1), self.timestamp] for pair, (r0, r1) in self.pools.items()}
+
+    def step(self, fraction=0.01, volatility=0.002):
+        """Advance one block: a swap of random size hits `fraction` of the pools. Returns the changed pairs."""
+        pairs = list(self.pools)
+        count = max(1, int(len(pairs) * fraction))
+        changed = [pairs[k] for k in self.rng.choice(len(pairs), count, replace=False)]
+        for pair in changed:
+            move = 1.0 + self.rng.normal(0.0, volatility)
+            reserve0, reserve1 = self.pools[pair]
+            self.pools[pair] = [reserve0 * move, reserve1 / move]
+        self.block_number += 1
+        self.timestamp += 12
+        return changed
+
+    def swap(self, path, amount_in, fee=0.003):
+        """Run an exact-input swap along a token path through the pools. Returns the output amount."""
+        gamma = 1.0 - fee
+        amount = float(amount_in)
+        for token_in, token_out in zip(path, path[1:]):
+            if (token_in, token_out) in self.pools:
+                pool, i, o = self.pools[(token_in, token_out)], 0, 1
+            else:
+                pool, i, o = self.pools[(token_out, token_in)], 1, 0
+            amount_out = gamma * pool[o] * amount / (pool[i] + gamma * amount)
+            pool[i] += amount
+            pool[o] -= amount_out
+            amount = amount_out
+        return amount
+
+    def aggregator_payload(self):
+        """Payload in the shape DEXAggregator.fetch_data returns."""
+        depth = np.zeros(len(self.tokens))
+        index = {token: i for i, token in enumerate(self.tokens)}
+        for (token0, token1), (reserve0, reserve1) in self.pools.items():
+            depth[index[token0]] += reserve0 * self.prices[index[token0]]
+            depth[index[token1]] += reserve1 * self.prices[index[token1]]
+        return {"pairs": [{"price": float(p), "liquidity": float(d)} for p, d in zip(self.prices, depth)]}
+
+
+class _Call:
+    def __init__(self, counter, result):
+        self._counter = counter
+        self._result = result
+
+    def call(self, block_identifier="latest"):
+        self._counter["calls"] += 1
+        return self._result() if callable(self._result) else self._result
+
+
+class _StubFunctions:
+    def __init__(self, contract):
+        self._contract = contract
+
+    def getTokenPairs(self):
+        return _Call(self._contract.stats, lambda: list(self._contract.market.pools))
+
+    def getReserves(self, token0, token1):
+        def reserves():
+            reserve0, reserve1 = self._contract.market.pools[(token0, token1)]
+            return [int(reserve0), int(reserve1), self._contract.market.timestamp]
+        return _Call(self._contract.stats, reserves)
+
+
+class StubContract:
+    """Contract stand-in serving getTokenPairs/getReserves from a SyntheticMarket."""
+
+    def __init__(self, market, address=CONTRACT_ADDRESS):
+        self.market = market
+        self.address = address
+        self.abi = STUB_ABI
+        self.stats = {"calls": 0}
+        self.functions = _StubFunctions(self)
+
+
+class _StubEth:
+    account = Account
+
+    def __init__(self, market, gas_price):
+        self.market = market
+        self.gas_price = gas_price
+        self.chain_id = 1337
+        self.sent = []
+
+    @property
+    def block_number(self):
+        return self.market.block_number
+
+    def get_transaction_count(self, address, block_identifier="latest"):
+        return 0
+
+    def send_raw_transaction(self, raw_tx):
+        self.sent.append(bytes(raw_tx))
+        return keccak(bytes(raw_tx))
+
+
+class StubWeb3:
+    """Offline web3 stand-in: serves block number and gas price, records sent transactions."""
+
+    def __init__(self, market, gas_price=30 * 10**9):
+        self.eth = _StubEth(market, gas_price)
+
+    @staticmethod
+    def to_wei(number, unit):
+        from web3 import Web3
+
+        return Web3.to_wei(number, unit)
+
+
+class StubMempool:
+    """
+    Pending transaction feed stand-in: holds router swap transactions encoded
+    like swapExactTokensForTokens calls, until the next block clears them.
+    """
+
+    SELECTOR = keccak(text="swapExactTokensForTokens(uint256,uint256,address[],address,uint256)")[:4]
+
+    def __init__(self, market, router=ROUTER_ADDRESS):
+        self.market = market
+        self.router = router
+        self.txs = []
+
+    def submit(self, path, amount_in):
+        """Queue a pending exact-input swap along path."""
+        words = [int(amount_in), 0, 5 * 32, int(self.router, 16), 2**32, len(path)]
+        words += [int(token, 16) for token in path]
+        data = self.SELECTOR + b"".join(word.to_bytes(32, "big") for word in words)
+        self.txs.append({"to": self.router, "value": 0, "input": "0x" + data.hex()})
+
+    def land(self):
+        """Mine the queued swaps into the market, in order, and clear them."""
+        for tx in self.txs:
+            data = bytes.fromhex(tx["input"][2:])[4:]
+            length = int.from_bytes(data[5 * 32:6 * 32], "big")
+            path = ["0x" + data[(6 + i) * 32 + 12:(7 + i) * 32].hex() for i in range(length)]
+            self.market.swap(path, int.from_bytes(data[:32], "big"))
+        self.txs = []
+
+    def on_block(self, block_number):
+        self.txs = []
+
+    def pending(self):
+        return list(self.txs)
+
+
+def make_offline_agent(market, workdir, sizing_backend="constant_product", **kwargs):
+    """ArbitrageAgent wired to stand-ins for a SyntheticMarket; artifacts go to workdir."""
+    from script.ArbitrageAgent import ArbitrageAgent
+
+    return ArbitrageAgent(
+        rpc_url="offline",
+        contract_address=CONTRACT_ADDRESS,
+        private_key=PRIVATE_KEY,
+        sizing_backend=sizing_backend,
+        feature_store=os.path.join(workdir, "feature_store"),
+        journal=os.path.join(workdir, "trade_journal.bin"),
+        web3=StubWeb3(market),
+        contract=StubContract(market),
+        **kwargs,
+    )
@@ -4,37 +4,172 @@ import json
 import math
 from typing import List, Tuple, Dict
 import logging
+from data.Cache import LRUCache, pooled_session
+from data.ConstantProductSolver import ConstantProductSolver
+from data.Metrics import METRICS
+from data.PairStream import PairStreamParser
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class DEXAggregator:
-    def __init__(self, aggregator_url: str):
+    ENGINES = ("numpy", "reference")
+
+    def __init__(self, aggregator_url: str, engine: str = "numpy", session: requests.Session = None,
+                 cache_size: int = 32):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {self.ENGINES}")
         self.aggregator_url = aggregator_url
+        self.engine = engine
+        # Keep-alive connection pool, and url -> (ETag, Last-Modified, payload) for conditional GETs
+        self.session = session if session is not None else pooled_session()
+        self.response_cache = LRUCache(cache_size, name="aggregator_cache")
+        self.expected_pairs = 1024  # Buffer preallocation for streamed pairs, tracks the last refresh
         self.logger = logger
 
+    @METRICS.timed("aggregator_fetch")
     def fetch_data(self) -> Dict:
-        """Fetch data from the aggregator URL with improved error handling."""
+        """
+        Fetch data from the aggregator URL with improved error handling.
+        Revalidates with If-None-Match/If-Modified-Since when the last response
+        carried an ETag or Last-Modified; a 304 reuses the cached payload.
+        """
         try:
-            response = requests.get(self.aggregator_url, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            response, cached = self._conditional_get(self.aggregator_url)
+            if response is None:
+                return cached
+            payload = response.json()
+            self._remember(self.aggregator_url, response, payload)
+            return payload
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Failed to fetch data: {e}")
             raise ValueError(f"Failed to fetch data: {e}")
 
-    def bellman_ford_arbitrage(self, prices: List[float], liquidity: List[float]) -> Tuple[List[float], List[int], List[List[int]]]:
+    @METRICS.timed("aggregator_fetch_pairs")
+    def fetch_pairs(self, chunk_size: int = 1 << 16) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Stream the payload's pairs array straight into float64 price and liquidity
+        arrays, without materialising the document or a dict per pair. Buffers are
+        preallocated from the pair count of the previous refresh.
+        """
+        cache_key = (self.aggregator_url, "pairs")
+        try:
+            response, cached = self._conditional_get(cache_key, stream=True)
+            if response is None:
+                return cached
+            with response:
+                parser = PairStreamParser(("price", "liquidity"), capacity=self.expected_pairs)
+                for chunk in response.iter_content(chunk_size):
+                    parser.feed(chunk)
+                arrays = parser.finish()
+            self.expected_pairs = max(parser.count, 1)
+            pairs = (arrays["price"], arrays["liquidity"])
+            self._remember(cache_key, response, pairs)
+            return pairs
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Failed to fetch data: {e}")
+            raise ValueError(f"Failed to fetch data: {e}")
+
+    def _conditional_get(self, cache_key, stream: bool = False):
+        """
+        GET the aggregator URL, revalidating with the validators stored under cache_key.
+        Returns (response, None), or (None, cached result) when the server answers 304.
+        """
+        cached = self.response_cache.get(cache_key)
+        headers = {}
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        METRICS.inc("rpc_calls")
+        response = self.session.get(self.aggregator_url, headers=headers, timeout=10, stream=stream)
+        if response.status_code == 304 and cached is not None:
+            response.close()
+            return None, cached[2]
+        response.raise_for_status()
+        return response, None
+
+    def _remember(self, cache_key, response, result):
+        """Keep a parsed result for revalidation if the response carried ETag or Last-Modified."""
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self.response_cache.put(cache_key, (etag, last_modified, result))
+
+    @METRICS.timed("aggregator_bellman_ford")
+    def bellman_ford_arbitrage(self, prices: List[float], liquidity: List[float],
+                               engine: str = None) -> Tuple[List[float], List[int], List[List[int]]]:
         """
         Detect arbitrage opportunities using Bellman-Ford algorithm with logarithmic transformation.
         
         Args:
             prices: List of token prices
             liquidity: List of token liquidity values
+            engine: "numpy" or "reference"; defaults to the engine chosen at construction
             
         Returns:
             Tuple of (distance array, predecessor array, arbitrage cycles)
         """
+        engine = engine or self.engine
+        if engine == "numpy":
+            return self._bellman_ford_numpy(prices, liquidity)
+        if engine == "reference":
+            return self._bellman_ford_reference(prices, liquidity)
+        raise ValueError(f"Unknown engine '{engine}', expected one of {self.ENGINES}")
+
+    def _log_weight_matrix(self, prices: List[float], liquidity: List[float]) -> np.ndarray:
+        """
+        Build the log-weight matrix once: W[i, j] is the log profit of the i -> j edge.
+        The diagonal is -inf so self-loops never relax.
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        liquidity = np.asarray(liquidity, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weights = np.log(prices[None, :] * liquidity[:, None] / (prices[:, None] * liquidity[:, None]))
+        np.fill_diagonal(weights, -np.inf)
+        return weights
+
+    def _bellman_ford_numpy(self, prices: List[float], liquidity: List[float]) -> Tuple[List[float], List[int], List[List[int]]]:
+        """Vectorized Bellman-Ford: each relaxation pass is a single matrix operation."""
+        num_tokens = len(prices)
+        if num_tokens == 0:
+            return [], [], []
+
+        weights = self._log_weight_matrix(prices, liquidity)
+        distance = np.full(num_tokens, -np.inf)
+        predecessor = np.full(num_tokens, -1, dtype=np.int64)
+        distance[0] = 0
+        columns = np.arange(num_tokens)
+
+        # Relax edges |V|-1 times, stopping early once a pass changes nothing
+        for _ in range(num_tokens - 1):
+            candidates = distance[:, None] + weights
+            best_source = np.argmax(candidates, axis=0)
+            best = candidates[best_source, columns]
+            improved = best > distance
+            if not improved.any():
+                break
+            distance[improved] = best[improved]
+            predecessor[improved] = best_source[improved]
+
+        # Check for negative cycles (arbitrage opportunities) across all edges at once
+        violations = np.argwhere(distance[:, None] + weights > distance[None, :])
+
+        arbitrage_cycles = []
+        predecessor_list = predecessor.tolist()
+        for i, j in violations.tolist():
+            cycle = self._reconstruct_cycle(predecessor_list, i, j)
+            if cycle not in arbitrage_cycles:
+                arbitrage_cycles.append(cycle)
+                self.logger.info(f"Arbitrage opportunity detected: {cycle}")
+
+        return distance.tolist(), predecessor_list, arbitrage_cycles
+
+    def _bellman_ford_reference(self, prices: List[float], liquidity: List[float]) -> Tuple[List[float], List[int], List[List[int]]]:
+        """Pure-Python reference implementation, kept for cross-checking the NumPy engine."""
         num_tokens = len(prices)
         # Initialize distance array with negative infinity
         distance = [-float('inf')] * num_tokens
@@ -74,54 +209,103 @@ class DEXAggregator:
     def _reconstruct_cycle(self, predecessor: List[int], start: int, end: int) -> List[int]:
         """Reconstruct cycle from predecessor array."""
         cycle = []
+        seen = set()
         current = start
-        while current != -1:
+        while current != -1 and current not in seen:
             cycle.append(current)
+            seen.add(current)
             if current == end:
                 break
             current = predecessor[current]
         return cycle[::-1]
 
+    @METRICS.timed("aggregator_loan_sizing")
     def calculate_optimal_loan_size(self, prices: List[float], liquidity: List[float], 
-                                  distance: List[float], cycles: List[List[int]]) -> List[Tuple[int, float]]:
+                                  distance: List[float], cycles: List[List[int]],
+                                  fee: float = 0.003,
+                                  pair_reserves: Dict[Tuple[int, int], Tuple[float, float]] = None
+                                  ) -> List[Tuple[int, float]]:
         """
         Calculate optimal loan sizes for detected arbitrage opportunities.
+
+        Sizing needs the reserves of the pool behind every hop. Per-token prices
+        alone cannot be sized: rates derived from one price vector multiply to
+        exactly 1 around any cycle, so after fees no cycle is ever profitable.
+        Without pair_reserves nothing is sized and [] is returned. Otherwise all
+        cycles whose hops all have reserves are sized in one closed-form
+        constant-product batch, including the fee on every hop.
         
         Args:
             prices: List of token prices
             liquidity: List of token liquidity values
             distance: Distance array from Bellman-Ford
             cycles: List of detected arbitrage cycles
+            fee: Swap fee charged on each hop
+            pair_reserves: (i, j) -> (reserve of token i, reserve of token j) for each pool;
+                either orientation of a pair may be given
             
         Returns:
             List of tuples containing (token_index, optimal_loan_size)
         """
+        cycles = [cycle for cycle in cycles if len(cycle) >= 2]
+        if not cycles:
+            return []
+        if not pair_reserves:
+            self.logger.warning(f"Cannot size {len(cycles)} cycles from price quotes alone; "
+                                f"pass pair_reserves to size them")
+            return []
+
+        def hop_reserves(i, j):
+            if (i, j) in pair_reserves:
+                return pair_reserves[(i, j)]
+            if (j, i) in pair_reserves:
+                return pair_reserves[(j, i)][::-1]
+            return None
+
+        hops = [[hop_reserves(i, j) for i, j in zip(cycle, cycle[1:] + cycle[:1])] for cycle in cycles]
+        sizable = [all(hop is not None for hop in cycle_hops) for cycle_hops in hops]
+        if not all(sizable):
+            self.logger.warning(f"Skipping {sizable.count(False)} cycles with hops that have no pool reserves")
+        cycles = [cycle for cycle, ok in zip(cycles, sizable) if ok]
+        hops = [cycle_hops for cycle_hops, ok in zip(hops, sizable) if ok]
+        if not cycles:
+            return []
+
+        max_hops = max(len(cycle) for cycle in cycles)
+        reserve_in = np.ones((len(cycles), max_hops), dtype=np.float64)
+        reserve_out = np.ones((len(cycles), max_hops), dtype=np.float64)
+        mask = np.zeros((len(cycles), max_hops), dtype=bool)
+        for row, cycle_hops in enumerate(hops):
+            reserve_in[row, :len(cycle_hops)] = [hop[0] for hop in cycle_hops]
+            reserve_out[row, :len(cycle_hops)] = [hop[1] for hop in cycle_hops]
+            mask[row, :len(cycle_hops)] = True
+
+        amount_in, profit, marginal_rate = ConstantProductSolver(fee).solve(reserve_in, reserve_out, mask)
+
         optimal_loans = []
-        
-        for cycle in cycles:
-            # Calculate maximum possible loan size based on liquidity constraints
-            max_loan = float('inf')
-            for token_idx in cycle:
-                token_liquidity = liquidity[token_idx]
-                # Consider 90% of available liquidity to account for slippage
-                max_loan = min(max_loan, 0.9 * token_liquidity)
-            
-            # Calculate expected profit percentage
-            profit_percentage = math.exp(distance[cycle[0]]) - 1
-            
+        for cycle, amount, expected, rate in zip(cycles, amount_in.tolist(), profit.tolist(), marginal_rate.tolist()):
+            # Marginal (zero-size) profit after fees, the analogue of the cycle's log weight
+            profit_percentage = rate - 1
             if profit_percentage > 0.01:  # Minimum 1% profit threshold
-                optimal_loans.append((cycle[0], max_loan))
-                self.logger.info(f"Optimal loan opportunity: Token {cycle[0]}, Amount: {max_loan:.2f}, "
-                               f"Expected Profit: {profit_percentage:.2%}")
+                optimal_loans.append((cycle[0], amount))
+                self.logger.info(f"Optimal loan opportunity: Token {cycle[0]}, Amount: {amount:.2f}, "
+                               f"Expected Profit: {profit_percentage:.2%} ({expected:.2f} at optimal size)")
         
         return optimal_loans
 
-    def find_profitable_arbitrage(self, min_profit_threshold: float = 0.01) -> List[Tuple[int, float]]:
-        """Find profitable arbitrage opportunities with visualization."""
+    def find_profitable_arbitrage(self, min_profit_threshold: float = 0.01,
+                                  streaming: bool = True) -> List[Tuple[int, float]]:
+        """
+        Find profitable arbitrage opportunities with visualization.
+        With streaming=False the whole payload is parsed with response.json() instead.
+        """
         try:
-            data = self.fetch_data()
-            prices = [pair['price'] for pair in data['pairs']]
-            liquidity = [pair['liquidity'] for pair in data['pairs']]
+            if streaming:
+                prices, liquidity = self.fetch_pairs()
+            else:
+                data = self.fetch_data()
+                prices = [pair['price'] for pair in data['pairs']]
+                liquidity = [pair['liquidity'] for pair in data['pairs']]
             
             # Run Bellman-Ford algorithm
             distance, predecessor, cycles = self.bellman_ford_arbitrage(prices, liquidity)
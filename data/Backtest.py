@@ -0,0 +1,138 @@
+import time
+from collections import defaultdict
+from typing import Dict
+import logging
+
+import numpy as np
+
+from data.ConstantProductSolver import ConstantProductSolver
+from data.ReserveRecorder import ReserveReplay
+
+logger = logging.getLogger(__name__)
+
+
+class Backtester:
+    """
+    Replay recorded reserve snapshots through an ArbitrageAgent as fast as possible.
+
+    Every block goes through build_graph -> detect_arbitrage -> score_paths; the
+    sized orders are never sent. Their fills are simulated on the NEXT recorded
+    block, i.e. after the swaps that landed in between, the earliest they could
+    be mined. A fill that would lose money reverts: it earns nothing but still
+    pays gas. Gas is paid in gas_token (e.g. WETH) and converted into each
+    cycle's start token at the fill block's spot rates to report net PnL.
+    With fetch=True reserves are read through the agent's contract (e.g. a
+    stand-in serving the replay) rather than handed over directly.
+    """
+
+    def __init__(self, agent, replay: ReserveReplay, fee: float = 0.003, gas_per_trade: int = 500000,
+                 gas_token=None):
+        self.agent = agent
+        self.replay = replay
+        self.solver = ConstantProductSolver(fee)
+        self.gas_per_trade = gas_per_trade
+        self.gas_token = gas_token  # Defaults to the best-connected token of the first block
+        self.logger = logger
+
+    def run(self, max_blocks: int = None, fetch: bool = False) -> Dict:
+        """
+        Replay up to max_blocks blocks. Returns blocks/s, opportunities per block,
+        the gross and net (after gas) PnL per start token in that token's units,
+        and the total net PnL in gas-token units. Orders sized on the last replayed
+        block have no next block to fill on and are counted as unfilled.
+        """
+        blocks = opportunities = trades = reverted = 0
+        pnl = defaultdict(float)
+        net_pnl = defaultdict(float)
+        net_pnl_gas_token = 0.0
+        gas_cost = unpriced_gas = 0
+        pending = []  # Orders sized on the previous block, filled on this one
+        first = True
+        start = time.perf_counter()
+        for block_number in self.replay:
+            if max_blocks is not None and blocks >= max_blocks:
+                break
+            self.agent.on_new_block(block_number)
+            reserves = self.agent.fetch_reserves() if fetch else self.replay.reserves()
+            self.agent.build_graph(incremental=not first, reserves=reserves)
+            first = False
+
+            if pending:
+                profits = self.simulate(pending)
+                gas = self.gas_per_trade * self.agent.gas_oracle.gas_price()
+                rates = self.gas_token_rates()
+                for (path, _), profit in zip(pending, profits.tolist()):
+                    if profit <= 0:
+                        reverted += 1
+                        profit = 0.0
+                    pnl[path[0]] += profit
+                    gas_cost += gas
+                    rate = rates.get(path[0])
+                    if rate is None:
+                        unpriced_gas += gas
+                        continue
+                    net = profit - gas * rate
+                    net_pnl[path[0]] += net
+                    net_pnl_gas_token += net / rate
+                trades += len(pending)
+
+            paths = self.agent.detect_arbitrage(None if blocks == 0 else self.agent.dirty_tokens)
+            amounts = self.agent.score_paths(paths)
+            pending = [(path, amount) for path, amount in zip(paths, amounts) if amount is not None and amount > 0]
+            opportunities += len(paths)
+            blocks += 1
+        elapsed = time.perf_counter() - start
+
+        return {
+            "blocks": blocks,
+            "seconds": elapsed,
+            "blocks_per_sec": blocks / elapsed if elapsed > 0 else float("inf"),
+            "opportunities": opportunities,
+            "opportunities_per_block": opportunities / blocks if blocks else 0.0,
+            "trades": trades,
+            "reverted": reverted,
+            "unfilled": len(pending),
+            "gas_token": self.gas_token,
+            "pnl": dict(pnl),
+            "net_pnl": dict(net_pnl),
+            "net_pnl_gas_token": net_pnl_gas_token,
+            "gas_cost_wei": gas_cost,
+            "unpriced_gas_wei": unpriced_gas,
+        }
+
+    def simulate(self, orders) -> np.ndarray:
+        """Profit of each (path, amount) order on the current graph's reserves."""
+        reserve_in, reserve_out, mask, valid = self.agent.arbitrage_graph.path_reserves([path for path, _ in orders])
+        amount_in = np.array([float(amount) for _, amount in orders])
+        amount_out = self.solver.simulate(reserve_in, reserve_out, amount_in, mask)
+        return np.where(valid, amount_out - amount_in, 0.0)
+
+    def gas_token_rates(self) -> Dict:
+        """
+        Spot rate from the gas token to every token reachable from it, multiplied
+        along the fewest-hop path of the current graph (breadth-first over the CSR).
+        """
+        graph = self.agent.arbitrage_graph
+        if self.gas_token is None:
+            if graph.num_tokens == 0:
+                return {}
+            degree = np.diff(graph.indptr)
+            self.gas_token = graph.tokens.address(int(np.argmax(degree)))
+        source = graph.tokens.get(self.gas_token)
+        if source < 0 or source >= graph.num_tokens:
+            return {}
+        rate = np.full(graph.num_tokens, np.nan)
+        rate[source] = 1.0
+        frontier = np.array([source])
+        while len(frontier):
+            counts = graph.indptr[frontier + 1] - graph.indptr[frontier]
+            edges = np.concatenate([np.arange(graph.indptr[u], graph.indptr[u + 1]) for u in frontier.tolist()])
+            src = np.repeat(frontier, counts)
+            dst = graph.indices[edges]
+            new = np.isnan(rate[dst])
+            # Edge weights are negated log exchange rates; the first edge found to a token wins
+            dst, first = np.unique(dst[new], return_index=True)
+            rate[dst] = rate[src[new][first]] * np.exp(-graph.weights[edges[new][first]])
+            frontier = dst
+        reached = np.flatnonzero(~np.isnan(rate))
+        return {graph.tokens.address(i): rate[i] for i in reached.tolist()}
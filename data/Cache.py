@@ -0,0 +1,83 @@
+from collections import OrderedDict
+import threading
+from typing import Any, Callable, Hashable
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from data.Metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe size-bounded cache with least-recently-used eviction.
+
+    Reserve reads are stored under keys that include the block number, so a
+    value is reused for the rest of its block and old blocks simply age out.
+    """
+
+    def __init__(self, maxsize: int = 65536, name: str = "cache"):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.name = name
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+        if value is _MISSING:
+            METRICS.inc(f"{self.name}_misses")
+            return default
+        METRICS.inc(f"{self.name}_hits")
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        """Cached value for key, calling fetch() and storing its result on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = fetch()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def pooled_session(pool_size: int = 16, retries: int = 0) -> requests.Session:
+    """
+    requests.Session with a keep-alive connection pool of pool_size connections
+    per host, so repeated requests reuse established TCP/TLS connections.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -0,0 +1,92 @@
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ConstantProductSolver:
+    """
+    Closed-form optimal input for cycles of x*y=k pools, solved for all cycles at once.
+
+    A swap of x through a pool with reserves (r_in, r_out) and fee f returns
+    g*r_out*x / (r_in + g*x) with g = 1 - f. Chaining such maps keeps the form
+    A*x / (B + C*x), so a whole cycle collapses to three numbers and the profit
+    A*x / (B + C*x) - x is maximised at x* = (sqrt(A*B) - B) / C, which is
+    positive exactly when the fee-adjusted marginal rate A/B exceeds 1.
+
+    Also usable as an ArbitrageAgent sizing backend (see size_paths).
+    """
+
+    def __init__(self, fee: float = 0.003):
+        self.fee = fee
+        self.logger = logger
+
+    def solve(self, reserve_in: np.ndarray, reserve_out: np.ndarray,
+              mask: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Solve every cycle in one batch.
+
+        Args:
+            reserve_in: (cycles, hops) input-token reserve of each hop
+            reserve_out: (cycles, hops) output-token reserve of each hop
+            mask: (cycles, hops) True for real hops; shorter cycles are padded on the right
+
+        Returns:
+            Tuple of (optimal input, expected profit, marginal rate) arrays, one entry
+            per cycle. Input and profit are 0 where the cycle is not profitable.
+        """
+        a, c = self._compose(reserve_in, reserve_out, mask)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            profitable = np.isfinite(a) & np.isfinite(c) & (a > 1.0) & (c > 0)
+            amount_in = np.where(profitable, (np.sqrt(a) - 1.0) / c, 0.0)
+            profit = np.where(profitable, (np.sqrt(a) - 1.0) ** 2 / c, 0.0)
+        return amount_in, profit, a
+
+    def simulate(self, reserve_in: np.ndarray, reserve_out: np.ndarray, amount_in: np.ndarray,
+                 mask: np.ndarray = None) -> np.ndarray:
+        """Output amount of each cycle for the given input amounts (same shapes as solve)."""
+        a, c = self._compose(reserve_in, reserve_out, mask)
+        amount_in = np.asarray(amount_in, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(amount_in > 0, a * amount_in / (1.0 + c * amount_in), 0.0)
+
+    def _compose(self, reserve_in, reserve_out, mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Fold each cycle's hops into A*x / (1 + C*x), returning (A, C)."""
+        reserve_in = np.asarray(reserve_in, dtype=np.float64)
+        reserve_out = np.asarray(reserve_out, dtype=np.float64)
+        if mask is None:
+            mask = np.ones(reserve_in.shape, dtype=bool)
+        gamma = 1.0 - self.fee
+
+        # Compose the hop maps with B normalised to 1 after every hop to avoid overflow
+        a = np.ones(reserve_in.shape[0])
+        c = np.zeros(reserve_in.shape[0])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for hop in range(reserve_in.shape[1]):
+                live = mask[:, hop]
+                r_in = np.where(live, reserve_in[:, hop], 1.0)
+                r_out = np.where(live, reserve_out[:, hop], 1.0)
+                c = np.where(live, c + gamma * a / r_in, c)
+                a = np.where(live, gamma * a * r_out / r_in, a)
+        return a, c
+
+    # --- Sizing backend interface ---
+
+    def size_paths(self, graph, paths: Sequence[Sequence]) -> List[Optional[float]]:
+        """Optimal input for each closed token path on a TokenGraph, None if unprofitable."""
+        if not paths:
+            return []
+        reserve_in, reserve_out, mask, valid = graph.path_reserves(paths)
+        amount_in, _, _ = self.solve(reserve_in, reserve_out, mask)
+        return [float(amount) if ok and amount > 0 else None for ok, amount in zip(valid.tolist(), amount_in.tolist())]
+
+    def get_optimal_trade_amount(self, state):
+        # Sizing needs pool reserves, not the ML state features; see size_paths
+        return None
+
+    def get_optimal_trade_amounts(self, states):
+        return [None] * len(states)
+
+    def train(self, states, targets, epochs=10):
+        return True  # Sizing is closed-form, nothing to learn
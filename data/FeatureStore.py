@@ -0,0 +1,93 @@
+import glob
+import os
+import threading
+import time
+import numpy as np
+from typing import Dict, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+FEATURE_COLUMNS = ("liquidity", "gas_price", "price_impact", "path_length")
+
+
+class FeatureStore:
+    """
+    Append-only columnar store of decision-time features and trade amounts.
+
+    Rows are buffered in memory and written as immutable chunk files
+    (chunk-000000.npz, chunk-000001.npz, ...) with one array per column, so
+    training loads whole columns at once and can skip chunks it has already seen.
+    Rows still in the buffer are included in reads; call flush() before exit.
+    """
+
+    def __init__(self, directory: str = "feature_store", chunk_size: int = 256):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.logger = logger
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()  # Executions may record from several threads
+        self._buffer = []
+        self._chunks = sorted(glob.glob(os.path.join(directory, "chunk-*.npz")))
+        self._chunk_rows = []
+        for chunk in self._chunks:
+            with np.load(chunk) as data:
+                self._chunk_rows.append(len(data["amount"]))
+
+    @property
+    def num_rows(self) -> int:
+        return sum(self._chunk_rows) + len(self._buffer)
+
+    def append(self, state: Dict[str, float], amount: float, timestamp: float = None):
+        """Record the feature vector a sizing decision was made on."""
+        row = [float(state[column]) for column in FEATURE_COLUMNS]
+        with self._lock:
+            self._buffer.append(row + [float(amount), time.time() if timestamp is None else timestamp])
+            if len(self._buffer) >= self.chunk_size:
+                self._flush()
+
+    def flush(self):
+        """Write buffered rows out as a new chunk file."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        rows = np.array(self._buffer, dtype=np.float64)
+        path = os.path.join(self.directory, f"chunk-{len(self._chunks):06d}.npz")
+        columns = {name: rows[:, i] for i, name in enumerate(FEATURE_COLUMNS + ("amount", "timestamp"))}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **columns)
+        os.replace(tmp_path, path)  # Readers never see a half-written chunk
+        self._chunks.append(path)
+        self._chunk_rows.append(len(rows))
+        self._buffer = []
+        self.logger.info(f"Feature store: wrote {len(rows)} rows to {path}")
+
+    def load(self, start_row: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Load (features, amounts) for all rows from start_row on.
+        Features is an (n, 4) array in FEATURE_COLUMNS order.
+        """
+        with self._lock:
+            return self._load(start_row)
+
+    def _load(self, start_row):
+        features, amounts = [], []
+        offset = 0
+        for chunk, rows in zip(self._chunks, self._chunk_rows):
+            if offset + rows > start_row:
+                with np.load(chunk) as data:
+                    skip = max(start_row - offset, 0)
+                    features.append(np.column_stack([data[column][skip:] for column in FEATURE_COLUMNS]))
+                    amounts.append(data["amount"][skip:])
+            offset += rows
+        if self._buffer:
+            buffered = np.array(self._buffer, dtype=np.float64)[max(start_row - offset, 0):]
+            features.append(buffered[:, :len(FEATURE_COLUMNS)])
+            amounts.append(buffered[:, len(FEATURE_COLUMNS)])
+        if not features:
+            return np.empty((0, len(FEATURE_COLUMNS))), np.empty(0)
+        return np.concatenate(features), np.concatenate(amounts)
@@ -0,0 +1,40 @@
+import threading
+import time
+import logging
+from data.Metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class GasOracle:
+    """
+    Cached gas price shared by every caller.
+
+    The price is read from the node at most once per block: on_block() marks it
+    stale when a new block arrives, and ttl bounds its age when no block
+    notifications are delivered.
+    """
+
+    def __init__(self, web3, ttl: float = 12.0):
+        self.web3 = web3
+        self.ttl = ttl
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._price = None
+        self._fetched_at = 0.0
+        self._block = None
+
+    def on_block(self, block_number: int):
+        with self._lock:
+            if block_number != self._block:
+                self._block = block_number
+                self._price = None
+
+    def gas_price(self) -> int:
+        with self._lock:
+            if self._price is None or time.monotonic() - self._fetched_at > self.ttl:
+                eth = self.web3.eth
+                METRICS.inc("rpc_calls")
+                self._price = eth.gas_price if hasattr(eth, "gas_price") else eth.gasPrice
+                self._fetched_at = time.monotonic()
+            return self._price
@@ -0,0 +1,231 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
+import threading
+import time
+from typing import Any, Dict, List, Sequence
+import logging
+
+from web3.providers import JSONBaseProvider
+
+from data.Cache import pooled_session
+from data.Metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+# Errors of a node that is behind (or throttling us) rather than of the request itself
+TRANSIENT_ERROR_MESSAGES = ("header not found", "unknown block", "block not found", "missing block",
+                            "missing trie node", "not synced")
+TRANSIENT_ERROR_CODES = frozenset((-32005,))  # Rate limited
+
+
+class RPCErrorReply(ValueError):
+    """A well-formed JSON-RPC reply carrying a transient error (or a batch with a transient error entry)."""
+
+    def __init__(self, endpoint: str, response: Any):
+        super().__init__(f"RPC error reply from {endpoint}: {response}")
+        self.response = response
+
+
+def _is_transient(response: Any) -> bool:
+    """Whether a reply carries an error another node may not have, e.g. a block this one has not seen."""
+    for entry in response if isinstance(response, list) else [response]:
+        error = entry.get("error") if isinstance(entry, dict) else None
+        if not isinstance(error, dict):
+            continue
+        message = str(error.get("message", "")).lower()
+        if error.get("code") in TRANSIENT_ERROR_CODES or any(text in message for text in TRANSIENT_ERROR_MESSAGES):
+            return True
+    return False
+
+
+class HedgedHTTPProvider(JSONBaseProvider):
+    """
+    web3 provider over several JSON-RPC endpoints that hedges reads.
+
+    A read goes to the fastest known endpoint first; if no valid answer has
+    arrived after hedge_delay seconds the same request is also sent to the next
+    endpoint, and so on, and the first valid response wins. An error reply that
+    another node may not give (header not found, rate limited; see
+    TRANSIENT_ERROR_MESSAGES) is a failure too, and is only returned when every
+    endpoint answered with one. Any other error reply, such as a reverted call or
+    an unknown method, is the answer and is returned as is; so is a batch whose
+    entries failed that way, which the caller handles entry by entry. Latency is
+    tracked per endpoint as an exponentially weighted average (transport failures
+    count as a full timeout), and so is the share of failed requests; the
+    ranking follows both, so a fast node that is often behind drops back.
+    Writes such as eth_sendRawTransaction are sent to every endpoint at once.
+    Filter methods keep state on the node, so they all go to one pinned endpoint
+    unhedged.
+    """
+
+    WRITE_METHODS = frozenset(("eth_sendRawTransaction", "eth_sendTransaction"))
+    STATEFUL_METHODS = frozenset((
+        "eth_newFilter", "eth_newBlockFilter", "eth_newPendingTransactionFilter",
+        "eth_getFilterChanges", "eth_getFilterLogs", "eth_uninstallFilter",
+    ))
+
+    def __init__(self, endpoints: Sequence[str], hedge_delay: float = 0.05, max_hedges: int = None,
+                 timeout: float = 10.0, smoothing: float = 0.2):
+        super().__init__()
+        if not endpoints:
+            raise ValueError("At least one RPC endpoint is required")
+        self.endpoints = list(endpoints)
+        self.hedge_delay = hedge_delay
+        self.max_hedges = len(self.endpoints) - 1 if max_hedges is None else max_hedges
+        self.timeout = timeout
+        self.smoothing = smoothing
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        self.latency: Dict[str, float] = {endpoint: 0.0 for endpoint in self.endpoints}  # EWMA seconds
+        self.requests: Dict[str, int] = {endpoint: 0 for endpoint in self.endpoints}
+        self.errors: Dict[str, int] = {endpoint: 0 for endpoint in self.endpoints}
+        self.failure_rate: Dict[str, float] = {endpoint: 0.0 for endpoint in self.endpoints}  # EWMA share
+        self.wins: Dict[str, int] = {endpoint: 0 for endpoint in self.endpoints}
+        self.pinned_endpoint = None  # Endpoint holding this provider's filters
+        self._sessions = {endpoint: pooled_session() for endpoint in self.endpoints}
+        self._pool = ThreadPoolExecutor(max_workers=4 * len(self.endpoints), thread_name_prefix="rpc-hedge")
+
+    def ranked_endpoints(self) -> List[str]:
+        """
+        Endpoints by expected time to a usable answer (latency over success rate),
+        best first; endpoints without samples yet are tried first.
+        """
+        with self._lock:
+            return sorted(self.endpoints, key=lambda endpoint: (
+                self.requests[endpoint] > 0, self.latency[endpoint] / max(1.0 - self.failure_rate[endpoint], 0.05)))
+
+    def make_request(self, method, params) -> Dict:
+        body = self.encode_rpc_request(method, params)
+        if method in self.WRITE_METHODS:
+            return self.broadcast(body)
+        if method in self.STATEFUL_METHODS:
+            return self.pinned(body)
+        return self.request(body)
+
+    def request(self, payload: Any) -> Any:
+        """Hedged read of a JSON-RPC payload (bytes, or a request/batch to serialise)."""
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        order = self.ranked_endpoints()[:self.max_hedges + 1]
+        pending = {self._pool.submit(self._post, order[0], body, True): order[0]}
+        next_hedge = 1
+        last_error = error_reply = None
+        while pending:
+            hedge = next_hedge < len(order)
+            done, _ = wait(pending, timeout=self.hedge_delay if hedge else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    response = future.result()
+                except RPCErrorReply as e:
+                    last_error, error_reply = e, e.response
+                    continue
+                except Exception as e:
+                    last_error = e
+                    continue
+                with self._lock:
+                    self.wins[endpoint] += 1
+                return response
+            if hedge and (not done or not pending):
+                # No answer within the hedge delay (or every attempt failed): try the next endpoint too
+                METRICS.inc("rpc_hedges")
+                pending[self._pool.submit(self._post, order[next_hedge], body, True)] = order[next_hedge]
+                next_hedge += 1
+        if error_reply is not None:
+            # Every endpoint that answered was behind; let the caller see the error
+            return error_reply
+        raise ConnectionError(f"All RPC endpoints failed: {last_error}")
+
+    def pinned(self, payload: Any) -> Any:
+        """
+        Send a stateful request (filters) to the pinned endpoint, without hedging.
+        The fastest endpoint is pinned on first use; if it fails, the next request
+        pins a new one, where the caller has to create its filters again.
+        """
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        endpoint = self.pinned_endpoint
+        if endpoint is None:
+            endpoint = self.ranked_endpoints()[0]
+            with self._lock:
+                endpoint = self.pinned_endpoint = self.pinned_endpoint or endpoint
+        try:
+            return self._post(endpoint, body)
+        except Exception:
+            with self._lock:
+                if self.pinned_endpoint == endpoint:
+                    self.pinned_endpoint = None
+            raise
+
+    def broadcast(self, payload: Any) -> Any:
+        """Send a write to every endpoint; returns the first valid response."""
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        pending = {self._pool.submit(self._post, endpoint, body): endpoint for endpoint in self.endpoints}
+        last_error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                # Nodes that already saw the transaction through gossip answer with an error;
+                # prefer a success but fall back to any valid answer
+                if isinstance(response, dict) and "error" in response and pending:
+                    last_error = response["error"]
+                    continue
+                return response
+        if isinstance(last_error, dict):
+            return {"jsonrpc": "2.0", "error": last_error}
+        raise ConnectionError(f"All RPC endpoints failed: {last_error}")
+
+    def _post(self, endpoint: str, body: bytes, transient_errors_fail: bool = False) -> Any:
+        """POST body to endpoint; with transient_errors_fail a transient error reply raises RPCErrorReply."""
+        start = time.perf_counter()
+        try:
+            METRICS.inc("rpc_calls")
+            response = self._sessions[endpoint].post(endpoint, data=body, timeout=self.timeout,
+                                                     headers={"Content-Type": "application/json"})
+            response.raise_for_status()
+            result = response.json()
+            if not isinstance(result, (dict, list)):
+                raise ValueError(f"Invalid JSON-RPC response from {endpoint}: {result!r}")
+        except Exception as e:
+            self._observe(endpoint, self.timeout, failed=True)
+            self.logger.warning(f"RPC request to {endpoint} failed: {str(e)}")
+            raise
+        elapsed = time.perf_counter() - start
+        if transient_errors_fail and _is_transient(result):
+            # The node did answer, so its latency sample is real; only the answer is unusable
+            self._observe(endpoint, elapsed, failed=True)
+            self.logger.warning(f"RPC request to {endpoint} failed: {result}")
+            raise RPCErrorReply(endpoint, result)
+        self._observe(endpoint, elapsed)
+        return result
+
+    def _observe(self, endpoint: str, seconds: float, failed: bool = False):
+        with self._lock:
+            if self.requests[endpoint] == 0:
+                self.latency[endpoint] = seconds
+                self.failure_rate[endpoint] = float(failed)
+            else:
+                self.latency[endpoint] += self.smoothing * (seconds - self.latency[endpoint])
+                self.failure_rate[endpoint] += self.smoothing * (float(failed) - self.failure_rate[endpoint])
+            self.requests[endpoint] += 1
+            if failed:
+                self.errors[endpoint] += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                endpoint: {"latency": self.latency[endpoint], "requests": self.requests[endpoint],
+                           "errors": self.errors[endpoint], "wins": self.wins[endpoint]}
+                for endpoint in self.endpoints
+            }
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        for session in self._sessions.values():
+            session.close()
@@ -0,0 +1,163 @@
+import functools
+import os
+import threading
+import time
+from typing import Dict, List
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS  # Buckets per power of two: ~6% relative precision
+
+
+class Histogram:
+    """
+    HDR-style log-linear latency histogram over integer nanoseconds.
+
+    Each power of two is split into SUB_BUCKETS linear buckets, so every recorded
+    value is kept to within 1/SUB_BUCKETS of its true size with a fixed, small
+    number of counters and no per-sample storage.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: List[int] = []
+        self.total = 0
+        self.sum_ns = 0
+
+    @staticmethod
+    def _index(value_ns: int) -> int:
+        if value_ns < SUB_BUCKETS:
+            return max(value_ns, 0)
+        exponent = value_ns.bit_length() - 1
+        mantissa = (value_ns >> (exponent - SUB_BUCKET_BITS)) - SUB_BUCKETS
+        return SUB_BUCKETS + (exponent - SUB_BUCKET_BITS) * SUB_BUCKETS + mantissa
+
+    @staticmethod
+    def _lower_bound(index: int) -> int:
+        if index < SUB_BUCKETS:
+            return index
+        exponent = (index - SUB_BUCKETS) // SUB_BUCKETS + SUB_BUCKET_BITS
+        mantissa = (index - SUB_BUCKETS) % SUB_BUCKETS
+        return (SUB_BUCKETS + mantissa) << (exponent - SUB_BUCKET_BITS)
+
+    def record_ns(self, value_ns: int):
+        index = self._index(value_ns)
+        with self._lock:
+            if index >= len(self.counts):
+                self.counts.extend([0] * (index + 1 - len(self.counts)))
+            self.counts[index] += 1
+            self.total += 1
+            self.sum_ns += value_ns
+
+    def percentile(self, q: float) -> float:
+        """Value at quantile q (0..1), in seconds."""
+        with self._lock:
+            if self.total == 0:
+                return 0.0
+            target = max(1, q * self.total)
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    # Midpoint of the bucket
+                    return (self._lower_bound(index) + self._lower_bound(index + 1)) / 2e9
+        return 0.0
+
+
+class _Span:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record_ns(time.perf_counter_ns() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Metrics:
+    """
+    Registry of stage latency histograms and counters.
+
+    While disabled, span() returns a shared no-op context manager and inc()
+    returns immediately, so instrumented code pays one attribute check.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, enabled: bool = False, prefix: str = "quantum"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, stage: str):
+        """Context manager timing one run of a pipeline stage on the monotonic clock."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        return _Span(histogram)
+
+    def timed(self, stage: str):
+        """Decorator recording every call of the wrapped function as a span of `stage`."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.span(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def inc(self, name: str, amount: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition of all stage latencies and counters."""
+        lines = []
+        name = f"{self.prefix}_stage_latency_seconds"
+        lines.append(f"# HELP {name} Latency of pipeline stages.")
+        lines.append(f"# TYPE {name} summary")
+        for stage, histogram in sorted(self.histograms.items()):
+            for q in self.QUANTILES:
+                lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {histogram.percentile(q):.9f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum_ns / 1e9:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.total}')
+        for counter, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {self.prefix}_{counter}_total counter")
+            lines.append(f"{self.prefix}_{counter}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared registry; set QUANTUM_METRICS=1 (or call METRICS.enable()) to record
+METRICS = Metrics(enabled=os.getenv("QUANTUM_METRICS") == "1")
@@ -1,8 +1,13 @@
 # /home/uber/Desktop/quantum/data/Monitoring.py
-import time
+import asyncio
 import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from web3 import Web3
-from scripts.ArbitrageAgent import ArbitrageAgent  # Corrected import statement
+from data.Metrics import METRICS
+from data.ReserveRecorder import ReserveRecorder
+from data.ShortCycleIndex import MAX_HOPS as SHORT_CYCLE_HOPS
+from script.ArbitrageAgent import ArbitrageAgent
 
 def initialize(contract_address, provider_url, private_key):
     """
@@ -15,29 +20,231 @@ def initialize(contract_address, provider_url, private_key):
     }
     return config
 
+
+def start_metrics_server(port=9464, host="127.0.0.1", metrics=METRICS):
+    """
+    Enable metrics and serve them in Prometheus text format at /metrics from a
+    daemon thread. Returns the server; call shutdown() on it to stop serving.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes would otherwise print a line every few seconds
+
+    metrics.enable()
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+class MonitorPipeline:
+    """
+    Block-driven fetch -> graph update -> detect -> score -> execute pipeline.
+
+    Stages are connected by bounded asyncio queues, so a slow stage applies
+    backpressure upstream instead of piling up work. Blocking agent calls run in
+    worker threads. Only the newest unprocessed block is kept: if fetching falls
+    behind, stale block notifications are dropped.
+    """
+
+    def __init__(self, agent, block_source=None, poll_interval=0.5, queue_size=16,
+                 score_concurrency=4, execute_concurrency=2, max_blocks=None, recorder=None):
+        self.agent = agent
+        self.block_source = block_source  # Async iterator of block numbers (e.g. a newHeads subscription)
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.score_concurrency = score_concurrency
+        self.execute_concurrency = execute_concurrency
+        self.max_blocks = max_blocks
+        self.recorder = recorder  # Optional ReserveRecorder capturing every fetched block for replay
+        self.tx_hashes = []
+
+    async def poll_block_numbers(self):
+        """Fast poll of the node's block number, yielding each new block once."""
+        last_block = None
+        while True:
+            try:
+                block_number = await asyncio.to_thread(lambda: self.agent.web3.eth.block_number)
+            except Exception as e:
+                print(f"Error polling block number: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if block_number != last_block:
+                last_block = block_number
+                yield block_number
+            await asyncio.sleep(self.poll_interval)
+
+    async def run(self):
+        blocks = asyncio.Queue(maxsize=1)
+        reserves = asyncio.Queue(maxsize=self.queue_size)
+        graphs = asyncio.Queue(maxsize=1)
+        candidates = asyncio.Queue(maxsize=self.queue_size)
+        scored = asyncio.Queue(maxsize=self.queue_size)
+        # The graph is shared state: it may not change again until detection on it has finished.
+        # Scoring runs concurrently with the next update, so it gets a snapshot of the block's edges.
+        graph_idle = asyncio.Semaphore(1)
+
+        stages = [
+            self._stage(self._fetch, blocks, reserves, 1),
+            self._stage(self._update_graph(graph_idle), reserves, graphs, 1),
+            self._stage(self._detect(graph_idle, candidates), graphs, candidates, 1),
+            self._stage(self._score, candidates, scored, self.score_concurrency),
+            self._stage(self._execute, scored, None, self.execute_concurrency),
+        ]
+        tasks = [asyncio.create_task(stage) for stage in stages]
+        try:
+            await self._notify_blocks(blocks)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if hasattr(self.agent, "close"):
+                self.agent.close()
+            if self.recorder is not None:
+                self.recorder.close()
+        return self.tx_hashes
+
+    async def _notify_blocks(self, blocks):
+        """Feed new block numbers into the pipeline, replacing any block not yet picked up."""
+        source = self.block_source if self.block_source is not None else self.poll_block_numbers()
+        seen = 0
+        async for block_number in source:
+            if blocks.full():
+                blocks.get_nowait()
+                blocks.task_done()
+            blocks.put_nowait(block_number)
+            seen += 1
+            if self.max_blocks is not None and seen >= self.max_blocks:
+                break
+        await blocks.put(None)
+
+    async def _stage(self, handler, inbox, outbox, concurrency):
+        """Run handler over inbox items with up to `concurrency` workers, forwarding results to outbox."""
+        async def worker():
+            while True:
+                item = await inbox.get()
+                try:
+                    if item is None:
+                        await inbox.put(None)  # Let sibling workers see the shutdown marker too
+                        return
+                    try:
+                        results = await handler(item)
+                    except Exception as e:
+                        print(f"Pipeline stage {getattr(handler, '__name__', handler)} failed: {e}")
+                        continue
+                    if outbox is not None:
+                        for result in results or ():
+                            await outbox.put(result)
+                finally:
+                    inbox.task_done()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        if outbox is not None:
+            await outbox.put(None)
+
+    async def _fetch(self, block_number):
+        METRICS.inc("blocks")
+        if hasattr(self.agent, "on_new_block"):
+            self.agent.on_new_block(block_number)
+        reserves = await asyncio.to_thread(self.agent.fetch_reserves)
+        if self.recorder is not None:
+            # Compression and disk writes stay off the event loop; fetch has one worker, so blocks are written in order
+            await asyncio.to_thread(self.recorder.record, block_number, reserves)
+        return [(block_number, reserves)]
+
+    def _update_graph(self, graph_idle):
+        async def update_graph(item):
+            block_number, reserves = item
+            await graph_idle.acquire()
+            try:
+                built = await asyncio.to_thread(self.agent.build_graph, None, reserves)
+                snapshot = self.agent.arbitrage_graph.snapshot() if built else None
+            except BaseException:
+                graph_idle.release()
+                raise
+            if not built:
+                graph_idle.release()
+                return []
+            return [(block_number, set(self.agent.dirty_tokens), snapshot)]
+        return update_graph
+
+    def _detect(self, graph_idle, candidates):
+        async def detect(item):
+            block_number, dirty_tokens, snapshot = item
+            try:
+                min_hops = None
+                if getattr(self.agent, "short_cycles", None) is not None:
+                    # Short cycles come from the index right away; Bellman-Ford then only adds longer ones
+                    short_paths = await asyncio.to_thread(self.agent.detect_short_cycles, dirty_tokens)
+                    if short_paths:
+                        await candidates.put((block_number, short_paths, snapshot))
+                    min_hops = SHORT_CYCLE_HOPS + 1
+                paths = await asyncio.to_thread(self.agent.detect_arbitrage, dirty_tokens, None, min_hops)
+            finally:
+                graph_idle.release()
+            return [(block_number, paths, snapshot)] if paths else []
+        return detect
+
+    async def _score(self, item):
+        # All candidate paths of a block are scored in one batched backend call, on that block's edges
+        block_number, paths, snapshot = item
+        amounts = await asyncio.to_thread(self.agent.score_paths, paths, snapshot)
+        orders = [(path, amount) for path, amount in zip(paths, amounts) if amount is not None]
+        return [(block_number, orders, snapshot)] if orders else []
+
+    async def _execute(self, item):
+        # A block's orders are signed together and sent in nonce order
+        block_number, orders, snapshot = item
+        for path, _ in orders:
+            print(f"⚡ Profitable Path Found: {path}")
+        tx_hashes = await asyncio.to_thread(self.agent.execute_arbitrage_batch, orders, snapshot)
+        for tx_hash in tx_hashes:
+            if tx_hash:
+                print(f'Arbitrage executed, transaction hash: {tx_hash.hex()}')
+                self.tx_hashes.append(tx_hash)
+        return []
+
+
 def monitor_and_execute():
     contract_address = os.getenv("CONTRACT_ADDRESS")
     provider_url = os.getenv("PROVIDER_URL")
     private_key = os.getenv("PRIVATE_KEY")
 
+    # PROVIDER_URL may list several comma-separated endpoints to hedge reads across
+    if provider_url and "," in provider_url:
+        provider_url = [url.strip() for url in provider_url.split(",") if url.strip()]
+
+    # MEMPOOL_ROUTERS lists router addresses whose pending swaps are simulated before signing
+    routers = os.getenv("MEMPOOL_ROUTERS")
+    routers = [router.strip() for router in routers.split(",") if router.strip()] if routers else None
+
     CONFIG = initialize(contract_address, provider_url, private_key)
-    agent = ArbitrageAgent(CONFIG["contract_address"], CONFIG["provider_url"], private_key)  # Modified instantiation
-
-    while True:
-        # Build graph and detect arbitrage opportunities
-        if agent.build_graph():
-            arbitrage_paths = agent.detect_arbitrage()
-            if arbitrage_paths:
-                for path in arbitrage_paths:
-                    print(f"⚡ Profitable Path Found: {path}")
-                    try:
-                        tx_hash = agent.execute_arbitrage(path)
-                        if tx_hash:
-                            print(f'Arbitrage executed, transaction hash: {tx_hash.hex()}')
-                    except ValueError as e:
-                        print(e)
-                    time.sleep(10)  # Adjust the sleep time based on your monitoring needs
-        time.sleep(60) # check again after a minute
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
+    agent = ArbitrageAgent(
+        rpc_url=CONFIG["provider_url"],
+        contract_address=CONFIG["contract_address"],
+        private_key=CONFIG["private_key"],
+        incremental=True,
+        short_cycles=True,
+        pending_feed=routers,
+    )
+
+    recording = os.getenv("RESERVE_RECORDING")
+    recorder = ReserveRecorder(recording) if recording else None
+
+    asyncio.run(MonitorPipeline(agent, recorder=recorder).run())
 
 if __name__ == "__main__":
     monitor_and_execute()
@@ -0,0 +1,38 @@
+import threading
+import logging
+from data.Metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class NonceManager:
+    """
+    Hand out transaction nonces from a local counter.
+
+    The counter is read from the node once (pending count) and then incremented
+    locally, so back-to-back transactions neither wait on get_transaction_count
+    nor collide. Call reset() when a transaction fails before or during
+    submission; the next nonce is then re-read from the node.
+    """
+
+    def __init__(self, web3, address):
+        self.web3 = web3
+        self.address = address
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._next = None
+
+    def next(self) -> int:
+        with self._lock:
+            if self._next is None:
+                METRICS.inc("rpc_calls")
+                self._next = self.web3.eth.get_transaction_count(self.address, "pending")
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def reset(self):
+        """Drop the local counter so the next nonce is re-synced from the node."""
+        with self._lock:
+            self._next = None
+        self.logger.info(f"Nonce counter for {self.address} will resync from the node")
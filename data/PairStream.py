@@ -0,0 +1,151 @@
+import codecs
+import json
+from typing import Dict, Iterable, Sequence
+
+import numpy as np
+
+_WHITESPACE = " \t\n\r"
+
+
+class PairStreamParser:
+    """
+    Incremental parser for the aggregator payload {"pairs": [{...}, ...], ...}.
+
+    Bytes are fed in chunks as they arrive. Each pair object is decoded on its
+    own as soon as it is complete and its numeric fields are written straight
+    into preallocated float64 buffers, so memory holds one chunk, one pair and
+    the output arrays instead of the whole document and a dict per pair.
+    Other top-level keys are skipped. Missing fields are stored as NaN.
+    """
+
+    def __init__(self, fields: Sequence[str] = ("price", "liquidity"), capacity: int = 1024, key: str = "pairs"):
+        self.fields = tuple(fields)
+        self.key = key
+        self.count = 0
+        self.buffers = {field: np.empty(max(capacity, 1), dtype=np.float64) for field in self.fields}
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"  # start -> key -> colon -> (value | array -> item...) -> next -> ... -> done
+        self._current_key = None
+
+    def feed(self, chunk: bytes):
+        self._buffer = self._buffer[self._pos:] + self._text.decode(chunk)
+        self._pos = 0
+        self._parse(final=False)
+
+    def finish(self) -> Dict[str, np.ndarray]:
+        """Parse whatever is left and return one array per field, trimmed to the pair count."""
+        self._buffer = self._buffer[self._pos:] + self._text.decode(b"", final=True)
+        self._pos = 0
+        self._parse(final=True)
+        if self._state != "done":
+            raise ValueError(f"Truncated aggregator payload (parser stopped in state '{self._state}')")
+        return {field: buffer[:self.count] for field, buffer in self.buffers.items()}
+
+    @classmethod
+    def parse(cls, chunks: Iterable[bytes], **kwargs) -> Dict[str, np.ndarray]:
+        parser = cls(**kwargs)
+        for chunk in chunks:
+            if chunk:
+                parser.feed(chunk)
+        return parser.finish()
+
+    def _append(self, pair: Dict):
+        if not isinstance(pair, dict):
+            raise ValueError(f"Malformed aggregator payload: expected a pair object, got {pair!r}")
+        if self.count == len(self.buffers[self.fields[0]]):
+            for field in self.fields:
+                self.buffers[field] = np.resize(self.buffers[field], 2 * self.count)
+        for field in self.fields:
+            value = pair.get(field)
+            self.buffers[field][self.count] = np.nan if value is None else value
+        self.count += 1
+
+    def _skip_whitespace(self):
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos < len(buffer)
+
+    def _expect(self, *chars: str) -> str:
+        """Consume one structural character, None if the buffer ends first."""
+        if not self._skip_whitespace():
+            return None
+        char = self._buffer[self._pos]
+        if char not in chars:
+            raise ValueError(f"Malformed aggregator payload: expected {' or '.join(chars)} at '{self._buffer[self._pos:self._pos + 20]}'")
+        self._pos += 1
+        return char
+
+    def _value(self, final: bool):
+        """Decode one complete JSON value, or return (None, False) if more data is needed."""
+        if not self._skip_whitespace():
+            return None, False
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise ValueError("Malformed aggregator payload")
+            return None, False
+        # A scalar that runs to the end of the buffer (e.g. a number) may continue in the next chunk
+        if end == len(self._buffer) and not final and self._buffer[end - 1] not in "}]\"":
+            return None, False
+        self._pos = end
+        return value, True
+
+    def _parse(self, final: bool):
+        while self._state != "done":
+            state = self._state
+            if state == "start":
+                if self._expect("{") is None:
+                    return
+                self._state = "key"
+            elif state == "key":
+                if not self._skip_whitespace():
+                    return
+                if self._buffer[self._pos] == "}":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                key, ok = self._value(final)
+                if not ok:
+                    return
+                self._current_key = key
+                self._state = "colon"
+            elif state == "colon":
+                if self._expect(":") is None:
+                    return
+                self._state = "array" if self._current_key == self.key else "value"
+            elif state == "value":
+                _, ok = self._value(final)  # Other top-level keys are skipped
+                if not ok:
+                    return
+                self._state = "next"
+            elif state == "next":
+                char = self._expect(",", "}")
+                if char is None:
+                    return
+                self._state = "key" if char == "," else "done"
+            elif state == "array":
+                if self._expect("[") is None:
+                    return
+                self._state = "first_item"
+            elif state in ("first_item", "item"):
+                if not self._skip_whitespace():
+                    return
+                if self._buffer[self._pos] == "]":
+                    self._pos += 1
+                    self._state = "next"
+                    continue
+                if state == "item":
+                    self._expect(",")
+                    self._state = "first_item"
+                    continue
+                pair, ok = self._value(final)
+                if not ok:
+                    return
+                self._append(pair)
+                self._state = "item"
@@ -0,0 +1,279 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+from eth_utils import keccak, to_checksum_address
+
+from data.ConstantProductSolver import ConstantProductSolver
+from data.Metrics import METRICS
+from data.TokenGraph import TokenGraph
+
+logger = logging.getLogger(__name__)
+
+WORD = 32
+
+# Uniswap V2-style router swaps: signature -> (amount word, path offset word, exact output).
+# An amount word of None means the input is the transaction value (ETH).
+ROUTER_SWAPS = {
+    "swapExactTokensForTokens(uint256,uint256,address[],address,uint256)": (0, 2, False),
+    "swapExactTokensForTokensSupportingFeeOnTransferTokens(uint256,uint256,address[],address,uint256)": (0, 2, False),
+    "swapExactETHForTokens(uint256,address[],address,uint256)": (None, 1, False),
+    "swapExactETHForTokensSupportingFeeOnTransferTokens(uint256,address[],address,uint256)": (None, 1, False),
+    "swapExactTokensForETH(uint256,uint256,address[],address,uint256)": (0, 2, False),
+    "swapExactTokensForETHSupportingFeeOnTransferTokens(uint256,uint256,address[],address,uint256)": (0, 2, False),
+    "swapTokensForExactTokens(uint256,uint256,address[],address,uint256)": (0, 2, True),
+    "swapTokensForExactETH(uint256,uint256,address[],address,uint256)": (0, 2, True),
+    "swapETHForExactTokens(uint256,address[],address,uint256)": (0, 1, True),
+}
+SWAP_SELECTORS = {keccak(text=signature)[:4]: layout for signature, layout in ROUTER_SWAPS.items()}
+
+
+def _as_bytes(value) -> bytes:
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def decode_swap(tx: Dict) -> Optional[Tuple[Tuple[str, ...], int, bool]]:
+    """
+    Decode a pending router transaction into (token path, amount, exact_out).
+    amount is the input amount, or the output amount when exact_out is True.
+    Returns None for anything that is not a known router swap.
+    """
+    data = _as_bytes(tx.get("input", tx.get("data", b"")))
+    layout = SWAP_SELECTORS.get(data[:4])
+    if layout is None:
+        return None
+    amount_word, path_word, exact_out = layout
+    args = data[4:]
+
+    def word(index):
+        return int.from_bytes(args[index * WORD:(index + 1) * WORD], "big")
+
+    offset = word(path_word) // WORD
+    length = word(offset)
+    if length < 2 or (offset + 1 + length) * WORD > len(args):
+        return None
+    if amount_word is None:
+        value = tx.get("value", 0)
+        amount = int(value, 16) if isinstance(value, str) else int(value)  # Raw JSON-RPC replies are hex
+    else:
+        amount = word(amount_word)
+    if amount <= 0:
+        return None
+    path = tuple("0x" + args[(offset + 1 + i) * WORD + 12:(offset + 2 + i) * WORD].hex() for i in range(length))
+    return path, amount, exact_out
+
+
+class MempoolFeed:
+    """
+    Pending router transactions from the node's mempool.
+
+    A background thread polls a "pending" filter every poll_interval seconds
+    and fetches the new transactions' bodies, in one JSON-RPC batch when a
+    post_batch callable is given (serially otherwise); only transactions to one
+    of `routers` (all, if None) are kept. pending() only reads that cache, so
+    no RPC happens on the signing path. Everything seen so far is dropped when
+    a new block arrives, since mined swaps are then part of the fetched
+    reserves, and ttl bounds its age when no block notifications are delivered.
+    A filter that stops working (e.g. the node holding it went away) is created
+    again on the next poll.
+    """
+
+    def __init__(self, web3, routers: Iterable[str] = None, ttl: float = 12.0, poll_interval: float = 0.25,
+                 post_batch: Callable[[List[Dict]], List[Dict]] = None):
+        self.web3 = web3
+        self.routers = None if routers is None else {router.lower() for router in routers}
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.post_batch = post_batch
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._txs: Dict[bytes, Tuple[float, Dict]] = {}  # hash -> (first seen, tx)
+        self._block = None
+        self._filter = web3.eth.filter("pending")
+        self._stop = threading.Event()
+        self._poller = threading.Thread(target=self._run, name="mempool-feed", daemon=True)
+        self._poller.start()
+
+    def on_block(self, block_number: int):
+        with self._lock:
+            if block_number != self._block:
+                self._block = block_number
+                self._txs.clear()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self.logger.warning(f"Error polling pending transactions: {str(e)}")
+                self._filter = None
+
+    def poll(self):
+        """Fetch the transactions that entered the mempool since the last poll into the cache."""
+        if self._filter is None:
+            self._filter = self.web3.eth.filter("pending")
+        METRICS.inc("rpc_calls")
+        hashes = self._filter.get_new_entries()
+        if not hashes:
+            return
+        fetched = [(tx_hash, tx) for tx_hash, tx in self._fetch(hashes)
+                   if tx is not None and (self.routers is None or str(tx.get("to") or "").lower() in self.routers)]
+        now = time.monotonic()
+        with self._lock:
+            for tx_hash, tx in fetched:
+                self._txs.setdefault(tx_hash, (now, tx))
+
+    def _fetch(self, hashes) -> List[Tuple[bytes, Optional[Dict]]]:
+        """(hash, tx) for each pending hash; tx is None if it is no longer available."""
+        hashes = [_as_bytes(tx_hash) for tx_hash in hashes]
+        if self.post_batch is not None:
+            payload = [{"jsonrpc": "2.0", "id": i, "method": "eth_getTransactionByHash",
+                        "params": ["0x" + tx_hash.hex()]} for i, tx_hash in enumerate(hashes)]
+            txs = [None] * len(hashes)
+            for response in self.post_batch(payload):
+                index = response.get("id") if isinstance(response, dict) else None
+                if isinstance(index, int) and 0 <= index < len(hashes):
+                    txs[index] = response.get("result")
+            return list(zip(hashes, txs))
+        fetched = []
+        for tx_hash in hashes:
+            try:
+                METRICS.inc("rpc_calls")
+                fetched.append((tx_hash, self.web3.eth.get_transaction(tx_hash)))
+            except Exception as e:
+                # Already mined or evicted
+                self.logger.debug(f"Pending transaction {tx_hash.hex()} unavailable: {str(e)}")
+        return fetched
+
+    def pending(self) -> List[Dict]:
+        """Router transactions still considered pending, from the cache; never calls the node."""
+        now = time.monotonic()
+        with self._lock:
+            for tx_hash in [h for h, (seen, _) in self._txs.items() if now - seen > self.ttl]:
+                del self._txs[tx_hash]
+            return [tx for _, tx in self._txs.values()]
+
+    def close(self):
+        """Stop the polling thread."""
+        self._stop.set()
+        self._poller.join()
+
+
+class PendingStateSimulator:
+    """
+    Local constant-product state with pending swaps applied on top.
+
+    load() copies the per-edge reserve arrays of a TokenGraph; apply() runs
+    decoded pending swaps through that copy hop by hop, updating both edge
+    directions of every pool they touch. Candidate orders are then re-scored
+    against the simulated reserves in one vectorized ConstantProductSolver
+    pass. The graph itself is never modified.
+    """
+
+    def __init__(self, fee: float = 0.003):
+        self.fee = fee
+        self.solver = ConstantProductSolver(fee)
+        self.logger = logger
+        self.graph = None
+        self.reserve0 = np.empty(0)  # Input-token reserve per edge slot
+        self.reserve1 = np.empty(0)  # Output-token reserve per edge slot
+
+    def load(self, graph: TokenGraph):
+        self.graph = graph
+        self.reserve0 = graph.reserve0.copy()
+        self.reserve1 = graph.reserve1.copy()
+
+    def _token_ids(self, path: Sequence[str]) -> np.ndarray:
+        tokens = self.graph.tokens
+        ids = []
+        for token in path:
+            token_id = tokens.get(token)
+            if token_id < 0 and isinstance(token, str) and len(token) == 42:
+                # Calldata addresses are lowercase, pools may be keyed by checksum address
+                token_id = tokens.get(to_checksum_address(token))
+            ids.append(token_id)
+        return np.array(ids, dtype=np.int64)
+
+    def _hops(self, paths: Sequence[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """(src, dst) token ids of every hop of every path, in path order."""
+        ids = self._token_ids([token for path in paths for token in path])
+        lengths = np.array([len(path) for path in paths], dtype=np.int64)
+        # Hop k of a path runs from its token k to token k + 1, so each path's last token starts no hop
+        is_src = np.ones(len(ids), dtype=bool)
+        is_src[(np.cumsum(lengths) - 1)[lengths > 0]] = False
+        src_pos = np.flatnonzero(is_src)
+        return ids[src_pos], ids[src_pos + 1]
+
+    def apply(self, swaps: Iterable[Tuple[Sequence[str], float, bool]]) -> int:
+        """Apply (path, amount, exact_out) swaps in order. Returns how many touched a known pool."""
+        swaps = [swap for swap in swaps if len(swap[0]) >= 2]
+        if not swaps:
+            return 0
+        # Resolve the pool slots of every hop of every swap in one lookup
+        src, dst = self._hops([path for path, _, _ in swaps])
+        all_forward = self.graph.edge_slots(src, dst)
+        all_backward = self.graph.edge_slots(dst, src)
+        hops = np.array([len(path) - 1 for path, _, _ in swaps], dtype=np.int64)
+        hop_starts = np.cumsum(hops) - hops
+
+        gamma = 1.0 - self.fee
+        applied = 0
+        for (path, amount, exact_out), hop_start in zip(swaps, hop_starts.tolist()):
+            forward = all_forward[hop_start:hop_start + len(path) - 1]
+            backward = all_backward[hop_start:hop_start + len(path) - 1]
+            amount = float(amount)
+            if exact_out:
+                # Walk back from the requested output; every hop has to be known for that
+                if (forward < 0).any():
+                    continue
+                for slot in forward[::-1].tolist():
+                    r_in, r_out = self.reserve0[slot], self.reserve1[slot]
+                    if amount >= r_out:
+                        amount = None  # The router would revert
+                        break
+                    amount = r_in * amount / (gamma * (r_out - amount))
+                if amount is None:
+                    continue
+            # Hops after the first pool we do not track cannot be followed
+            known = len(forward) if (forward >= 0).all() else int(np.argmax(forward < 0))
+            if known == 0:
+                continue
+            for slot, reverse in zip(forward[:known].tolist(), backward[:known].tolist()):
+                r_in, r_out = self.reserve0[slot], self.reserve1[slot]
+                amount_out = gamma * r_out * amount / (r_in + gamma * amount)
+                self.reserve0[slot] += amount
+                self.reserve1[slot] -= amount_out
+                self.reserve0[reverse] -= amount_out
+                self.reserve1[reverse] += amount
+                amount = amount_out
+            applied += 1
+        return applied
+
+    def path_reserves(self, paths: Sequence[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """TokenGraph.path_reserves over the simulated reserves, gathered in one edge_slots lookup."""
+        paths = [list(path) for path in paths]
+        max_hops = max((len(path) - 1 for path in paths), default=0)
+        mask = np.zeros((len(paths), max_hops), dtype=bool)
+        for row, path in enumerate(paths):
+            mask[row, :len(path) - 1] = True
+        slots = np.full(mask.shape, -1, dtype=np.int64)
+        slots[mask] = self.graph.edge_slots(*self._hops(paths))
+        valid = mask.any(axis=1) & ((slots >= 0) | ~mask).all(axis=1)
+        mask &= valid[:, None]
+        gather = np.where(mask, slots, 0)
+        reserve_in = np.where(mask, self.reserve0[gather], 1.0) if len(self.reserve0) else np.ones(mask.shape)
+        reserve_out = np.where(mask, self.reserve1[gather], 1.0) if len(self.reserve1) else np.ones(mask.shape)
+        return reserve_in, reserve_out, mask, valid
+
+    def profits(self, orders: Sequence[Tuple[Sequence[str], float]]) -> np.ndarray:
+        """Profit of each (path, amount) order on the simulated reserves, 0 where a hop is unknown."""
+        if not orders:
+            return np.empty(0)
+        reserve_in, reserve_out, mask, valid = self.path_reserves([path for path, _ in orders])
+        amount_in = np.array([float(amount) for _, amount in orders])
+        amount_out = self.solver.simulate(reserve_in, reserve_out, amount_in, mask)
+        return np.where(valid, amount_out - amount_in, 0.0)
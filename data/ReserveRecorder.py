@@ -0,0 +1,203 @@
+import os
+import numpy as np
+from typing import Dict, Hashable, Iterator, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"QTRESERVES\x00\x00\x00\x00\x00\x02"  # 16-byte file header, last byte is the format version
+MAGIC_V1 = MAGIC[:-1] + b"\x01"  # Version 1 stored reserves as float64; still readable
+NO_PAIR = np.iinfo(np.uint32).max  # Pair id of the marker row written for blocks without changes
+REMOVED = np.iinfo(np.uint64).max  # reserve0_hi of a removed pool; a uint112 never sets its top 16 bits
+MAX_RESERVE = 1 << 112  # Uniswap V2 reserves are uint112
+WORD_MASK = (1 << 64) - 1
+
+# Reserves are exact integers split into high and low 64-bit words
+SNAPSHOT_DTYPE = np.dtype([
+    ("block", "<u8"),
+    ("timestamp", "<u4"),
+    ("pair", "<u4"),
+    ("reserve0_hi", "<u8"),
+    ("reserve0_lo", "<u8"),
+    ("reserve1_hi", "<u8"),
+    ("reserve1_lo", "<u8"),
+])
+
+SNAPSHOT_DTYPE_V1 = np.dtype([
+    ("block", "<u8"),
+    ("timestamp", "<u4"),
+    ("pair", "<u4"),
+    ("reserve0", "<f8"),
+    ("reserve1", "<f8"),
+])
+
+
+class ReserveRecorder:
+    """
+    Append per-block reserve snapshots to a compact binary file.
+
+    Only pools whose reserves changed since the previous block are written, as
+    fixed-size SNAPSHOT_DTYPE rows holding each uint112 reserve exactly as two
+    64-bit words; a removed pool is a row with reserve0_hi set to REMOVED and a
+    block without changes gets a single NO_PAIR marker row. Pairs are
+    interned in a sidecar ".pairs" file (one "token0,token1" line per id), so
+    the snapshot file itself can be memory-mapped for replay.
+    """
+
+    def __init__(self, path: str = "reserves.bin"):
+        self.path = path
+        self.pairs_path = path + ".pairs"
+        self.logger = logger
+
+        self.pair_ids: Dict[Tuple[Hashable, Hashable], int] = {}
+        if os.path.exists(self.pairs_path):
+            for pair in read_snapshot_pairs(path):
+                self.pair_ids[pair] = len(self.pair_ids)
+        self.last: Dict[Tuple[Hashable, Hashable], Tuple[int, int]] = {}
+
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new_file:
+            with open(path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} is not a version {MAGIC[-1]} reserve snapshot file; record to a new file")
+        self._file = open(path, "ab")
+        if new_file:
+            self._file.write(MAGIC)
+        self._pairs_file = open(self.pairs_path, "a")
+
+    def record(self, block_number: int, reserves: Dict, timestamp: int = None):
+        """
+        Append the snapshot of one block. reserves is shaped like the result of
+        ArbitrageAgent.fetch_reserves: (token0, token1) -> [reserve0, reserve1, timestamp].
+        Pairs mapped to None (failed reads) are recorded as unchanged, and so are
+        reserves that are not a uint112.
+        """
+        changed = []
+        new_pairs = []
+        for pair, values in reserves.items():
+            if values is None:
+                continue
+            current = (int(values[0]), int(values[1]))
+            if not (0 <= current[0] < MAX_RESERVE and 0 <= current[1] < MAX_RESERVE):
+                self.logger.warning(f"Not recording {pair}: reserves {current} are not uint112")
+                continue
+            if self.last.get(pair) == current:
+                continue
+            pair_id = self.pair_ids.get(pair)
+            if pair_id is None:
+                pair_id = self.pair_ids[pair] = len(self.pair_ids)
+                new_pairs.append(pair)
+            changed.append((pair_id, current[0], current[1]))
+            self.last[pair] = current
+            if timestamp is None and len(values) > 2:
+                timestamp = values[2]
+        for pair in self.last.keys() - reserves.keys():
+            changed.append((self.pair_ids[pair], None, None))
+            del self.last[pair]
+
+        rows = np.zeros(max(len(changed), 1), dtype=SNAPSHOT_DTYPE)
+        rows["block"] = block_number
+        rows["timestamp"] = timestamp or 0
+        if changed:
+            rows["pair"] = [pair_id for pair_id, _, _ in changed]
+            for row, (_, reserve0, reserve1) in zip(rows, changed):
+                if reserve0 is None:
+                    row["reserve0_hi"] = REMOVED
+                else:
+                    row["reserve0_hi"], row["reserve0_lo"] = reserve0 >> 64, reserve0 & WORD_MASK
+                    row["reserve1_hi"], row["reserve1_lo"] = reserve1 >> 64, reserve1 & WORD_MASK
+        else:
+            rows["pair"] = NO_PAIR
+
+        # Pairs first, so every id in the snapshot file can be resolved
+        if new_pairs:
+            self._pairs_file.write("".join(f"{token0},{token1}\n" for token0, token1 in new_pairs))
+            self._pairs_file.flush()
+        self._file.write(rows.tobytes())
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+        self._pairs_file.close()
+
+
+def read_snapshots(path: str = "reserves.bin") -> np.ndarray:
+    """
+    Memory-map a snapshot file as a read-only SNAPSHOT_DTYPE array
+    (SNAPSHOT_DTYPE_V1 for files written by format version 1).
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        dtype = SNAPSHOT_DTYPE
+    elif magic == MAGIC_V1:
+        dtype = SNAPSHOT_DTYPE_V1
+    else:
+        raise ValueError(f"{path} is not a reserve snapshot file")
+    count = (os.path.getsize(path) - len(MAGIC)) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=len(MAGIC), shape=(count,))
+
+
+def snapshot_reserves(rows: np.ndarray) -> Tuple[List, List]:
+    """
+    (reserve0, reserve1) lists of snapshot rows: Python ints, with None for
+    removed pools. Version 1 rows give floats (NaN marked a removal).
+    """
+    if "reserve0" in rows.dtype.names:
+        reserve0, reserve1 = rows["reserve0"].tolist(), rows["reserve1"].tolist()
+        return [None if r != r else r for r in reserve0], reserve1
+    reserve0 = [None if hi == REMOVED else hi << 64 | lo
+                for hi, lo in zip(rows["reserve0_hi"].tolist(), rows["reserve0_lo"].tolist())]
+    reserve1 = [hi << 64 | lo for hi, lo in zip(rows["reserve1_hi"].tolist(), rows["reserve1_lo"].tolist())]
+    return reserve0, reserve1
+
+
+def read_snapshot_pairs(path: str = "reserves.bin") -> List[Tuple[str, str]]:
+    """(token0, token1) of a snapshot file, indexed by pair id."""
+    with open(path + ".pairs") as f:
+        return [tuple(line.rstrip("\n").split(",")) for line in f]
+
+
+class ReserveReplay:
+    """
+    Reassemble per-block reserve state from a snapshot file.
+
+    Iterating yields block numbers in recorded order and applies each block's
+    rows to `pools`. Like SyntheticMarket it exposes pools, block_number and
+    timestamp, so the offline web3/contract stand-ins can serve a replay too.
+    """
+
+    def __init__(self, path: str = "reserves.bin"):
+        self.rows = read_snapshots(path)
+        self.pairs = read_snapshot_pairs(path)
+        blocks = self.rows["block"]
+        self.starts = np.flatnonzero(np.r_[True, blocks[1:] != blocks[:-1]]) if len(blocks) else np.zeros(0, dtype=np.int64)
+        self.pools: Dict[Tuple[str, str], List[int]] = {}
+        self.block_number = None
+        self.timestamp = 0
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[int]:
+        ends = np.r_[self.starts[1:], len(self.rows)]
+        for start, end in zip(self.starts.tolist(), ends.tolist()):
+            block = self.rows[start:end]
+            self.block_number = int(block["block"][0])
+            self.timestamp = int(block["timestamp"][0])
+            for pair_id, reserve0, reserve1 in zip(block["pair"].tolist(), *snapshot_reserves(block)):
+                if pair_id == NO_PAIR:
+                    continue
+                if reserve0 is None:  # The pool was removed
+                    self.pools.pop(self.pairs[pair_id], None)
+                else:
+                    self.pools[self.pairs[pair_id]] = [reserve0, reserve1]
+            yield self.block_number
+
+    def reserves(self) -> Dict:
+        """Current reserves in the shape ArbitrageAgent.fetch_reserves returns."""
+        return {pair: [reserve0, reserve1, self.timestamp] for pair, (reserve0, reserve1) in self.pools.items()}
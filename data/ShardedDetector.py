@@ -0,0 +1,306 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple, Union
+import logging
+
+import numpy as np
+
+from data.TokenGraph import TokenGraph, find_negative_cycles, relax_edges
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedCycleDetector:
+    """
+    Negative-cycle search spread over a process pool.
+
+    A cycle never leaves its strongly connected component, so each component is
+    searched on its own (to convergence, so the particular cycles reported around
+    a mispriced hop may differ from a whole-graph search). Small components are
+    packed into shards that each run in one worker. Pool markets tend to form one
+    giant component, and no cut of it into shards keeps the cycles that cross the
+    cut. A component too large for one worker's share is therefore searched by
+    all workers together. Its tokens are split into one block per worker. Each
+    Bellman-Ford pass relaxes the edges into every block in parallel, and the
+    parent merges the pass and looks for cycles. Every edge is relaxed by the
+    block that owns its destination, so no edge is dropped and the result equals
+    a single-process search of the component.
+
+    Blocks are contiguous token id ranges with similar in-edge counts. With `hubs`
+    set (e.g. WETH, USDC), every token joins the region of the nearest hub and
+    blocks are packed from whole regions instead.
+
+    Edge arrays are placed in shared memory once per call; workers attach to them
+    by name and only receive shard or block offsets, not copies of the graph.
+    """
+
+    def __init__(self, workers: int = None, hubs: Union[int, Sequence[Hashable], None] = None,
+                 min_parallel_edges: int = 20000):
+        self.workers = workers or os.cpu_count() or 1
+        self.hubs = hubs  # Hub addresses, or an int to use that many highest-degree tokens
+        self.min_parallel_edges = min_parallel_edges  # Smaller graphs are searched inline
+        self.logger = logger
+        self._pool = None
+
+    def negative_cycles(self, graph: TokenGraph, max_cycles: int = None,
+                        tolerance: float = 1e-12) -> Set[Tuple[int, ...]]:
+        """
+        Same result shape as TokenGraph.negative_cycles: canonical tuples of token ids.
+        max_cycles bounds the search of each component or shard.
+        """
+        src, dst, weight = graph.edge_arrays()
+        components = self.components(graph)
+        if not components:
+            return set()
+        if self.workers <= 1 or len(src) < self.min_parallel_edges:
+            found = set()
+            for edges in components:
+                found |= _shard_cycles(src[edges], dst[edges], weight[edges], max_cycles, tolerance)
+            return found
+
+        # A component above one worker's share would leave the rest of the pool idle in a shard
+        share = sum(len(edges) for edges in components) / self.workers
+        large = [edges for edges in components if len(edges) > share]
+        shards = self._pack([edges for edges in components if len(edges) <= share])
+
+        edge_ids = np.concatenate(shards) if shards else np.empty(0, dtype=np.int64)
+        offsets = np.cumsum([0] + [len(edges) for edges in shards])
+        blocks = [_SharedArray.create(array) for array in (src, dst, weight, edge_ids)]
+        try:
+            specs = [block.spec for block in blocks]
+            futures = [
+                self._executor().submit(_run_shard, specs, int(start), int(stop), max_cycles, tolerance)
+                for start, stop in zip(offsets[:-1], offsets[1:])
+            ]
+            found = set()
+            for edges in large:
+                found |= self._component_cycles(graph, edges, max_cycles, tolerance)
+            for future in futures:
+                found |= future.result()
+            return found
+        finally:
+            for block in blocks:
+                block.release()
+
+    def components(self, graph: TokenGraph) -> List[np.ndarray]:
+        """Edge index arrays of each strongly connected component, largest first, in CSR order within each."""
+        src, dst = graph.edge_endpoints()
+        labels = graph.strongly_connected_components()
+        # Only edges inside one component can lie on a cycle
+        internal = np.flatnonzero(labels[src] == labels[dst])
+        if len(internal) == 0:
+            return []
+        order = np.argsort(labels[src[internal]], kind="stable")
+        internal = internal[order]
+        bounds = np.flatnonzero(np.diff(labels[src[internal]])) + 1
+        return sorted(np.split(internal, bounds), key=len, reverse=True)
+
+    def node_blocks(self, graph: TokenGraph, nodes: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """
+        Block index of each of a component's `nodes` (sorted token ids), given the
+        component's edge destinations as indices into `nodes`.
+        """
+        in_edges = np.bincount(dst, minlength=len(nodes))
+        num_blocks = max(1, min(self.workers, len(nodes)))
+        if self.hubs is not None:
+            regions = self._hub_regions(graph, nodes)
+            if regions is not None:
+                sizes = np.bincount(regions, weights=in_edges)
+                return np.asarray(_balance(sizes.tolist(), num_blocks), dtype=np.int64)[regions]
+        # Contiguous id ranges, cut where the running in-edge count crosses a multiple of the block size
+        before = np.cumsum(in_edges) - in_edges
+        return np.minimum(before * num_blocks // max(int(in_edges.sum()), 1), num_blocks - 1)
+
+    def _component_cycles(self, graph: TokenGraph, edges: np.ndarray, max_cycles: Optional[int],
+                          tolerance: float) -> Set[Tuple[int, ...]]:
+        """Search one component with every pass split into per-worker blocks."""
+        src, dst, weight = graph.edge_arrays()
+        nodes, local = np.unique(np.concatenate([src[edges], dst[edges]]), return_inverse=True)
+        local_src, local_dst, weight = local[:len(edges)], local[len(edges):], weight[edges]
+        relaxation = _BlockRelaxation(self._executor(), local_src, local_dst, weight,
+                                      self.node_blocks(graph, nodes, local_dst), tolerance)
+        try:
+            cycles = find_negative_cycles(len(nodes), local_src, local_dst, weight, max_cycles, tolerance,
+                                          relax=relaxation)
+        finally:
+            relaxation.release()
+        nodes = nodes.tolist()
+        return {tuple(nodes[i] for i in cycle) for cycle in cycles}
+
+    def _hub_regions(self, graph: TokenGraph, nodes: np.ndarray) -> Optional[np.ndarray]:
+        """Region index of each of a component's nodes: the hub that reaches it first."""
+        if isinstance(self.hubs, int):
+            degree = np.diff(graph.indptr)[nodes]
+            hubs = nodes[np.argsort(-degree, kind="stable")[:self.hubs]]
+        else:
+            hubs = np.array([graph.tokens.get(hub) for hub in self.hubs], dtype=np.int64)
+            hubs = hubs[np.isin(hubs, nodes)]
+        if len(hubs) < 2:
+            return None
+
+        # Multi-source BFS: every token joins the region of the first hub to reach it
+        region = np.full(graph.num_tokens, -1, dtype=np.int64)
+        region[hubs] = np.arange(len(hubs))
+        indptr, indices = graph.indptr, graph.indices
+        frontier = hubs
+        while len(frontier):
+            next_frontier = []
+            for node in frontier.tolist():
+                neighbours = indices[indptr[node]:indptr[node + 1]]
+                fresh = neighbours[region[neighbours] < 0]
+                region[fresh] = region[node]
+                next_frontier.append(fresh)
+            frontier = np.unique(np.concatenate(next_frontier)) if next_frontier else np.empty(0, dtype=np.int64)
+        return np.maximum(region[nodes], 0)
+
+    def _pack(self, groups: List[np.ndarray]) -> List[np.ndarray]:
+        """Pack small groups into at most 4 * workers shards of similar edge counts (largest first)."""
+        num_bins = max(1, 4 * self.workers)
+        if len(groups) <= num_bins:
+            return groups
+        bins = [[] for _ in range(num_bins)]
+        for group, index in zip(groups, _balance([len(group) for group in groups], num_bins)):
+            bins[index].append(group)
+        return [np.sort(np.concatenate(bin_groups)) for bin_groups in bins if bin_groups]
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+def _balance(sizes: Sequence[float], num_bins: int) -> List[int]:
+    """Greedy bin index of each item: largest first into the currently lightest bin."""
+    totals = [0.0] * num_bins
+    assignment = [0] * len(sizes)
+    for item in sorted(range(len(sizes)), key=lambda i: sizes[i], reverse=True):
+        lightest = totals.index(min(totals))
+        assignment[item] = lightest
+        totals[lightest] += sizes[item]
+    return assignment
+
+
+def _shard_cycles(src: np.ndarray, dst: np.ndarray, weight: np.ndarray, max_cycles: Optional[int],
+                  tolerance: float) -> Set[Tuple[int, ...]]:
+    """Search one shard on compact local node ids and map the cycles back to global ids."""
+    nodes, local = np.unique(np.concatenate([src, dst]), return_inverse=True)
+    local_src, local_dst = local[:len(src)], local[len(src):]
+    # The id mapping is monotonic, so shard edges stay in (src, dst) order and
+    # canonical rotations (smallest id first) are preserved
+    cycles = find_negative_cycles(len(nodes), local_src, local_dst, weight, max_cycles, tolerance)
+    nodes = nodes.tolist()
+    return {tuple(nodes[i] for i in cycle) for cycle in cycles}
+
+
+def _run_shard(specs: List[Tuple[str, str, int]], start: int, stop: int, max_cycles: Optional[int],
+               tolerance: float) -> Set[Tuple[int, ...]]:
+    """Process-pool entry point: attach to the shared edge arrays and search one shard."""
+    blocks = [_SharedArray.attach(*spec) for spec in specs]
+    try:
+        src, dst, weight, edge_ids = (block.array for block in blocks)
+        edges = edge_ids[start:stop]
+        return _shard_cycles(src[edges], dst[edges], weight[edges], max_cycles, tolerance)
+    finally:
+        for block in blocks:
+            block.release()
+
+
+class _BlockRelaxation:
+    """
+    Bellman-Ford pass for find_negative_cycles(relax=...) split over pool workers.
+
+    Edge arrays are stored grouped by the block of their destination, so each
+    worker relaxes a contiguous slice and writes only its own nodes' distances and
+    predecessors. Every pass reads the distances of the previous one (a copy in
+    shared memory), exactly like the single-process pass.
+    """
+
+    def __init__(self, executor: ProcessPoolExecutor, src: np.ndarray, dst: np.ndarray, weight: np.ndarray,
+                 owner: np.ndarray, tolerance: float):
+        self.executor = executor
+        self.tolerance = tolerance
+        num_nodes, num_blocks = len(owner), int(owner.max()) + 1
+        edge_owner = owner[dst]
+        # Stable, so each block keeps the edge order that decides ties between equal candidates
+        order = np.argsort(edge_owner, kind="stable")
+        self.offsets = np.searchsorted(edge_owner[order], np.arange(num_blocks + 1))
+        self.shared = [_SharedArray.create(array) for array in (
+            src[order], dst[order], weight[order], order,
+            np.ones(len(src), dtype=bool),        # active, in the caller's edge order
+            np.zeros(num_nodes),                  # distance after the previous pass
+            np.zeros(num_nodes),                  # distance after this pass
+            np.full(num_nodes, -1, dtype=np.int64),
+        )]
+        self.active, self.distance, self.next_distance, self.predecessor = (block.array for block in self.shared[4:])
+
+    def __call__(self, distance: np.ndarray, predecessor: np.ndarray, active: np.ndarray) -> bool:
+        self.active[:] = active
+        self.distance[:] = distance
+        self.next_distance[:] = distance
+        self.predecessor[:] = predecessor
+        specs = [block.spec for block in self.shared]
+        futures = [
+            self.executor.submit(_relax_block, specs, int(start), int(stop), self.tolerance)
+            for start, stop in zip(self.offsets[:-1], self.offsets[1:]) if stop > start
+        ]
+        improved = [future.result() for future in futures]
+        distance[:] = self.next_distance
+        predecessor[:] = self.predecessor
+        return any(improved)
+
+    def release(self):
+        for block in self.shared:
+            block.release()
+
+
+_attached: Dict[str, "_SharedArray"] = {}
+
+
+def _relax_block(specs: List[Tuple[str, str, int]], start: int, stop: int, tolerance: float) -> bool:
+    """Process-pool entry point: one pass over the edges into one block of nodes."""
+    # A component search runs many passes over the same blocks, so workers keep them
+    # attached until the next search hands over new ones
+    if any(spec[0] not in _attached for spec in specs):
+        for block in _attached.values():
+            block.release()
+        _attached.clear()
+        _attached.update((spec[0], _SharedArray.attach(*spec)) for spec in specs)
+    src, dst, weight, order, active, distance, next_distance, predecessor = (_attached[spec[0]].array for spec in specs)
+    src, dst, weight = src[start:stop], dst[start:stop], weight[start:stop]
+    return relax_edges(src, dst, weight, active[order[start:stop]], distance, next_distance, predecessor, tolerance)
+
+
+class _SharedArray:
+    """A NumPy array backed by a named shared memory block."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, dtype: str, length: int, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.array = np.ndarray((length,), dtype=dtype, buffer=shm.buf)
+        self.spec = (shm.name, dtype, length)
+
+    @classmethod
+    def create(cls, array: np.ndarray) -> "_SharedArray":
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        block = cls(shm, array.dtype.str, len(array), owner=True)
+        block.array[:] = array
+        return block
+
+    @classmethod
+    def attach(cls, name: str, dtype: str, length: int) -> "_SharedArray":
+        # Pool workers share the parent's resource tracker, so attaching does not
+        # take ownership; only the creating process unlinks the block
+        return cls(shared_memory.SharedMemory(name=name), dtype, length, owner=False)
+
+    def release(self):
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,193 @@
+import numpy as np
+from typing import Iterable, Iterator, Tuple
+
+from data.TokenGraph import TokenGraph
+
+MAX_HOPS = 3
+
+
+class ShortCycleIndex:
+    """
+    Precomputed 2-hop round trips and 3-hop triangles of a TokenGraph.
+
+    Each cycle is stored as integer arrays of token ids and CSR edge slots
+    (rows padded to MAX_HOPS), together with an edge -> cycles reverse index.
+    When pool reserves change in place, only the cycles through the touched
+    edges have their log-weight sums recomputed, in one vectorized gather, so
+    profitable short cycles are known without a Bellman-Ford pass. When pools
+    are added or removed (edge slots move), the known cycles are re-pointed at
+    their new slots, cycles that lost a hop are dropped and only the cycles
+    through the changed pools are enumerated.
+    """
+
+    def __init__(self, tolerance: float = 1e-12, chunk_wedges: int = 1 << 20):
+        self.tolerance = tolerance
+        self.chunk_wedges = chunk_wedges  # Bounds the wedge arrays built during enumeration
+        self.version = None
+        self.nodes = np.empty((0, MAX_HOPS), dtype=np.int64)  # Token ids, padded with -1
+        self.edges = np.zeros((0, MAX_HOPS), dtype=np.int64)  # Edge slots, padded with 0
+        self.mask = np.zeros((0, MAX_HOPS), dtype=bool)
+        self.totals = np.empty(0)  # Sum of log weights per cycle; negative means profitable
+        self.edge_ptr = np.zeros(1, dtype=np.int64)
+        self.edge_cycles = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.totals)
+
+    def build(self, graph: TokenGraph):
+        """Enumerate every 2- and 3-cycle of the graph, canonically rotated to start at its smallest id."""
+        src, dst = graph.edge_endpoints()
+        pair_nodes, pair_edges = self._round_trips(graph, src, dst)
+        triangle_nodes, triangle_edges = self._triangles(graph, src, dst)
+
+        count = len(pair_nodes) + len(triangle_nodes)
+        nodes = np.full((count, MAX_HOPS), -1, dtype=np.int64)
+        edges = np.zeros((count, MAX_HOPS), dtype=np.int64)
+        nodes[:len(pair_nodes), :2] = pair_nodes
+        edges[:len(pair_nodes), :2] = pair_edges
+        nodes[len(pair_nodes):] = triangle_nodes
+        edges[len(pair_nodes):] = triangle_edges
+        self._load(graph, nodes, edges)
+
+    def _load(self, graph: TokenGraph, nodes: np.ndarray, edges: np.ndarray):
+        """Install cycles (token ids and matching edge slots) and rebuild the reverse index and totals."""
+        count = len(nodes)
+        self.nodes = nodes
+        self.edges = edges
+        self.mask = nodes >= 0
+
+        # Reverse index: cycles through each edge slot, grouped CSR-style
+        flat_edges = self.edges[self.mask]
+        flat_cycles = np.repeat(np.arange(count), self.mask.sum(axis=1))
+        order = np.argsort(flat_edges, kind="stable")
+        self.edge_cycles = flat_cycles[order]
+        self.edge_ptr = np.zeros(graph.num_edges + 1, dtype=np.int64)
+        np.cumsum(np.bincount(flat_edges, minlength=graph.num_edges), out=self.edge_ptr[1:])
+
+        self.totals = np.where(self.mask, graph.weights[self.edges], 0.0).sum(axis=1)
+        self.version = graph.topology_version
+
+    def _round_trips(self, graph: TokenGraph, src: np.ndarray, dst: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        forward = np.flatnonzero(src < dst)
+        backward = graph.edge_slots(dst[forward], src[forward])
+        both = backward >= 0
+        forward, backward = forward[both], backward[both]
+        return np.stack([src[forward], dst[forward]], axis=1), np.stack([forward, backward], axis=1)
+
+    def _triangles(self, graph: TokenGraph, src: np.ndarray, dst: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Wedges a -> b -> c with a the smallest id, closed by an edge c -> a
+        first = np.flatnonzero(src < dst)
+        nodes, edges = [], []
+        for ab in self._wedge_chunks(graph, first, dst):
+            ab, bc = self._wedges(graph, ab, dst[ab])
+            a, b, c = src[ab], dst[ab], dst[bc]
+            keep = c > a
+            ab, bc, a, b, c = ab[keep], bc[keep], a[keep], b[keep], c[keep]
+            ca = graph.edge_slots(c, a)
+            closed = ca >= 0
+            nodes.append(np.stack([a[closed], b[closed], c[closed]], axis=1))
+            edges.append(np.stack([ab[closed], bc[closed], ca[closed]], axis=1))
+        if not nodes:
+            return np.empty((0, 3), dtype=np.int64), np.empty((0, 3), dtype=np.int64)
+        return np.concatenate(nodes), np.concatenate(edges)
+
+    def _wedge_chunks(self, graph: TokenGraph, first: np.ndarray, dst: np.ndarray) -> Iterator[np.ndarray]:
+        """
+        Split first edges a -> b into chunks expanding to about chunk_wedges wedges each,
+        so a hub b does not blow up the arrays (a single edge can still exceed the bound).
+        """
+        wedges = np.cumsum(np.diff(graph.indptr)[dst[first]])
+        start = 0
+        while start < len(first):
+            base = wedges[start - 1] if start else 0
+            end = max(int(np.searchsorted(wedges, base + self.chunk_wedges, side="right")), start + 1)
+            yield first[start:end]
+            start = end
+
+    @staticmethod
+    def _wedges(graph: TokenGraph, ab: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Expand edges ab (ending at tokens b) into (ab, bc) slot pairs for every edge b -> c."""
+        counts = np.diff(graph.indptr)[b]
+        ab = np.repeat(ab, counts)
+        # Slot of every b -> c edge: b's row start plus the position within the row
+        offsets = np.arange(len(ab)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return ab, np.repeat(graph.indptr[b], counts) + offsets
+
+    def _cycles_through(self, graph: TokenGraph, slots: np.ndarray) -> np.ndarray:
+        """Canonical node rows of every 2- and 3-cycle that uses one of the given edge slots."""
+        x = np.searchsorted(graph.indptr, slots, side="right") - 1
+        y = graph.indices[slots].astype(np.int64)
+        rows = []
+
+        back = graph.edge_slots(y, x) >= 0
+        pairs = np.full((int(back.sum()), MAX_HOPS), -1, dtype=np.int64)
+        pairs[:, 0] = np.minimum(x[back], y[back])
+        pairs[:, 1] = np.maximum(x[back], y[back])
+        rows.append(pairs)
+
+        # Triangles x -> y -> z -> x, rotated so the smallest id comes first
+        for chunk in self._wedge_chunks(graph, np.arange(len(slots)), y):
+            k, yz = self._wedges(graph, chunk, y[chunk])
+            z = graph.indices[yz].astype(np.int64)
+            closed = (z != x[k]) & (graph.edge_slots(z, x[k]) >= 0)
+            triangles = np.stack([x[k][closed], y[k][closed], z[closed]], axis=1)
+            shift = np.argmin(triangles, axis=1)[:, None]
+            rows.append(np.take_along_axis(triangles, (shift + np.arange(3)) % 3, axis=1))
+        return np.unique(np.concatenate(rows), axis=0)
+
+    def _reindex(self, graph: TokenGraph, changed_slots: np.ndarray):
+        """After edge slots moved: re-point known cycles, drop broken ones, add cycles through changed_slots."""
+        found = self._cycles_through(graph, changed_slots)
+        # Rows packed into one integer each (ids are < base), so new cycles are matched against known ones cheaply
+        base = graph.num_tokens + 1
+        if base ** MAX_HOPS < 1 << 62:
+            def keys(rows):
+                return ((rows[:, 0] + 1) * base + rows[:, 1] + 1) * base + rows[:, 2] + 1
+            found = found[~np.isin(keys(found), keys(self.nodes))]
+            nodes = np.concatenate([self.nodes, found])
+        else:
+            nodes = np.unique(np.concatenate([self.nodes, found]), axis=0)
+        mask = nodes >= 0
+        # Hop k runs from column k to the next used column, wrapping back to column 0
+        following = np.where(np.roll(mask, -1, axis=1), np.roll(nodes, -1, axis=1), nodes[:, :1])
+        edges = np.zeros(nodes.shape, dtype=np.int64)
+        edges[mask] = graph.edge_slots(nodes[mask], following[mask])
+        intact = ~((edges < 0) & mask).any(axis=1)
+        self._load(graph, nodes[intact], edges[intact])
+
+    def refresh(self, graph: TokenGraph, changed_pairs: Iterable[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        Bring the index up to date after pool updates. changed_pairs are
+        (token0 id, token1 id) pools that were updated, added or removed since
+        the last refresh; None means a full rebuild. Returns the ids of the
+        cycles through the changed pools.
+        """
+        if changed_pairs is None or self.version is None:
+            self.build(graph)
+            return np.arange(len(self))
+        pairs = np.array(list(changed_pairs), dtype=np.int64).reshape(-1, 2)
+        pairs = pairs[(pairs >= 0).all(axis=1)]
+        slots = graph.edge_slots(np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]]))
+        slots = slots[slots >= 0]
+        if self.version != graph.topology_version:
+            self._reindex(graph, slots)
+        if len(slots) == 0:
+            return np.empty(0, dtype=np.int64)
+        starts, ends = self.edge_ptr[slots], self.edge_ptr[slots + 1]
+        counts = ends - starts
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        ids = np.unique(self.edge_cycles[positions])
+        self.totals[ids] = np.where(self.mask[ids], graph.weights[self.edges[ids]], 0.0).sum(axis=1)
+        return ids
+
+    def profitable(self, ids: np.ndarray = None, sources: np.ndarray = None) -> np.ndarray:
+        """Ids of negative-weight cycles (optionally among ids / through any of sources), best first."""
+        ids = np.arange(len(self)) if ids is None else np.asarray(ids, dtype=np.int64)
+        ids = ids[self.totals[ids] < -self.tolerance]
+        if sources is not None:
+            ids = ids[np.isin(self.nodes[ids], sources).any(axis=1)]
+        return ids[np.argsort(self.totals[ids], kind="stable")]
+
+    def cycle(self, cycle_id: int) -> Tuple[int, ...]:
+        """Token ids of one cycle."""
+        return tuple(self.nodes[cycle_id][self.mask[cycle_id]].tolist())
@@ -0,0 +1,474 @@
+import numpy as np
+from typing import Callable, Dict, Hashable, Iterable, List, Sequence, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenInterner:
+    """Map token addresses to dense integer ids (and back). Ids are never reused."""
+
+    def __init__(self):
+        self._ids: Dict[Hashable, int] = {}
+        self._addresses: List[Hashable] = []
+
+    def intern(self, address: Hashable) -> int:
+        token_id = self._ids.get(address)
+        if token_id is None:
+            token_id = len(self._addresses)
+            self._ids[address] = token_id
+            self._addresses.append(address)
+        return token_id
+
+    def get(self, address: Hashable, default: int = -1) -> int:
+        return self._ids.get(address, default)
+
+    def address(self, token_id: int) -> Hashable:
+        return self._addresses[token_id]
+
+    def __contains__(self, address: Hashable) -> bool:
+        return address in self._ids
+
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+
+class TokenGraph:
+    """
+    Directed token graph stored as CSR arrays over interned token ids.
+
+    Edge k runs from the row token to indices[k] and carries weights[k] (its log
+    weight; the negated log exchange rate for pools), reserve0[k] (reserve of the
+    input token) and reserve1[k] (reserve of the output token). Rows are sorted so
+    single edges can be found with a binary search; weight updates happen in place,
+    while topology changes are queued and applied by one rebuild in commit().
+    """
+
+    def __init__(self):
+        self.tokens = TokenInterner()
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.empty(0, dtype=np.int32)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.reserve0 = np.empty(0, dtype=np.float64)
+        self.reserve1 = np.empty(0, dtype=np.float64)
+        self._pending_add: Dict[Tuple[int, int], Tuple[float, float, float]] = {}
+        self._pending_remove: Set[Tuple[int, int]] = set()
+        self.topology_version = 0  # Bumped whenever edge slots move (CSR rebuild)
+        self.logger = logger
+
+    # --- Construction ---
+
+    @classmethod
+    def from_edges(cls, src, dst, weights, reserve0, reserve1, tokens: TokenInterner = None) -> "TokenGraph":
+        """Build a graph directly from parallel edge arrays of token ids."""
+        graph = cls()
+        if tokens is not None:
+            graph.tokens = tokens
+        else:
+            # Without an interner the ids are their own addresses
+            num_tokens = int(max(np.max(src, initial=-1), np.max(dst, initial=-1))) + 1
+            for token_id in range(num_tokens):
+                graph.tokens.intern(token_id)
+        graph._load_edges(np.asarray(src), np.asarray(dst), np.asarray(weights, dtype=np.float64),
+                          np.asarray(reserve0, dtype=np.float64), np.asarray(reserve1, dtype=np.float64))
+        return graph
+
+    def set_pools(self, pools: Iterable[Tuple[Hashable, Hashable, float, float]]):
+        """
+        Replace all edges with both directions of every (token0, token1, reserve0, reserve1) pool.
+        Pools with an empty (or non-finite) reserve have no exchange rate and are skipped.
+        """
+        pools = list(pools)
+        r0 = np.fromiter((float(p[2]) for p in pools), dtype=np.float64, count=len(pools))
+        r1 = np.fromiter((float(p[3]) for p in pools), dtype=np.float64, count=len(pools))
+        usable = _usable_reserves(r0, r1)
+        if not usable.all():
+            self.logger.warning(f"Skipping {int((~usable).sum())} pools with empty reserves")
+            pools = [pool for pool, ok in zip(pools, usable.tolist()) if ok]
+            r0, r1 = r0[usable], r1[usable]
+        ids0 = np.fromiter((self.tokens.intern(p[0]) for p in pools), dtype=np.int64, count=len(pools))
+        ids1 = np.fromiter((self.tokens.intern(p[1]) for p in pools), dtype=np.int64, count=len(pools))
+        log_price = np.log(r1 / r0)
+        self._pending_add.clear()
+        self._pending_remove.clear()
+        self._load_edges(np.concatenate([ids0, ids1]), np.concatenate([ids1, ids0]),
+                         np.concatenate([-log_price, log_price]),
+                         np.concatenate([r0, r1]), np.concatenate([r1, r0]))
+
+    def set_pool(self, token0: Hashable, token1: Hashable, reserve0: float, reserve1: float):
+        """
+        Set the reserves of one pool, in place if its edges exist, otherwise on the next commit().
+        A pool whose reserve dropped to zero has no exchange rate and is queued for removal instead.
+        """
+        reserve0, reserve1 = float(reserve0), float(reserve1)
+        if not _usable_reserves(reserve0, reserve1):
+            self.logger.warning(f"Removing pool {token0} - {token1} with empty reserves")
+            self.remove_pool(token0, token1)
+            return
+        u, v = self.tokens.intern(token0), self.tokens.intern(token1)
+        log_price = float(np.log(reserve1 / reserve0))
+        for a, b, w, r_in, r_out in ((u, v, -log_price, reserve0, reserve1), (v, u, log_price, reserve1, reserve0)):
+            self._pending_remove.discard((a, b))
+            slot = self._slot(a, b)
+            if slot < 0:
+                self._pending_add[(a, b)] = (w, r_in, r_out)
+            else:
+                self.weights[slot] = w
+                self.reserve0[slot] = r_in
+                self.reserve1[slot] = r_out
+
+    def remove_pool(self, token0: Hashable, token1: Hashable):
+        """Queue both directions of a pool for removal on the next commit()."""
+        u, v = self.tokens.get(token0), self.tokens.get(token1)
+        if u < 0 or v < 0:
+            return
+        for edge in ((u, v), (v, u)):
+            self._pending_add.pop(edge, None)
+            self._pending_remove.add(edge)
+
+    def commit(self):
+        """Apply queued edge additions and removals with a single CSR rebuild."""
+        if not self._pending_add and not self._pending_remove:
+            return
+        src, dst = self.edge_endpoints()
+        keep = np.ones(len(dst), dtype=bool)
+        for a, b in self._pending_remove:
+            slot = self._slot(a, b)
+            if slot >= 0:
+                keep[slot] = False
+        added = list(self._pending_add.items())
+        self._load_edges(
+            np.concatenate([src[keep], np.array([e[0] for e, _ in added], dtype=np.int64)]),
+            np.concatenate([dst[keep], np.array([e[1] for e, _ in added], dtype=np.int64)]),
+            np.concatenate([self.weights[keep], np.array([a[0] for _, a in added], dtype=np.float64)]),
+            np.concatenate([self.reserve0[keep], np.array([a[1] for _, a in added], dtype=np.float64)]),
+            np.concatenate([self.reserve1[keep], np.array([a[2] for _, a in added], dtype=np.float64)]),
+        )
+        self._pending_add.clear()
+        self._pending_remove.clear()
+
+    def snapshot(self) -> "TokenGraph":
+        """
+        Copy of the committed edges that later updates of this graph do not touch.
+        The token interner is shared: it is append-only, so existing ids stay valid.
+        """
+        graph = TokenGraph()
+        graph.tokens = self.tokens
+        graph.indptr = self.indptr.copy()
+        graph.indices = self.indices.copy()
+        graph.weights = self.weights.copy()
+        graph.reserve0 = self.reserve0.copy()
+        graph.reserve1 = self.reserve1.copy()
+        graph.topology_version = self.topology_version
+        return graph
+
+    def clear(self):
+        """Drop all edges; interned token ids are kept so they stay stable across rebuilds."""
+        self._pending_add.clear()
+        self._pending_remove.clear()
+        self._load_edges(*(np.empty(0, dtype=np.int64),) * 2, *(np.empty(0, dtype=np.float64),) * 3)
+
+    def _load_edges(self, src, dst, weights, reserve0, reserve1):
+        """Sort edges into CSR order; for duplicate (src, dst) pairs the last one wins."""
+        num_tokens = len(self.tokens)
+        order = np.lexsort((np.arange(len(src))[::-1], dst, src))
+        src, dst = src[order], dst[order]
+        first = np.ones(len(src), dtype=bool)
+        first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        order, src, dst = order[first], src[first], dst[first]
+
+        self.indptr = np.zeros(num_tokens + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_tokens), out=self.indptr[1:])
+        self.indices = dst.astype(np.int32)
+        self.weights = weights[order]
+        self.reserve0 = reserve0[order]
+        self.reserve1 = reserve1[order]
+        self.topology_version += 1
+
+    # --- Queries ---
+
+    @property
+    def num_tokens(self) -> int:
+        return len(self.tokens)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    @property
+    def nodes(self) -> List[Hashable]:
+        """Addresses of all tokens that have at least one edge."""
+        degree = np.diff(self.indptr)
+        return [self.tokens.address(i) for i in np.flatnonzero(degree).tolist()]
+
+    def __contains__(self, address: Hashable) -> bool:
+        token_id = self.tokens.get(address)
+        return 0 <= token_id < len(self.indptr) - 1 and self.indptr[token_id + 1] > self.indptr[token_id]
+
+    def __len__(self) -> int:
+        return self.num_tokens
+
+    def _slot(self, u: int, v: int) -> int:
+        """Position of edge u -> v in the CSR arrays, or -1."""
+        if u < 0 or v < 0 or u + 1 >= len(self.indptr):
+            return -1
+        start, end = self.indptr[u], self.indptr[u + 1]
+        pos = start + np.searchsorted(self.indices[start:end], v)
+        if pos < end and self.indices[pos] == v:
+            return int(pos)
+        return -1
+
+    def edge_slots(self, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """Vectorized _slot: CSR positions of the edges src[i] -> dst[i], -1 where missing."""
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        num_nodes = len(self.indptr) - 1
+        slots = np.full(len(src), -1, dtype=np.int64)
+        known = (src >= 0) & (dst >= 0) & (src < num_nodes)
+        if not known.any() or len(self.indices) == 0:
+            return slots
+        edge_src, edge_dst = self.edge_endpoints()
+        keys = edge_src * num_nodes + edge_dst
+        wanted = src[known] * num_nodes + dst[known]
+        pos = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        slots[known] = np.where(keys[pos] == wanted, pos, -1)
+        return slots
+
+    def has_edge(self, token0: Hashable, token1: Hashable) -> bool:
+        return self._slot(self.tokens.get(token0), self.tokens.get(token1)) >= 0
+
+    def weight(self, token0: Hashable, token1: Hashable) -> float:
+        slot = self._slot(self.tokens.get(token0), self.tokens.get(token1))
+        if slot < 0:
+            raise KeyError(f"No edge {token0} -> {token1}")
+        return float(self.weights[slot])
+
+    def path_reserves(self, paths: Iterable[Sequence[Hashable]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gather hop reserves for closed token paths ([a, b, ..., a]).
+        Returns (reserve_in, reserve_out, mask) padded to the longest path, plus a
+        per-path valid flag that is False when a hop has no edge in the graph.
+        """
+        paths = [list(path) for path in paths]
+        max_hops = max((len(path) - 1 for path in paths), default=0)
+        reserve_in = np.ones((len(paths), max_hops))
+        reserve_out = np.ones((len(paths), max_hops))
+        mask = np.zeros((len(paths), max_hops), dtype=bool)
+        valid = np.ones(len(paths), dtype=bool)
+        for row, path in enumerate(paths):
+            for hop, (token0, token1) in enumerate(zip(path, path[1:])):
+                slot = self._slot(self.tokens.get(token0), self.tokens.get(token1))
+                if slot < 0:
+                    valid[row] = False
+                    break
+                reserve_in[row, hop] = self.reserve0[slot]
+                reserve_out[row, hop] = self.reserve1[slot]
+                mask[row, hop] = True
+        valid &= mask.any(axis=1)
+        return reserve_in, reserve_out, mask, valid
+
+    def edge_endpoints(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Expand CSR rows into parallel (src, dst) id arrays."""
+        src = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr))
+        return src, self.indices.astype(np.int64)
+
+    def edge_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return parallel (src, dst, weight) arrays for all edges."""
+        src, dst = self.edge_endpoints()
+        return src, dst, self.weights
+
+    def to_dense(self, fill: float = np.inf) -> np.ndarray:
+        """Return a V x V weight matrix, with fill where there is no edge."""
+        num_tokens = len(self.indptr) - 1
+        dense = np.full((num_tokens, num_tokens), fill, dtype=np.float64)
+        src, dst = self.edge_endpoints()
+        dense[src, dst] = self.weights
+        return dense
+
+    def to_networkx(self):
+        """Export to a networkx.DiGraph keyed by address. For debugging only."""
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        src, dst = self.edge_endpoints()
+        for u, v, k in zip(src.tolist(), dst.tolist(), range(len(dst))):
+            graph.add_edge(self.tokens.address(u), self.tokens.address(v), weight=float(self.weights[k]),
+                           reserve0=float(self.reserve0[k]), reserve1=float(self.reserve1[k]))
+        return graph
+
+    # --- Cycle Detection ---
+
+    def negative_cycles(self, max_cycles: int = None, tolerance: float = 1e-12) -> Set[Tuple[int, ...]]:
+        """
+        Collect distinct negative cycles as canonically rotated tuples of token ids.
+        See find_negative_cycles for the search and what it guarantees.
+        """
+        src, dst, weight = self.edge_arrays()
+        return find_negative_cycles(len(self.indptr) - 1, src, dst, weight, max_cycles, tolerance)
+
+    def strongly_connected_components(self) -> np.ndarray:
+        """
+        Label every token with its strongly connected component (iterative Tarjan
+        over the CSR arrays). Negative cycles never leave a component.
+        """
+        num_nodes = len(self.indptr) - 1
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        index = [-1] * num_nodes
+        lowlink = [0] * num_nodes
+        on_stack = [False] * num_nodes
+        labels = np.full(num_nodes, -1, dtype=np.int64)
+        stack, counter, num_components = [], 0, 0
+        for root in range(num_nodes):
+            if index[root] >= 0:
+                continue
+            work = [(root, indptr[root])]
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                node, edge = work[-1]
+                if edge < indptr[node + 1]:
+                    work[-1] = (node, edge + 1)
+                    child = indices[edge]
+                    if index[child] < 0:
+                        index[child] = lowlink[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack[child] = True
+                        work.append((child, indptr[child]))
+                    elif on_stack[child]:
+                        lowlink[node] = min(lowlink[node], index[child])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        labels[member] = num_components
+                        if member == node:
+                            break
+                    num_components += 1
+        return labels
+
+    def cycle_weight(self, cycle: Tuple[int, ...]) -> float:
+        """Total weight of a closed cycle of token ids."""
+        return float(sum(self.weights[self._slot(u, v)] for u, v in zip(cycle, cycle[1:] + cycle[:1])))
+
+    @staticmethod
+    def _predecessor_cycles(predecessor, starts=None) -> Set[Tuple[int, ...]]:
+        """
+        Find the cycles of the predecessor graph reachable from starts (default: all
+        nodes), canonically rotated to start at their smallest id.
+        """
+        state = [0] * len(predecessor)  # 0 = unvisited, 1 = on current walk, 2 = done
+        predecessor = predecessor.tolist()
+        cycles = set()
+        for start in (range(len(predecessor)) if starts is None else starts):
+            walk = []
+            node = start
+            while node != -1 and state[node] == 0:
+                state[node] = 1
+                walk.append(node)
+                node = predecessor[node]
+            if node != -1 and state[node] == 1:
+                # Predecessor links point backwards along the trade direction
+                cycle = walk[walk.index(node):][::-1]
+                pivot = cycle.index(min(cycle))
+                cycles.add(tuple(cycle[pivot:] + cycle[:pivot]))
+            for visited in walk:
+                state[visited] = 2
+        return cycles
+
+    @staticmethod
+    def _cycle_descendants(predecessor) -> np.ndarray:
+        """
+        Mask of the nodes whose predecessor chain runs into a cycle, the cycle nodes
+        included. Pointer doubling: after log2(n) squarings of the successor map a
+        chain that ends at a root sits on that root, one that ends in a cycle on it.
+        """
+        num_nodes = len(predecessor)
+        jump = np.where(predecessor < 0, np.arange(num_nodes), predecessor)
+        for _ in range(max(1, int(np.ceil(np.log2(max(num_nodes, 2)))))):
+            jump = jump[jump]
+        return predecessor[jump] >= 0
+
+
+def _usable_reserves(reserve0, reserve1):
+    """True where both reserves are positive and finite, i.e. the pool has an exchange rate."""
+    return np.isfinite(reserve0) & np.isfinite(reserve1) & (np.asarray(reserve0) > 0) & (np.asarray(reserve1) > 0)
+
+
+def find_negative_cycles(num_nodes: int, src: np.ndarray, dst: np.ndarray, weight: np.ndarray,
+                         max_cycles: int = None, tolerance: float = 1e-12,
+                         relax: Callable[[np.ndarray, np.ndarray, np.ndarray], bool] = None) -> Set[Tuple[int, ...]]:
+    """
+    Distinct negative cycles of an edge list sorted by (src, dst), as canonically
+    rotated tuples of node ids.
+
+    Super-source Bellman-Ford: every node starts at distance 0 and each pass
+    relaxes all edges at once. After every pass the predecessor graph is checked
+    for cycles. Each new cycle is recorded and all of its hops are masked out.
+    Every node whose predecessor chain runs into it is reset to distance 0, so
+    relaxation restarts there. Without the reset, one cycle's ever-falling
+    distances spread through the graph and shadow the others. The search runs
+    until a pass improves nothing, or until max_cycles cycles have been found.
+    Once it converges, no negative cycle is left among the unmasked edges. Every
+    negative cycle of the graph therefore shares a hop with a returned one. The
+    number of distinct negative cycles can be exponential (any detour around a
+    mispriced hop is one), so they are not all listed.
+
+    relax(distance, predecessor, active) runs one pass in place and returns
+    whether anything improved; it defaults to relax_edges over all edges
+    (ShardedCycleDetector swaps in one that splits the pass across processes).
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    if relax is None:
+        def relax(distance, predecessor, active):
+            return relax_edges(src, dst, weight, active, distance, distance, predecessor, tolerance)
+    keys = src * num_nodes + dst
+    active = np.ones(len(src), dtype=bool)
+    distance = np.zeros(num_nodes)
+    predecessor = np.full(num_nodes, -1, dtype=np.int64)
+    found = set()
+    while True:
+        if not relax(distance, predecessor, active):
+            break
+
+        tainted = TokenGraph._cycle_descendants(predecessor)
+        if not tainted.any():
+            continue
+        cycles = TokenGraph._predecessor_cycles(predecessor, np.flatnonzero(tainted).tolist())
+        for cycle in cycles:
+            found.add(cycle)
+            hops = np.searchsorted(keys, [u * num_nodes + v for u, v in zip(cycle, cycle[1:] + cycle[:1])])
+            active[hops] = False
+        if max_cycles is not None and len(found) >= max_cycles:
+            break
+        distance[tainted] = 0.0
+        predecessor[tainted] = -1
+    return found
+
+
+def relax_edges(src: np.ndarray, dst: np.ndarray, weight: np.ndarray, active: np.ndarray, distance: np.ndarray,
+                next_distance: np.ndarray, predecessor: np.ndarray, tolerance: float) -> bool:
+    """
+    One Bellman-Ford pass over the active edges, reading `distance` and writing
+    improved distances into `next_distance` (which may be `distance` itself) and
+    their predecessors. Returns whether any distance improved. When several edges
+    reach a node at the same best distance, the last one in edge order wins.
+    """
+    live_src, live_dst = src[active], dst[active]
+    candidate = distance[live_src] + weight[active]
+    best = distance.copy()
+    np.minimum.at(best, live_dst, candidate)
+    improved = (candidate == best[live_dst]) & (candidate < distance[live_dst] - tolerance)
+    if not improved.any():
+        return False
+    predecessor[live_dst[improved]] = live_src[improved]
+    next_distance[live_dst[improved]] = candidate[improved]
+    return True
@@ -0,0 +1,204 @@
+import csv
+import os
+import threading
+import time
+import numpy as np
+from typing import Hashable, List, Sequence
+import logging
+
+from data.TokenGraph import TokenInterner
+
+logger = logging.getLogger(__name__)
+
+MAX_PATH = 8  # Longest path (in tokens) a record holds inline; longer ones go to the ".paths" sidecar
+MAGIC = b"QTJOURNAL\x00\x00\x00\x00\x00\x00\x01"  # 16-byte file header, last byte is the format version
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("amount", "<f8"),
+    ("gas_used", "<u8"),
+    ("profit", "<f8"),
+    ("tx_hash", "u1", (32,)),
+    ("path_length", "u1"),
+    ("path", "<i4", (MAX_PATH,)),
+])
+
+
+class TradeJournal:
+    """
+    Buffered binary journal of executed trades.
+
+    record() only copies the trade into a preallocated ring buffer; a background
+    thread appends buffered records to the journal file every flush_interval
+    seconds and fsyncs it every fsync_interval seconds. Records are fixed-size
+    RECORD_DTYPE rows, with paths stored as token ids interned in a sidecar
+    ".tokens" file (one address per line), so the file can be memory-mapped.
+    Paths longer than MAX_PATH keep their first MAX_PATH ids inline and are
+    written in full, in record order, to a ".paths" sidecar (space-separated ids
+    per line); journal_paths() puts them back together.
+    """
+
+    def __init__(self, path: str = "trade_journal.bin", capacity: int = 4096,
+                 flush_interval: float = 0.5, fsync_interval: float = 5.0):
+        self.path = path
+        self.tokens_path = path + ".tokens"
+        self.paths_path = path + ".paths"
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.logger = logger
+
+        self.tokens = TokenInterner()
+        if os.path.exists(self.tokens_path):
+            with open(self.tokens_path) as f:
+                for line in f:
+                    self.tokens.intern(line.rstrip("\n"))
+        self._written_tokens = len(self.tokens)
+
+        self._ring = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self._head = 0  # Next slot to write into
+        self._size = 0  # Records waiting for the writer
+        self._long_paths = []  # Full id lists of buffered records longer than MAX_PATH
+        self._cond = threading.Condition()
+        self._closed = False
+
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab")
+        if new_file:
+            self._file.write(MAGIC)
+        self._tokens_file = open(self.tokens_path, "a")
+        self._paths_file = None  # Opened on the first long path
+        self._last_fsync = time.monotonic()
+
+        self._writer = threading.Thread(target=self._run, name="trade-journal-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, path: Sequence[Hashable], amount: float, tx_hash: bytes, gas_used: int = 0, profit: float = 0.0):
+        """Queue one executed trade. Blocks only if the ring buffer is full."""
+        with self._cond:
+            if self._closed:
+                raise ValueError("Trade journal is closed")
+            while self._size == len(self._ring):
+                self._cond.notify_all()
+                self._cond.wait()
+            slot = self._ring[self._head]
+            slot["timestamp"] = time.time()
+            slot["amount"] = float(amount)
+            slot["gas_used"] = gas_used
+            slot["profit"] = float(profit)
+            slot["tx_hash"] = np.frombuffer(bytes(tx_hash or b"").ljust(32, b"\0")[:32], dtype=np.uint8)
+            slot["path_length"] = min(len(path), 255)  # Saturates; the sidecar line has the full path
+            path_ids = [self.tokens.intern(str(token)) for token in path]
+            ids = slot["path"]
+            ids[:] = -1
+            ids[:min(len(path), MAX_PATH)] = path_ids[:MAX_PATH]
+            if len(path) > MAX_PATH:
+                self._long_paths.append(path_ids)
+            self._head = (self._head + 1) % len(self._ring)
+            self._size += 1
+            if self._size >= len(self._ring) // 2:
+                self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and self._size < len(self._ring) // 2:
+                    self._cond.wait(self.flush_interval)
+                batch = self._drain()
+                long_paths, self._long_paths = self._long_paths, []
+                new_tokens = [self.tokens.address(i) for i in range(self._written_tokens, len(self.tokens))]
+                self._written_tokens = len(self.tokens)
+                closed = self._closed
+                self._cond.notify_all()
+            try:
+                self._write(batch, new_tokens, long_paths, force_fsync=closed)
+            except Exception as e:
+                self.logger.error(f"Error writing trade journal: {e}")
+            if closed:
+                return
+
+    def _drain(self) -> np.ndarray:
+        """Copy all buffered records out of the ring, oldest first. Caller holds the lock."""
+        if self._size == 0:
+            return self._ring[:0].copy()
+        start = (self._head - self._size) % len(self._ring)
+        indices = (start + np.arange(self._size)) % len(self._ring)
+        batch = self._ring[indices]
+        self._size = 0
+        return batch
+
+    def _write(self, batch: np.ndarray, new_tokens: List[str], long_paths: List[List[int]] = (),
+               force_fsync: bool = False):
+        # Tokens and long paths first, so every record in the journal file can be resolved
+        if new_tokens:
+            self._tokens_file.write("".join(f"{token}\n" for token in new_tokens))
+            self._tokens_file.flush()
+        if long_paths:
+            if self._paths_file is None:
+                self._paths_file = open(self.paths_path, "a")
+            self._paths_file.write("".join(" ".join(map(str, ids)) + "\n" for ids in long_paths))
+            self._paths_file.flush()
+        if len(batch):
+            self._file.write(batch.tobytes())
+            self._file.flush()
+        if force_fsync or time.monotonic() - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._tokens_file.fileno())
+            if self._paths_file is not None:
+                os.fsync(self._paths_file.fileno())
+            os.fsync(self._file.fileno())
+            self._last_fsync = time.monotonic()
+
+    def close(self):
+        """Write out everything still buffered, fsync, and stop the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._file.close()
+        self._tokens_file.close()
+        if self._paths_file is not None:
+            self._paths_file.close()
+
+
+def read_journal(path: str = "trade_journal.bin") -> np.ndarray:
+    """Memory-map a journal file as a read-only RECORD_DTYPE array."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a trade journal")
+    count = (os.path.getsize(path) - len(MAGIC)) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=len(MAGIC), shape=(count,))
+
+
+def read_journal_tokens(path: str = "trade_journal.bin") -> List[str]:
+    """Token addresses of a journal, indexed by token id."""
+    with open(path + ".tokens") as f:
+        return [line.rstrip("\n") for line in f]
+
+
+def journal_paths(records: np.ndarray, path: str = "trade_journal.bin") -> List[List[int]]:
+    """Full token-id path of every record, with paths longer than MAX_PATH read from the ".paths" sidecar."""
+    long_paths = iter(())
+    if os.path.exists(path + ".paths"):
+        with open(path + ".paths") as f:
+            long_paths = iter([[int(i) for i in line.split()] for line in f])
+    paths = []
+    for record in records:
+        length = int(record["path_length"])
+        paths.append(next(long_paths) if length > MAX_PATH else record["path"][:length].tolist())
+    return paths
+
+
+def export_csv(path: str = "trade_journal.bin", csv_path: str = "arbitrage_logs.csv"):
+    """Export a journal to a human-readable CSV with token addresses in the path column."""
+    records = read_journal(path)
+    tokens = read_journal_tokens(path)
+    with open(csv_path, "w", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "path", "amount", "tx_hash", "gas_used", "profit"])
+        for record, ids in zip(records, journal_paths(records, path)):
+            token_path = [tokens[i] for i in ids]
+            writer.writerow([record["timestamp"], "|".join(token_path), record["amount"],
+                             "0x" + bytes(record["tx_hash"]).hex(), record["gas_used"], record["profit"]])
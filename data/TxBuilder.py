@@ -0,0 +1,89 @@
+from typing import Dict, List, Sequence, Tuple
+import logging
+
+from eth_account import Account
+from eth_utils import keccak, to_checksum_address
+
+logger = logging.getLogger(__name__)
+
+WORD = 32
+
+
+class TxBuilder:
+    """
+    Build and sign executeArbitrage transactions from pre-encoded templates.
+
+    The function selector and the static calldata head are computed once from
+    the contract ABI. Per transaction only the amount word, the path length and
+    the (cached) padded address words are concatenated, so no ABI resolution or
+    generic encoding happens on the hot path. Signing is pure-Python ECDSA that
+    holds the GIL, so batches are signed serially.
+    """
+
+    def __init__(self, contract_abi: List[Dict], contract_address: str, chain_id: int, private_key: str,
+                 fn_name: str = "executeArbitrage", gas: int = 500000):
+        self.contract_address = to_checksum_address(contract_address)
+        self.chain_id = chain_id
+        self.account = Account.from_key(private_key)
+        self.gas = gas
+        self.logger = logger
+
+        fn_abi = next((item for item in contract_abi if item.get("type") == "function" and item.get("name") == fn_name), None)
+        if fn_abi is None:
+            raise ValueError(f"Function {fn_name} not found in contract ABI")
+        input_types = [arg["type"] for arg in fn_abi["inputs"]]
+        if input_types != ["address[]", "uint256"]:
+            raise ValueError(f"Unsupported {fn_name} signature {input_types}, expected (address[], uint256)")
+        self.selector = keccak(text=f"{fn_name}({','.join(input_types)})")[:4]
+        # Head: offset of the dynamic address[] (two head words in), then the uint256 amount
+        self._head = self.selector + (2 * WORD).to_bytes(WORD, "big")
+        self._address_words: Dict[str, bytes] = {}
+
+    def _address_word(self, address: str) -> bytes:
+        word = self._address_words.get(address)
+        if word is None:
+            word = bytes(12) + bytes.fromhex(address[2:] if address.startswith("0x") else address)
+            if len(word) != WORD:
+                raise ValueError(f"Invalid address {address}")
+            self._address_words[address] = word
+        return word
+
+    def encode(self, path: Sequence[str], amount: int) -> bytes:
+        """Calldata for executeArbitrage(path, amount). The amount must fit a positive uint256."""
+        amount = int(amount)
+        if not 0 < amount < 1 << 256:
+            raise ValueError(f"Amount {amount} is not a positive uint256")
+        return b"".join((
+            self._head,
+            amount.to_bytes(WORD, "big"),
+            len(path).to_bytes(WORD, "big"),
+            *(self._address_word(token) for token in path),
+        ))
+
+    def build(self, path: Sequence[str], amount: int, nonce: int, gas_price: int) -> Dict:
+        return {
+            "to": self.contract_address,
+            "value": 0,
+            "data": self.encode(path, amount),
+            "gas": self.gas,
+            "gasPrice": gas_price,
+            "nonce": nonce,
+            "chainId": self.chain_id,
+        }
+
+    def sign(self, tx: Dict) -> bytes:
+        """Sign a transaction dict and return the raw transaction bytes."""
+        signed = self.account.sign_transaction(tx)
+        return bytes(getattr(signed, "raw_transaction", None) or signed.rawTransaction)
+
+    def sign_batch(self, txs: Sequence[Dict]) -> List[bytes]:
+        """Sign several transactions, returning raw bytes in input order."""
+        return [self.sign(tx) for tx in txs]
+
+    def build_and_sign_batch(self, orders: Sequence[Tuple[Sequence[str], int]], nonces: Sequence[int],
+                             gas_price: int) -> List[bytes]:
+        txs = [self.build(path, amount, nonce, gas_price) for (path, amount), nonce in zip(orders, nonces)]
+        return self.sign_batch(txs)
+
+    def close(self):
+        pass  # Nothing to release; kept so owners can close every component alike
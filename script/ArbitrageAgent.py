@@ -1,25 +1,36 @@
 # /home/uber/Desktop/quantum/scripts/ArbitrageAgent.py
-import networkx as nx
 from web3 import Web3
 import json
 import time
 import logging
-import csv
 import os
-from decimal import Decimal
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense
 from collections import deque
 import numpy as np
 import warnings
+from data.Cache import LRUCache, pooled_session
+from data.ConstantProductSolver import ConstantProductSolver
+from data.FeatureStore import FeatureStore
+from data.GasOracle import GasOracle
+from data.HedgedProvider import HedgedHTTPProvider
+from data.Metrics import METRICS
+from data.NonceManager import NonceManager
+from data.PendingState import MempoolFeed, PendingStateSimulator, decode_swap
+from data.ShardedDetector import ShardedCycleDetector
+from data.ShortCycleIndex import MAX_HOPS as SHORT_CYCLE_HOPS, ShortCycleIndex
+from data.TokenGraph import TokenGraph
+from data.TradeJournal import TradeJournal
+from data.TxBuilder import TxBuilder
 
 warnings.filterwarnings("ignore")
 
 class ArbitrageAgent:
-    def __init__(self, rpc_url, contract_address, private_key):
+    MAX_DECISION_STATES = 4096  # Scored-but-unsent path states kept for the feature store
+
+    def __init__(self, rpc_url, contract_address, private_key, batch_size=None, incremental=False,
+                 sizing_backend="keras", feature_store="feature_store", journal="trade_journal.bin",
+                 web3=None, contract=None, reserve_cache_size=65536,
+                 detection_workers=None, detection_hubs=None, hedge_delay=0.05,
+                 short_cycles=False, pending_feed=None):
         # --- Basic Setup ---
         self.contract_address = contract_address
         self.rpc_url = rpc_url  # corrected to rpc_url
@@ -28,93 +39,379 @@ class ArbitrageAgent:
         self.account = None  # Initialize account to None
         self.contract = None  # Initialize contract to None
 
+        # --- Reserve Fetching ---
+        # None keeps one getReserves() call per pair; an int packs that many
+        # eth_call requests into each JSON-RPC batch.
+        self.batch_size = batch_size
+        self.rpc_session = pooled_session()  # Keep-alive pool shared by web3 and batched reads
+        # A list of RPC URLs gets a hedged provider: reads are duplicated to the next
+        # fastest node after hedge_delay seconds, writes go to every node
+        self.rpc_provider = None
+        if isinstance(rpc_url, (list, tuple)):
+            self.rpc_provider = HedgedHTTPProvider(rpc_url, hedge_delay=hedge_delay)
+        # Reads are cached per block: (block, ...) -> result, so one block never reads the same pool twice
+        self.block_number = None
+        self.reserve_cache = LRUCache(reserve_cache_size, name="reserve_cache")
+
         # --- Graph Setup ---
-        self.arbitrage_graph = nx.DiGraph()
+        self.arbitrage_graph = TokenGraph()  # CSR arrays over interned token ids; to_networkx() for debugging
+        self.incremental = incremental  # Diff reserves against the last snapshot instead of rebuilding
+        self.reserve_snapshot = {}  # (token0, token1) -> (reserve0, reserve1) from the last build
+        self.dirty_tokens = set()  # Tokens touched by the last build_graph call
+        self.dirty_pairs = []  # (token0 id, token1 id) of pools updated by the last incremental build
+        # Index of all 2- and 3-hop cycles, re-scored per changed edge (see detect_short_cycles)
+        self.short_cycles = ShortCycleIndex() if short_cycles else None
+        # detection_workers > 1 shards cycle detection over a process pool (see ShardedCycleDetector)
+        self.cycle_detector = None
+        if detection_workers is not None and detection_workers > 1:
+            self.cycle_detector = ShardedCycleDetector(detection_workers, hubs=detection_hubs)
+
+        # --- Pending State ---
+        # With a pending transaction feed (or a list of router addresses to watch in the
+        # mempool), orders are re-scored on reserves with pending swaps applied before signing
+        self.pending_feed = pending_feed
 
         # --- ML Setup ---
-        self.agent = TradingAgent()
-        self.scaler = StandardScaler()
+        # A backend name from SIZING_BACKENDS or any object with
+        # get_optimal_trade_amount(state) and train(states, targets).
+        # Heavy ML dependencies are only imported by backends that need them.
+        if isinstance(sizing_backend, str):
+            sizing_backend = SIZING_BACKENDS[sizing_backend]()
+        self.agent = sizing_backend
         self.memory = deque(maxlen=1000)
-        self.scaler_fitted = False  # Flag to track if scaler has been fitted
+        # Decision-time features are stored with each executed trade, so training
+        # never has to rebuild them from present-day chain state
+        if isinstance(feature_store, str):
+            feature_store = FeatureStore(feature_store)
+        self.feature_store = feature_store
+        self.decision_states = {}  # tuple(path) -> state the last score was based on, oldest first
+        self.trained_rows = 0  # Feature store rows already used for training
+
+        # --- Trade Journal ---
+        # Executions only copy into an in-memory ring; a background thread writes
+        # the binary journal. Use data.TradeJournal.export_csv for a readable copy.
+        if isinstance(journal, str):
+            journal = TradeJournal(journal)
+        self.journal = journal
 
         # --- Logging ---
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
 
         # --- Initialize Web3 and Contract with Error Handling ---
+        # A ready-made web3/contract pair (e.g. offline stand-ins) can be injected
         try:
-            self.web3 = Web3(Web3.HTTPProvider(self.rpc_url))
+            if web3 is not None:
+                self.web3 = web3
+            elif self.rpc_provider is not None:
+                self.web3 = Web3(self.rpc_provider)
+            else:
+                self.web3 = Web3(Web3.HTTPProvider(self.rpc_url, session=self.rpc_session))
             self.account = self.web3.eth.account.from_key(self.private_key)
 
-            # Load ABI
-            with open("FlashArbitrage_ABI.json", 'r') as f:
-                contract_abi = json.load(f)
-            self.contract = self.web3.eth.contract(address=self.contract_address, abi=contract_abi)
+            if contract is None:
+                # Load ABI
+                with open("FlashArbitrage_ABI.json", 'r') as f:
+                    contract_abi = json.load(f)
+                contract = self.web3.eth.contract(address=self.contract_address, abi=contract_abi)
+            self.contract = contract
+            contract_abi = self.contract.abi
+
+            # Local nonce counter and per-block gas price cache keep RPC reads off the signing path
+            self.nonces = NonceManager(self.web3, self.account.address)
+            self.gas_oracle = GasOracle(self.web3)
+            if isinstance(self.pending_feed, (list, tuple)):
+                self.pending_feed = MempoolFeed(self.web3, self.pending_feed, post_batch=self._post_rpc_batch)
+
+            # executeArbitrage calldata is encoded from a cached template and signed locally
+            self.tx_gas_price = self.web3.to_wei('30', 'gwei')
+            self.tx_builder = TxBuilder(contract_abi, self.contract_address, self.web3.eth.chain_id, self.private_key)
 
             self.logger.info("Web3 connection and contract initialization successful.")
         except Exception as e:
             self.logger.error(f"Error initializing Web3 or contract: {str(e)}")
             raise  # Re-raise exception to prevent further execution if initialization fails
 
-    def fetch_reserves(self):
+    @METRICS.timed("fetch_reserves")
+    def fetch_reserves(self, batch_size=None, block_number=None):
         """
         Fetch token reserves from Uniswap/Sushiswap pools.
-        Returns a dictionary of token pairs and their reserves.
+        Returns a dictionary of token pairs and their reserves; pairs whose read
+        failed map to None, so callers keep their last known state instead of
+        treating the pool as removed. Raises if the pair list itself cannot be read.
+        Within a known block (see on_new_block) each read is served from the
+        reserve cache after the first time.
         """
+        batch_size = batch_size or self.batch_size
+        if batch_size:
+            return self.fetch_reserves_batched(batch_size, block_number)
+        block_number = self.block_number if block_number is None else block_number
         try:
-            token_pairs = self.contract.functions.getTokenPairs().call()
+            token_pairs = self._fetch_token_pairs(block_number)
             reserves = {}
             for token0, token1 in token_pairs:
                 try:
-                    reserves[(token0, token1)] = self.contract.functions.getReserves(token0, token1).call()
+                    reserves[(token0, token1)] = self._cached_read(
+                        block_number, ("getReserves", token0, token1),
+                        lambda: self._call_get_reserves(token0, token1, block_number)
+                    )
                     self.logger.info(f"Fetched reserves for {token0} - {token1}")
                 except Exception as e:
+                    reserves[(token0, token1)] = None
                     self.logger.error(f"Error fetching reserves for {token0} - {token1}: {str(e)}")
             return reserves
         except Exception as e:
             self.logger.error(f"Error fetching reserves: {str(e)}")
-            return {}
+            raise
 
-    def build_graph(self):
+    def fetch_reserves_batched(self, batch_size=100, block_number=None):
+        """
+        Fetch token reserves with getReserves() reads packed into JSON-RPC batches.
+        Returns the same dictionary as fetch_reserves(). With a known block the
+        calls are pinned to it and only pairs missing from the cache are requested.
+        """
+        block_number = self.block_number if block_number is None else block_number
+        block_identifier = "latest" if block_number is None else hex(block_number)
+        try:
+            token_pairs = self._fetch_token_pairs(block_number)
+            fn_abi = self.contract.get_function_by_name("getReserves").abi
+            output_types = [output['type'] for output in fn_abi['outputs']]
+
+            reserves = {}  # Pairs stay None until a valid reserve read arrives for them
+            missing = []
+            for token0, token1 in token_pairs:
+                cached = None if block_number is None else self.reserve_cache.get((block_number, "getReserves", token0, token1))
+                reserves[(token0, token1)] = cached
+                if cached is None:
+                    missing.append((token0, token1))
+
+            for start in range(0, len(missing), batch_size):
+                chunk = missing[start:start + batch_size]
+                payload = [
+                    {
+                        "jsonrpc": "2.0",
+                        "id": request_id,
+                        "method": "eth_call",
+                        "params": [
+                            {"to": self.contract_address, "data": self._encode_call("getReserves", [token0, token1])},
+                            block_identifier,
+                        ],
+                    }
+                    for request_id, (token0, token1) in enumerate(chunk)
+                ]
+                try:
+                    responses = self._post_rpc_batch(payload)
+                except Exception as e:
+                    self.logger.error(f"Error fetching reserve batch at offset {start}: {str(e)}")
+                    continue
+
+                for response in responses:
+                    request_id = response.get("id") if isinstance(response, dict) else None
+                    if not isinstance(request_id, int) or not 0 <= request_id < len(chunk):
+                        self.logger.error(f"Skipping malformed batch response at offset {start}: {response}")
+                        continue
+                    token0, token1 = chunk[request_id]
+                    if "error" in response or "result" not in response:
+                        self.logger.error(f"Error fetching reserves for {token0} - {token1}: {response.get('error')}")
+                        continue
+                    try:
+                        reserves[(token0, token1)] = list(self._decode_result(output_types, response["result"]))
+                        if block_number is not None:
+                            self.reserve_cache.put((block_number, "getReserves", token0, token1), reserves[(token0, token1)])
+                    except Exception as e:
+                        self.logger.error(f"Error decoding reserves for {token0} - {token1}: {str(e)}")
+                self.logger.info(f"Fetched reserves for {len(chunk)} pairs in one batch")
+            return reserves
+        except Exception as e:
+            self.logger.error(f"Error fetching reserves: {str(e)}")
+            raise
+
+    def _fetch_token_pairs(self, block_number):
+        def fetch():
+            METRICS.inc("rpc_calls")
+            return self.contract.functions.getTokenPairs().call(block_identifier=self._block_identifier(block_number))
+        return self._cached_read(block_number, ("getTokenPairs",), fetch)
+
+    def _call_get_reserves(self, token0, token1, block_number=None):
+        METRICS.inc("rpc_calls")
+        return self.contract.functions.getReserves(token0, token1).call(block_identifier=self._block_identifier(block_number))
+
+    @staticmethod
+    def _block_identifier(block_number):
+        # Reads cached under a block must be made at that block, not at whatever "latest" is by then
+        return "latest" if block_number is None else block_number
+
+    def _cached_read(self, block_number, key, fetch):
+        """Serve a read from the per-block cache; without a known block it always goes to the node."""
+        if block_number is None:
+            return fetch()
+        return self.reserve_cache.get_or_fetch((block_number,) + key, fetch)
+
+    def _post_rpc_batch(self, payload):
+        """Send a JSON-RPC batch request and return the list of responses."""
+        if self.rpc_provider is not None:
+            responses = self.rpc_provider.request(payload)
+        else:
+            METRICS.inc("rpc_calls")
+            response = self.rpc_session.post(self.rpc_url, json=payload, timeout=10)
+            response.raise_for_status()
+            responses = response.json()
+        if not isinstance(responses, list):
+            raise ValueError(f"Expected a batch response, got: {responses}")
+        return responses
+
+    def _encode_call(self, fn_name, args):
+        """ABI-encode calldata for a contract function (web3 v5 and v6 spellings)."""
+        if hasattr(self.contract, "encode_abi"):
+            return self.contract.encode_abi(fn_name, args=args)
+        return self.contract.encodeABI(fn_name=fn_name, args=args)
+
+    def _decode_result(self, output_types, result):
+        """ABI-decode an eth_call hex result (web3 v5 and v6 spellings)."""
+        data = Web3.to_bytes(hexstr=result) if hasattr(Web3, "to_bytes") else Web3.toBytes(hexstr=result)
+        if hasattr(self.web3.codec, "decode"):
+            return self.web3.codec.decode(output_types, data)
+        return self.web3.codec.decode_abi(output_types, data)
+
+    def on_new_block(self, block_number):
+        """Notify per-block caches that a new block has arrived."""
+        self.block_number = block_number
+        self.gas_oracle.on_block(block_number)
+        if hasattr(self.pending_feed, "on_block"):
+            self.pending_feed.on_block(block_number)
+
+    @METRICS.timed("build_graph")
+    def build_graph(self, incremental=None, reserves=None):
         """
         Build the arbitrage graph using token pairs and their reserves.
         Uses log prices to prevent numerical overflow.
+        In incremental mode only the edges whose reserves changed are touched;
+        either way self.dirty_tokens holds the tokens affected by this build.
+        Reserves already fetched by the caller can be passed in directly. Pairs
+        mapped to None (failed reads) keep the reserves of the previous build.
         """
+        incremental = self.incremental if incremental is None else incremental
         try:
-            self.arbitrage_graph.clear()
-            reserves = self.fetch_reserves()
-            for (token0, token1), (reserve0, reserve1, _) in reserves.items():
-                log_price = Decimal(reserve1) / Decimal(reserve0)
-                log_price = log_price.ln()
-                self.arbitrage_graph.add_edge(token0, token1, weight=-float(log_price))
-                self.arbitrage_graph.add_edge(token1, token0, weight=float(log_price))
-            self.logger.info("Graph built successfully")
+            if reserves is None:
+                reserves = self.fetch_reserves()
+            if incremental:
+                self.dirty_tokens = self._apply_reserve_diff(reserves)
+            else:
+                # Pairs whose read failed are rebuilt from the previous snapshot, not dropped
+                self.arbitrage_graph.set_pools(
+                    (token0, token1, values[0], values[1])
+                    for (token0, token1), values in (
+                        (pair, values if values is not None else self.reserve_snapshot.get(pair))
+                        for pair, values in reserves.items()
+                    ) if values is not None
+                )
+                self.dirty_tokens = set(self.arbitrage_graph.nodes)
+            if self.short_cycles is not None:
+                self.short_cycles.refresh(self.arbitrage_graph, self.dirty_pairs if incremental else None)
+            self.reserve_snapshot = {
+                pair: (r[0], r[1]) if r is not None else self.reserve_snapshot[pair]
+                for pair, r in reserves.items()
+                if r is not None or pair in self.reserve_snapshot
+            }
+            self.logger.info(f"Graph built successfully ({len(self.dirty_tokens)} dirty tokens)")
             return True
         except Exception as e:
             self.logger.error(f"Error building graph: {str(e)}")
             return False
 
-    def detect_arbitrage(self):
+    def _apply_reserve_diff(self, reserves):
+        """
+        Update the graph in place from the reserves that changed since the last snapshot.
+        Returns the set of tokens whose edges were added, updated or removed.
         """
-        Detect arbitrage opportunities using Bellman-Ford algorithm.
-        Returns list of negative cycles.
+        dirty = set()
+        self.dirty_pairs = []
+        for (token0, token1), values in reserves.items():
+            if values is None:
+                continue  # Read failed: keep the pool as it was
+            reserve0, reserve1 = values[0], values[1]
+            if self.reserve_snapshot.get((token0, token1)) == (reserve0, reserve1):
+                continue
+            self.arbitrage_graph.set_pool(token0, token1, reserve0, reserve1)
+            self.dirty_pairs.append((self.arbitrage_graph.tokens.get(token0), self.arbitrage_graph.tokens.get(token1)))
+            dirty.update((token0, token1))
+
+        for token0, token1 in self.reserve_snapshot.keys() - reserves.keys():
+            self.arbitrage_graph.remove_pool(token0, token1)
+            dirty.update((token0, token1))
+        self.arbitrage_graph.commit()
+        return dirty
+
+    @METRICS.timed("detect_arbitrage")
+    def detect_arbitrage(self, sources=None, top_k=None, min_hops=None):
+        """
+        Detect arbitrage opportunities with a super-source Bellman-Ford search that runs
+        until no negative cycle is left among the unreported hops (see
+        TokenGraph.find_negative_cycles); cycles are deduplicated by canonical rotation. Pass sources (e.g. self.dirty_tokens) to
+        keep only cycles through those tokens, top_k to keep the most profitable, and
+        min_hops to skip short cycles already reported by detect_short_cycles.
+        Returns list of negative cycles, each closed as [a, b, ..., a], best first.
         """
         try:
-            negative_cycles = []
-            for node in self.arbitrage_graph.nodes:
-                try:
-                    cycle = nx.find_negative_cycle(self.arbitrage_graph, source=node)
-                    if cycle:
-                        negative_cycles.append(cycle)
-                except nx.NetworkXNoCycle:
+            graph = self.arbitrage_graph
+            if graph.num_edges == 0:
+                return []
+            if sources is not None:
+                sources = {graph.tokens.get(token) for token in sources}
+
+            # Without filters top_k also ends the search early
+            max_cycles = top_k if sources is None and min_hops is None else None
+            if self.cycle_detector is not None:
+                cycles = self.cycle_detector.negative_cycles(graph, max_cycles)
+            else:
+                cycles = graph.negative_cycles(max_cycles)
+
+            scored = []
+            for cycle in cycles:
+                if sources is not None and sources.isdisjoint(cycle):
+                    continue
+                if min_hops is not None and len(cycle) < min_hops:
                     continue
-            return negative_cycles
+                total = graph.cycle_weight(cycle)
+                if total < 0:
+                    path = [graph.tokens.address(i) for i in cycle]
+                    scored.append((total, path + path[:1]))
+            scored.sort(key=lambda item: item[0])
+            if top_k is not None:
+                scored = scored[:top_k]
+            METRICS.inc("cycles_found", len(scored))
+            return [path for _, path in scored]
         except Exception as e:
             self.logger.error(f"Error detecting arbitrage: {str(e)}")
             return []
 
-    def get_current_state(self, path):
-        """Get current state for ML agent"""
+    @METRICS.timed("detect_short_cycles")
+    def detect_short_cycles(self, sources=None, top_k=None):
+        """
+        Fast path: profitable 2- and 3-hop cycles straight from the short-cycle index,
+        which build_graph keeps current. Same filters and result shape as detect_arbitrage.
+        """
+        if self.short_cycles is None:
+            return []
+        try:
+            graph = self.arbitrage_graph
+            if sources is not None:
+                sources = np.array([graph.tokens.get(token) for token in sources], dtype=np.int64)
+            ids = self.short_cycles.profitable(sources=sources)
+            if top_k is not None:
+                ids = ids[:top_k]
+            paths = []
+            for cycle_id in ids.tolist():
+                path = [graph.tokens.address(i) for i in self.short_cycles.cycle(cycle_id)]
+                paths.append(path + path[:1])
+            METRICS.inc("cycles_found", len(paths))
+            return paths
+        except Exception as e:
+            self.logger.error(f"Error detecting short cycles: {str(e)}")
+            return []
+
+    def get_current_state(self, path, gas_price=None, graph=None):
+        """Get current state for ML agent, from `graph` (default: the live graph)"""
         # Features:
         # 1. Available liquidity
         # 2. Current gas prices
@@ -122,9 +419,9 @@ class ArbitrageAgent:
         # 4. Path complexity
         try:
             state = {
-                'liquidity': self.get_path_liquidity(path),
-                'gas_price': self.web3.eth.gasPrice,
-                'price_impact': self.calculate_price_impact(path),
+                'liquidity': self.get_path_liquidity(path, graph),
+                'gas_price': self.gas_oracle.gas_price() if gas_price is None else gas_price,
+                'price_impact': self.calculate_price_impact(path, graph),
                 'path_length': len(path)
             }
             return state
@@ -132,137 +429,265 @@ class ArbitrageAgent:
             self.logger.error(f"Error getting current state: {str(e)}")
             return None
 
-    def get_path_liquidity(self, path):
+    def get_path_liquidity(self, path, graph=None):
         """Calculate available liquidity for the path"""
+        graph = self.arbitrage_graph if graph is None else graph
         try:
             total_liquidity = 0
             for i in range(len(path) - 1):
                 pair = (path[i], path[i + 1])
-                if pair in self.arbitrage_graph.edges():
-                    total_liquidity += self.arbitrage_graph.edges[pair]['weight']  # Corrected to 'weight' instead of 'liquidity'
+                if graph.has_edge(*pair):
+                    total_liquidity += graph.weight(*pair)  # Corrected to 'weight' instead of 'liquidity'
             return total_liquidity
         except Exception as e:
             self.logger.error(f"Error calculating path liquidity: {str(e)}")
             return 0
 
-    def calculate_price_impact(self, path):
+    def calculate_price_impact(self, path, graph=None):
         """Calculate expected price impact for the path"""
+        graph = self.arbitrage_graph if graph is None else graph
         try:
             impact = 0
             for i in range(len(path) - 1):
                 pair = (path[i], path[i + 1])
-                if pair in self.arbitrage_graph.edges():
-                    impact += self.arbitrage_graph.edges[pair]['weight']
+                if graph.has_edge(*pair):
+                    impact += graph.weight(*pair)
             return impact
         except Exception as e:
             self.logger.error(f"Error calculating price impact: {str(e)}")
             return 0
 
-    def execute_arbitrage(self, path):
-        """Execute arbitrage with ML-optimized amount"""
+    def score_path(self, path):
+        """Get the ML-optimized trade amount for a path, or None."""
+        if hasattr(self.agent, "size_paths"):
+            amount = self.agent.size_paths(self.arbitrage_graph, [path])[0]
+            if amount is None:
+                self.logger.warning("Path is not profitable at any size. Aborting arbitrage.")
+            return amount
+
+        state = self.get_current_state(path)
+        if state is None:
+            self.logger.warning("Could not get current state. Aborting arbitrage.")
+            return None
+        self.decision_states[tuple(path)] = state
+
+        amount = self.agent.get_optimal_trade_amount(state)
+        if amount is None:
+            self.logger.warning("Could not get optimal trade amount. Aborting arbitrage.")
+        return amount
+
+    @METRICS.timed("score_paths")
+    def score_paths(self, paths, graph=None):
+        """
+        Score every candidate path of a block in one backend call.
+        Gas price is read once for the whole batch. Returns amounts aligned with
+        paths, None where a path could not be scored. Pass a graph snapshot to
+        score on the block the paths were detected on rather than the live graph.
+        """
+        if not paths:
+            return []
+        graph = self.arbitrage_graph if graph is None else graph
+        if hasattr(self.agent, "size_paths"):
+            # Reserve-based backends size straight from the graph, no ML state needed
+            return self.agent.size_paths(graph, paths)
         try:
-            # Get current state
-            state = self.get_current_state(path)
-            if state is None:
-                self.logger.warning("Could not get current state. Aborting arbitrage.")
-                return None
+            gas_price = self.gas_oracle.gas_price()
+        except Exception as e:
+            self.logger.error(f"Error getting gas price: {str(e)}")
+            return [None] * len(paths)
+        states = [self.get_current_state(path, gas_price, graph) for path in paths]
+        # Merge rather than replace: batches of other blocks may not have been executed yet
+        for path, state in zip(paths, states):
+            if state is not None:
+                self.decision_states.pop(tuple(path), None)
+                self.decision_states[tuple(path)] = state
+        while len(self.decision_states) > self.MAX_DECISION_STATES:
+            # States of paths that were scored but never sent
+            self.decision_states.pop(next(iter(self.decision_states)), None)
+        if hasattr(self.agent, "get_optimal_trade_amounts"):
+            return self.agent.get_optimal_trade_amounts(states)
+        return [self.agent.get_optimal_trade_amount(state) for state in states]
+
+    @METRICS.timed("pending_rescore")
+    def still_profitable(self, orders, graph=None):
+        """
+        Re-score (path, amount) orders with the pending swaps of the mempool feed
+        applied, on the reserves of `graph` (pass the snapshot the orders were
+        scored on; default: the live graph). Returns a keep flag per order;
+        everything is kept when there is no feed or the feed cannot be read.
+        """
+        if self.pending_feed is None or not orders:
+            return [True] * len(orders)
+        try:
+            swaps = [swap for swap in map(decode_swap, self.pending_feed.pending()) if swap is not None]
+            # A fresh copy per call: batches of different blocks may be executed concurrently
+            simulator = PendingStateSimulator()
+            simulator.load(self.arbitrage_graph if graph is None else graph)
+            simulator.apply(swaps)
+            keep = (simulator.profits(orders) > 0).tolist()
+        except Exception as e:
+            self.logger.error(f"Error simulating pending state: {str(e)}")
+            return [True] * len(orders)
+        METRICS.inc("orders_dropped_pending", keep.count(False))
+        return keep
 
-            # Get optimal trade amount from ML agent
-            amount = self.agent.get_optimal_trade_amount(state)
+    def execute_arbitrage(self, path, amount=None):
+        """Execute arbitrage with ML-optimized amount (or an amount already scored by the caller)"""
+        try:
             if amount is None:
-                self.logger.warning("Could not get optimal trade amount. Aborting arbitrage.")
+                amount = self.score_path(path)
+                if amount is None:
+                    return None
+            if int(amount) <= 0:
+                self.logger.warning(f"Trade amount {amount} is not positive. Aborting arbitrage.")
+                return None
+            if not self.still_profitable([(path, amount)])[0]:
+                self.logger.warning("Path is not profitable after pending swaps. Aborting arbitrage.")
                 return None
 
             # Execute transaction
-            tx = self.contract.functions.executeArbitrage(
-                path,
-                int(amount)  # Amount has to be an integer
-            ).build_transaction({
-                'from': self.account.address,
-                'gas': 500000,
-                'gasPrice': self.web3.to_wei('30', 'gwei'),
-                'nonce': self.web3.eth.get_transaction_count(self.account.address),
-            })
-
-            signed_tx = self.web3.eth.account.sign_transaction(tx, self.private_key)
-            tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
-
-            # Log trade data for ML training
-            self.log_trade_data(path, amount, tx_hash)
-
+            nonce = self.nonces.next()
+            try:
+                with METRICS.span("sign"):
+                    tx = self.tx_builder.build(path, int(amount), nonce, self.tx_gas_price)  # Amount has to be an integer
+                    raw_tx = self.tx_builder.sign(tx)
+                with METRICS.span("send"):
+                    tx_hash = self.web3.eth.send_raw_transaction(raw_tx)
+                METRICS.inc("txs_sent")
+            except Exception:
+                # The nonce may or may not have been consumed; resync before the next transaction
+                self.nonces.reset()
+                raise
+
+            self._record_execution(path, amount, tx_hash)
             return tx_hash
         except Exception as e:
             self.logger.error(f"Error executing arbitrage: {str(e)}")
             return None
 
+    def execute_arbitrage_batch(self, orders, graph=None):
+        """
+        Execute several already-scored (path, amount) orders: orders without a
+        positive integer amount, and orders that pending swaps would make
+        unprofitable, are dropped; the rest are signed and then sent in nonce order.
+        Returns tx hashes aligned with orders, None for orders that were not sent.
+        graph is the snapshot the orders were scored on, for the pending re-score.
+        """
+        tx_hashes = [None] * len(orders)
+        # One unencodable amount would otherwise fail the whole batch and reset the nonces
+        sized = [i for i, (_, amount) in enumerate(orders) if amount is not None and int(amount) > 0]
+        if len(sized) < len(orders):
+            self.logger.warning(f"Dropping {len(orders) - len(sized)} orders without a positive amount")
+        profitable = self.still_profitable([orders[i] for i in sized], graph)
+        keep = [i for i, ok in zip(sized, profitable) if ok]
+        if not keep:
+            return tx_hashes
+        try:
+            nonces = [self.nonces.next() for _ in keep]
+            with METRICS.span("sign"):
+                raw_txs = self.tx_builder.build_and_sign_batch(
+                    [(orders[i][0], int(orders[i][1])) for i in keep], nonces, self.tx_gas_price
+                )
+        except Exception as e:
+            self.nonces.reset()
+            self.logger.error(f"Error signing arbitrage batch: {str(e)}")
+            return tx_hashes
+
+        for i, raw_tx in zip(keep, raw_txs):
+            path, amount = orders[i]
+            try:
+                with METRICS.span("send"):
+                    tx_hash = self.web3.eth.send_raw_transaction(raw_tx)
+            except Exception as e:
+                # Every later transaction would sit behind a nonce gap, so stop and resync
+                self.nonces.reset()
+                self.logger.error(f"Error executing arbitrage: {str(e)}")
+                break
+            tx_hashes[i] = tx_hash
+            METRICS.inc("txs_sent")
+            self._record_execution(path, amount, tx_hash)
+        return tx_hashes
+
+    def _record_execution(self, path, amount, tx_hash):
+        """Journal a sent trade and store the features it was sized on."""
+        # Log trade data for ML training
+        self.log_trade_data(path, amount, tx_hash)
+        state = self.decision_states.pop(tuple(path), None)
+        if state is not None:
+            self.feature_store.append(state, amount)
+
     def log_trade_data(self, path, amount, tx_hash):
         """Log trade data for ML training"""
         try:
-            with open("arbitrage_logs.csv", "a", newline='') as f:
-                writer = csv.writer(f)
-                if f.tell() == 0:
-                    writer.writerow(["path", "amount", "tx_hash", "gas_used", "profit"])
-                writer.writerow([path, amount, tx_hash, 0, 0])
+            self.journal.record(path, amount, tx_hash, gas_used=0, profit=0)
         except Exception as e:
             self.logger.error(f"Error logging trade data: {str(e)}")
 
-    def train_model(self, epochs=10):
-        """Train the model with historical data"""
+    def close(self):
+        """Flush buffered features and trade records to disk."""
+        self.feature_store.flush()
+        self.journal.close()
+        self.tx_builder.close()
+        if self.cycle_detector is not None:
+            self.cycle_detector.close()
+        if hasattr(self.pending_feed, "close"):
+            self.pending_feed.close()
+        if self.rpc_provider is not None:
+            self.rpc_provider.close()
+
+    def train_model(self, epochs=10, incremental=False):
+        """
+        Train the model on decision-time features from the feature store.
+        With incremental=True only rows added since the last training run are used.
+        """
         try:
-            # Load data from CSV
-            df = pd.read_csv("arbitrage_logs.csv")
+            start_row = self.trained_rows if incremental else 0
+            states, targets = self.feature_store.load(start_row)
 
-            # Check if the DataFrame is empty or has no data
-            if df.empty:
-                self.logger.warning("No training data available in arbitrage_logs.csv.")
+            # Check if the store is empty or has no new data
+            if len(states) == 0:
+                self.logger.warning("No training data available in the feature store.")
                 return
 
-            # Prepare training data
-            states = []
-            targets = []
-
-            for index, row in df.iterrows():
-                path = eval(row['path'])  # Convert string representation of list to actual list
-                amount = row['amount']
-                state = self.get_current_state(path)
-
-                if state is None:
-                    self.logger.warning(f"Skipping training data due to None state for path: {path}")
-                    continue
-
-                states.append(list(state.values()))
-                targets.append(amount)
-
-            if not states:
-                self.logger.warning("No valid training data found after processing CSV.")
+            # Train the model; rows only count as used once training on them succeeded
+            if not self.agent.train(states, targets, epochs=epochs):
+                self.logger.error("Model training failed; rows will be retried on the next run.")
                 return
+            self.trained_rows = start_row + len(states)
+            self.logger.info(f"Model training complete ({len(states)} rows).")
 
-            # Fit scaler only if it hasn't been fitted before
-            if not self.scaler_fitted:
-                self.scaler.fit(states)
-                self.scaler_fitted = True
-                self.logger.info("Scaler fitted with training data.")
-            else:
-                self.logger.info("Scaler already fitted, using existing scaler.")
-
-            # Train the model
-            self.agent.train(states, targets)
-            self.logger.info("Model training complete.")
-
-        except FileNotFoundError:
-            self.logger.warning("The file 'arbitrage_logs.csv' was not found. Skipping model training.")
         except Exception as e:
             self.logger.error(f"Error during model training: {str(e)}")
 
 
 class TradingAgent:
+    """Keras trade-sizing backend. TensorFlow and scikit-learn are imported on first use."""
+
     def __init__(self):
-        # Initialize ML model
-        self.model = self.build_model()
-        self.scaler = StandardScaler()
+        self._model = None
+        self._scaler = None
+        self.scaler_fitted = False  # Flag to track if scaler has been fitted
+        self.inference = None  # NumpyMLP once exported; replaces Keras predict
         self.memory = deque(maxlen=1000)
 
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self.build_model()
+        return self._model
+
+    @property
+    def scaler(self):
+        if self._scaler is None:
+            from sklearn.preprocessing import StandardScaler
+
+            self._scaler = StandardScaler()
+        return self._scaler
+
     def build_model(self):
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import Dense
+
         model = Sequential()
         model.add(Dense(64, input_dim=4, activation='relu'))
         model.add(Dense(32, activation='relu'))
@@ -272,42 +697,74 @@ class TradingAgent:
 
     def get_optimal_trade_amount(self, state):
         """Get optimal trade amount based on the given state."""
-        try:
-            # Ensure the state is not None and has the correct keys
-            if state is None:
-                print("Warning: Received None state in get_optimal_trade_amount.")
-                return None  # Or a default value if appropriate
+        return self.get_optimal_trade_amounts([state])[0]
 
-            # Convert state to a list of values
-            state_values = list(state.values())
+    def get_optimal_trade_amounts(self, states):
+        """
+        Get optimal trade amounts for a batch of states with a single model call.
+        Returns a list aligned with states, None for states that are missing or malformed.
+        """
+        amounts = [None] * len(states)
+        try:
+            rows, valid = [], []
+            for i, state in enumerate(states):
+                # Ensure the state is not None and has the correct keys
+                if state is None:
+                    print("Warning: Received None state in get_optimal_trade_amount.")
+                    continue
 
-            # Ensure the list has the expected length
-            if len(state_values) != 4:
-                print(f"Warning: Unexpected state length ({len(state_values)}). Expected 4.")
-                return None  # Or a default value
+                # Convert state to a list of values
+                state_values = list(state.values())
 
-            # Reshape the state values into a 2D array before scaling
-            state_array = np.array(state_values).reshape(1, -1)
+                # Ensure the list has the expected length
+                if len(state_values) != 4:
+                    print(f"Warning: Unexpected state length ({len(state_values)}). Expected 4.")
+                    continue
+                rows.append(state_values)
+                valid.append(i)
 
-            # Transform the state using the scaler
-            state_scaled = self.scaler.transform(state_array)
+            if not rows:
+                return amounts
+            state_array = np.array(rows, dtype=np.float64)
 
-            # Make a prediction using the model
-            prediction = self.model.predict(state_scaled)
+            with METRICS.span("model_predict"):
+                if self.inference is not None:
+                    # Exported NumPy network: scaler and layers as plain matrix multiplies
+                    predictions = self.inference.predict(state_array)
+                else:
+                    state_scaled = self.scaler.transform(state_array)
+                    predictions = self.model.predict(state_scaled, verbose=0)[:, 0]
 
-            # Return the predicted trade amount (scalar value)
-            return prediction[0][0]
+            for i, prediction in zip(valid, predictions.tolist()):
+                amounts[i] = prediction
+            return amounts
 
         except Exception as e:
             print(f"Error in get_optimal_trade_amount: {e}")
-            return None  # It's good to return None if something goes wrong
+            return amounts  # It's good to return None if something goes wrong
 
-    def train(self, states, targets):
+    def export_inference(self, path=None):
+        """
+        Export the trained network and scaler to a NumPy-only inference path and
+        use it for all further predictions. Optionally save it to an .npz file.
+        """
+        self.inference = NumpyMLP.from_keras(self.model, self.scaler if self.scaler_fitted else None)
+        if path is not None:
+            self.inference.save(path)
+        return self.inference
+
+    def load_inference(self, path):
+        """Use a previously exported .npz network; TensorFlow is never imported."""
+        self.inference = NumpyMLP.load(path)
+        return self.inference
+
+    def train(self, states, targets, epochs=10):
+        """Fit the model on (states, targets). Returns True if training succeeded."""
         try:
             # Check if there's any states data
-            if not states:
+            if len(states) == 0:
                 print("Warning: No states data provided for training.")
-                return
+                return False
 
             # Convert lists to numpy arrays
             states = np.array(states)
@@ -316,15 +773,97 @@ class TradingAgent:
             # Check for mismatched dimensions
             if states.shape[0] != targets.shape[0]:
                 print(f"Dimension mismatch: states shape {states.shape}, targets shape {targets.shape}")
-                return
+                return False
+
+            # Fit scaler only if it hasn't been fitted before
+            if not self.scaler_fitted:
+                self.scaler.fit(states)
+                self.scaler_fitted = True
+                print("Scaler fitted with training data.")
 
             # Scale the states
             states_scaled = self.scaler.transform(states)
 
             # Train the model
-            self.model.fit(states_scaled, targets, epochs=10, verbose=0)
+            self.model.fit(states_scaled, targets, epochs=epochs, verbose=0)
+
+            # Keep an exported NumPy network in sync with the new weights
+            if self.inference is not None:
+                self.export_inference()
 
             print("Model training completed successfully.")
+            return True
 
         except Exception as e:
             print(f"Error during model training: {e}")
+            return False
+
+
+class NumpyMLP:
+    """
+    NumPy forward pass of the sizing network: ReLU hidden layers, linear output.
+    The StandardScaler is folded in as a mean/scale pair, so scoring needs
+    neither TensorFlow nor scikit-learn.
+    """
+
+    def __init__(self, weights, biases, mean=None, scale=None):
+        self.weights = [np.asarray(w, dtype=np.float64) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float64) for b in biases]
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+
+    @classmethod
+    def from_keras(cls, model, scaler=None):
+        params = model.get_weights()
+        return cls(params[0::2], params[1::2],
+                   None if scaler is None else scaler.mean_,
+                   None if scaler is None else scaler.scale_)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            layers = int(data["layers"])
+            return cls([data[f"w{i}"] for i in range(layers)], [data[f"b{i}"] for i in range(layers)],
+                       data["mean"] if "mean" in data else None, data["scale"] if "scale" in data else None)
+
+    def save(self, path):
+        arrays = {"layers": np.array(len(self.weights))}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"w{i}"], arrays[f"b{i}"] = w, b
+        if self.mean is not None:
+            arrays["mean"], arrays["scale"] = self.mean, self.scale
+        np.savez(path, **arrays)
+
+    def predict(self, states):
+        """Predict one amount per row of a (n, 4) state array."""
+        x = np.asarray(states, dtype=np.float64)
+        if self.mean is not None:
+            x = (x - self.mean) / self.scale
+        for w, b in zip(self.weights[:-1], self.biases[:-1]):
+            x = np.maximum(x @ w + b, 0.0)
+        return (x @ self.weights[-1] + self.biases[-1])[:, 0]
+
+
+class FixedTradeSizer:
+    """Non-ML trade-sizing backend that always returns the same amount."""
+
+    def __init__(self, amount=10**18):
+        self.amount = amount
+
+    def get_optimal_trade_amount(self, state):
+        if state is None:
+            return None
+        return self.amount
+
+    def get_optimal_trade_amounts(self, states):
+        return [self.get_optimal_trade_amount(state) for state in states]
+
+    def train(self, states, targets, epochs=10):
+        return True  # Nothing to learn
+
+
+SIZING_BACKENDS = {
+    "keras": TradingAgent,
+    "fixed": FixedTradeSizer,
+    "constant_product": ConstantProductSolver,
+}
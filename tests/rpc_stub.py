@@ -0,0 +1,103 @@
+"""
+Local stand-in JSON-RPC node for tests.
+
+StubRPCNode serves JSON-RPC over HTTP on 127.0.0.1 from a background thread.
+Requests (single or batched) are answered by `answer(request)`, which tests
+override or replace; the default serves a pool contract's getTokenPairs() and
+getReserves(address,address) from `pairs` / `reserves`, plus the few eth_*
+methods ArbitrageAgent reads at startup.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import decode, encode
+from eth_utils import keccak
+
+GET_TOKEN_PAIRS = keccak(text="getTokenPairs()")[:4]
+GET_RESERVES = keccak(text="getReserves(address,address)")[:4]
+
+
+def result(request, value):
+    return {"jsonrpc": "2.0", "id": request["id"], "result": value}
+
+
+def error(request, message, code=-32000):
+    return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": code, "message": message}}
+
+
+class StubRPCNode:
+    """Threaded JSON-RPC server; every request and batch it receives is logged in `received`."""
+
+    def __init__(self, pairs=(), reserves=None, delay=0.0, block_number=1000):
+        self.pairs = [tuple(pair) for pair in pairs]
+        self.reserves = dict(reserves or {})  # (token0, token1) -> (reserve0, reserve1, timestamp)
+        self.reverting = set()  # Pairs whose getReserves call reverts
+        self.delay = delay
+        self.block_number = block_number
+        self.received = []  # Decoded request bodies, in arrival order
+        self.rewrite_batch = None  # Optional callable(responses) -> responses for batch replies
+        self._lock = threading.Lock()
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with node._lock:
+                    node.received.append(request)
+                if node.delay:
+                    time.sleep(node.delay)
+                if isinstance(request, list):
+                    body = [node.answer(item) for item in request]
+                    if node.rewrite_batch is not None:
+                        body = node.rewrite_batch(body)
+                else:
+                    body = node.answer(request)
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def answer(self, request):
+        method, params = request["method"], request.get("params", [])
+        if method == "eth_call":
+            return self.call(request, bytes.fromhex(params[0]["data"][2:]))
+        static = {
+            "eth_chainId": hex(1337),
+            "eth_blockNumber": hex(self.block_number),
+            "eth_gasPrice": hex(30 * 10**9),
+            "eth_getTransactionCount": hex(0),
+            "net_version": "1337",
+        }
+        if method in static:
+            return result(request, static[method])
+        return error(request, "method not found", code=-32601)
+
+    def call(self, request, data):
+        if data[:4] == GET_TOKEN_PAIRS:
+            return result(request, "0x" + encode(["address[2][]"], [self.pairs]).hex())
+        if data[:4] == GET_RESERVES:
+            pair = tuple(token.lower() for token in decode(["address", "address"], data[4:]))
+            if pair in self.reverting or pair not in self.reserves:
+                return error(request, "execution reverted", code=3)
+            return result(request, "0x" + encode(["uint112", "uint112", "uint32"], list(self.reserves[pair])).hex())
+        return error(request, "execution reverted", code=3)
+
+    def batches(self):
+        """Batch requests received so far."""
+        with self._lock:
+            return [request for request in self.received if isinstance(request, list)]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,141 @@
+import time
+
+import pytest
+
+from data.HedgedProvider import HedgedHTTPProvider
+from rpc_stub import StubRPCNode, error, result
+
+
+def block_number(request_id=1):
+    return {"jsonrpc": "2.0", "id": request_id, "method": "eth_blockNumber", "params": []}
+
+
+def eth_call(request_id=1):
+    return {"jsonrpc": "2.0", "id": request_id, "method": "eth_call",
+            "params": [{"to": "0x" + "00" * 20, "data": "0xdeadbeef"}, "latest"]}
+
+
+@pytest.fixture
+def nodes():
+    nodes = [StubRPCNode(block_number=1000), StubRPCNode(block_number=1001)]
+    yield nodes
+    for node in nodes:
+        node.close()
+
+
+@pytest.fixture
+def provider(nodes):
+    # Endpoints without samples keep their given order, so nodes[0] is asked first
+    provider = HedgedHTTPProvider([node.url for node in nodes], hedge_delay=0.05, timeout=5)
+    yield provider
+    provider.close()
+
+
+def test_fast_answer_is_not_hedged(provider, nodes):
+    assert provider.request(block_number())["result"] == hex(1000)
+
+    assert len(nodes[0].received) == 1 and nodes[1].received == []
+
+
+def test_hedge_fires_after_hedge_delay(provider, nodes):
+    nodes[0].delay = 1.0
+
+    start = time.perf_counter()
+    response = provider.request(block_number())
+    elapsed = time.perf_counter() - start
+
+    assert response["result"] == hex(1001)
+    assert 0.05 <= elapsed < 0.5
+    assert provider.stats()[nodes[1].url]["wins"] == 1
+
+
+def test_transient_error_reply_hedges_at_once_with_its_real_latency(provider, nodes):
+    nodes[0].answer = lambda request: error(request, "header not found")
+
+    start = time.perf_counter()
+    response = provider.request(block_number())
+
+    assert response["result"] == hex(1001)
+    assert time.perf_counter() - start < 0.05  # Did not wait for the hedge delay
+    stats = provider.stats()[nodes[0].url]
+    assert stats["errors"] == 1
+    assert stats["latency"] < 1.0  # An answered request is not recorded as a timeout
+
+
+def test_every_endpoint_behind_returns_the_error_reply(provider, nodes):
+    for node in nodes:
+        node.answer = lambda request: error(request, "header not found")
+
+    assert provider.request(block_number())["error"]["message"] == "header not found"
+
+
+@pytest.mark.parametrize("payload", [eth_call(), {"jsonrpc": "2.0", "id": 1, "method": "eth_unknown", "params": []}])
+def test_deterministic_error_reply_is_the_answer(provider, nodes, payload):
+    response = provider.request(payload)
+
+    assert "error" in response
+    assert nodes[1].received == []
+    stats = provider.stats()[nodes[0].url]
+    assert stats["errors"] == 0 and stats["wins"] == 1 and stats["latency"] < 1.0
+
+
+def test_batch_with_one_reverted_entry_is_returned_whole(provider, nodes):
+    response = provider.request([block_number(0), eth_call(1), block_number(2)])
+
+    assert [entry.get("result") for entry in response] == [hex(1000), None, hex(1000)]
+    assert response[1]["error"]["message"] == "execution reverted"
+    assert nodes[1].received == []
+
+
+def test_transient_entry_hedges_the_batch(provider, nodes):
+    nodes[0].answer = lambda request: (error(request, "missing trie node") if request["id"] == 1
+                                       else result(request, hex(1000)))
+
+    response = provider.request([block_number(0), block_number(1)])
+
+    assert [entry["result"] for entry in response] == [hex(1001), hex(1001)]
+
+
+def test_filter_methods_stay_on_the_pinned_endpoint(provider, nodes):
+    filters = set()
+
+    def answer(request):
+        if request["method"] == "eth_newPendingTransactionFilter":
+            filters.add("0x1")
+            return result(request, "0x1")
+        if request["method"] == "eth_getFilterChanges":
+            return result(request, []) if request["params"][0] in filters else error(request, "filter not found")
+        return StubRPCNode.answer(nodes[0], request)
+
+    nodes[0].answer = answer
+    nodes[0].delay = 0.2  # Slower than the hedge delay: filter calls must still not be hedged
+
+    filter_id = provider.make_request("eth_newPendingTransactionFilter", [])["result"]
+    polls = [provider.make_request("eth_getFilterChanges", [filter_id]) for _ in range(3)]
+
+    assert all(poll["result"] == [] for poll in polls)
+    assert provider.pinned_endpoint == nodes[0].url
+    assert len(nodes[0].received) == 4 and nodes[1].received == []
+
+
+def test_failed_pinned_endpoint_is_released(provider, nodes):
+    provider.make_request("eth_newBlockFilter", [])
+    nodes[0].close()
+
+    with pytest.raises(Exception):
+        provider.make_request("eth_getFilterChanges", ["0x1"])
+
+    assert provider.pinned_endpoint is None
+
+
+def test_raw_transaction_reaches_every_node(provider, nodes):
+    for node in nodes:
+        node.answer = lambda request: result(request, "0x" + "ab" * 32)
+
+    response = provider.make_request("eth_sendRawTransaction", ["0x1234"])
+
+    assert response["result"] == "0x" + "ab" * 32
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and not all(node.received for node in nodes):
+        time.sleep(0.01)
+    assert all(node.received[0]["method"] == "eth_sendRawTransaction" for node in nodes)
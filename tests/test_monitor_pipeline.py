@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from data.Monitoring import MonitorPipeline
+
+
+class StubGraph:
+    def __init__(self, block=None):
+        self.block = block
+
+    def snapshot(self):
+        return StubGraph(self.block)
+
+
+class StubAgent:
+    """Agent stand-in: every block yields one candidate path tagged with its block number."""
+
+    def __init__(self, build_results=None, score_delay=0.0):
+        self.arbitrage_graph = StubGraph()
+        self.dirty_tokens = set()
+        self.short_cycles = None
+        self.build_results = dict(build_results or {})  # block -> False, or an exception to raise
+        self.score_delay = score_delay
+        self.block = None
+        self.lock = threading.Lock()
+        self.fetched = []
+        self.scored = []  # (block of the paths, block of the scoring graph, block of the live graph)
+        self.executed = []
+        self.max_ahead = 0  # Most blocks fetched but not yet scored at any time
+
+    def on_new_block(self, block_number):
+        self.block = block_number
+
+    def fetch_reserves(self):
+        with self.lock:
+            self.fetched.append(self.block)
+            self.max_ahead = max(self.max_ahead, len(self.fetched) - len(self.scored))
+        return {"block": self.block}
+
+    def build_graph(self, incremental=None, reserves=None):
+        result = self.build_results.get(reserves["block"], True)
+        if isinstance(result, Exception):
+            raise result
+        if not result:
+            return False
+        self.arbitrage_graph.block = reserves["block"]
+        self.dirty_tokens = {f"token-{reserves['block']}"}
+        return True
+
+    def detect_arbitrage(self, sources=None, top_k=None, min_hops=None):
+        block = self.arbitrage_graph.block
+        return [[f"{block}", "a", f"{block}"]]
+
+    def score_paths(self, paths, graph=None):
+        time.sleep(self.score_delay)
+        with self.lock:
+            for path in paths:
+                self.scored.append((int(path[0]), graph.block, self.arbitrage_graph.block))
+        return [1.0] * len(paths)
+
+    def execute_arbitrage_batch(self, orders, graph=None):
+        self.executed.append((graph.block, [path for path, _ in orders]))
+        return [None] * len(orders)
+
+    def close(self):
+        pass
+
+
+async def blocks(numbers, interval=0.0):
+    for number in numbers:
+        yield number
+        await asyncio.sleep(interval)
+
+
+def run(pipeline, timeout=10):
+    return asyncio.run(asyncio.wait_for(pipeline.run(), timeout))
+
+
+def test_slow_scoring_applies_backpressure():
+    agent = StubAgent(score_delay=0.02)
+    pipeline = MonitorPipeline(agent, block_source=blocks(range(1, 61), interval=0.002),
+                               queue_size=1, score_concurrency=1, execute_concurrency=1)
+
+    run(pipeline)
+
+    # Fetched blocks can only run ahead of scoring by what the bounded queues and busy stages hold
+    assert agent.max_ahead <= 8
+    # Stale block notifications were dropped rather than queued up behind the slow stage
+    assert len(agent.fetched) < 60
+    assert len(agent.scored) == len(agent.fetched)
+
+
+@pytest.mark.parametrize("failure", [False, RuntimeError("node went away")])
+def test_graph_is_released_when_build_fails(failure):
+    agent = StubAgent(build_results={1: failure, 2: failure})
+    pipeline = MonitorPipeline(agent, block_source=blocks([1, 2, 3], interval=0.05))
+
+    run(pipeline)  # Would time out if a failed build kept graph_idle acquired
+
+    assert [scored for scored, _, _ in agent.scored] == [3]
+    assert agent.executed == [(3, [["3", "a", "3"]])]
+
+
+def test_each_block_is_scored_on_its_own_snapshot():
+    agent = StubAgent(score_delay=0.05)
+    pipeline = MonitorPipeline(agent, block_source=blocks(range(1, 11), interval=0.01),
+                               score_concurrency=4)
+
+    run(pipeline)
+
+    assert agent.scored
+    assert all(path_block == graph_block for path_block, graph_block, _ in agent.scored)
+    # The live graph did move on while earlier blocks were still being scored
+    assert any(live_block != graph_block for _, graph_block, live_block in agent.scored)
+    assert all(graph_block == int(paths[0][0]) for graph_block, paths in agent.executed)
+
+
+def test_recorder_writes_off_the_event_loop_in_block_order():
+    class StubRecorder:
+        def __init__(self):
+            self.records = []
+            self.closed = False
+
+        def record(self, block_number, reserves):
+            self.records.append((block_number, threading.current_thread() is threading.main_thread()))
+
+        def close(self):
+            self.closed = True
+
+    agent, recorder = StubAgent(), StubRecorder()
+    pipeline = MonitorPipeline(agent, block_source=blocks([1, 2, 3], interval=0.05), recorder=recorder)
+
+    run(pipeline)
+
+    assert recorder.records == [(1, False), (2, False), (3, False)]
+    assert recorder.closed
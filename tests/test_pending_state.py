@@ -0,0 +1,183 @@
+import time
+
+import pytest
+from eth_abi import encode
+from eth_utils import keccak
+
+from data.PendingState import ROUTER_SWAPS, MempoolFeed, decode_swap
+from synthetic_market import ROUTER_ADDRESS, StubMempool, SyntheticMarket, make_offline_agent
+
+PATH = ["0x" + f"{i:040x}" for i in (0xa1, 0xb2, 0xc3)]
+RECIPIENT = "0x" + "ee" * 20
+
+
+def router_call(signature, amount=10**18):
+    """Calldata of a router swap with `amount` in every uint256 amount slot before the path."""
+    types = signature[signature.index("(") + 1:-1].split(",")
+    values = []
+    for kind in types:
+        if kind == "address[]":
+            values.append(PATH)
+        elif kind == "address":
+            values.append(RECIPIENT)
+        else:
+            values.append(amount if "address[]" not in types[:len(values)] else 2**32)
+    return "0x" + (keccak(text=signature)[:4] + encode(types, values)).hex()
+
+
+@pytest.mark.parametrize("signature", sorted(ROUTER_SWAPS))
+def test_decode_swap_reads_every_router_layout(signature):
+    amount_word, _, exact_out = ROUTER_SWAPS[signature]
+    tx = {"to": ROUTER_ADDRESS, "input": router_call(signature, amount=12345), "value": 0}
+    if amount_word is None:
+        tx["value"] = 777
+
+    path, amount, decoded_exact_out = decode_swap(tx)
+
+    assert list(path) == PATH
+    assert amount == (777 if amount_word is None else 12345)
+    assert decoded_exact_out == exact_out
+
+
+def test_decode_swap_reads_a_hex_value_from_raw_replies():
+    signature = "swapExactETHForTokens(uint256,address[],address,uint256)"
+
+    assert decode_swap({"input": router_call(signature), "value": hex(5 * 10**17)})[1] == 5 * 10**17
+    assert decode_swap({"data": router_call(signature), "value": "0x0"}) is None
+
+
+def test_decode_swap_ignores_other_calls_and_truncated_paths():
+    signature = "swapExactTokensForTokens(uint256,uint256,address[],address,uint256)"
+
+    assert decode_swap({"input": "0xa9059cbb" + "00" * 64}) is None
+    assert decode_swap({"input": router_call(signature)[:-64]}) is None
+
+
+class StubFilter:
+    def __init__(self, batches, fail=False):
+        self.batches = list(batches)
+        self.fail = fail
+
+    def get_new_entries(self):
+        if self.fail:
+            raise ValueError("filter not found")
+        return self.batches.pop(0) if self.batches else []
+
+
+class StubEth:
+    def __init__(self, filters, txs):
+        self.filters = list(filters)
+        self.txs = txs
+        self.created = 0
+
+    def filter(self, kind):
+        assert kind == "pending"
+        self.created += 1
+        return self.filters.pop(0)
+
+    def get_transaction(self, tx_hash):
+        if tx_hash not in self.txs:
+            raise ValueError("transaction not found")
+        return self.txs[tx_hash]
+
+
+class StubWeb3:
+    def __init__(self, filters, txs):
+        self.eth = StubEth(filters, txs)
+
+
+def swap_tx(to=ROUTER_ADDRESS):
+    signature = "swapExactTokensForTokens(uint256,uint256,address[],address,uint256)"
+    return {"to": to, "input": router_call(signature), "value": 0}
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not condition():
+        time.sleep(0.005)
+    return condition()
+
+
+def test_poller_fills_the_cache_with_router_transactions():
+    hashes = [bytes([i]) * 32 for i in range(3)]
+    txs = {hashes[0]: swap_tx(), hashes[1]: swap_tx(to="0x" + "11" * 20)}  # hashes[2] is already gone
+    feed = MempoolFeed(StubWeb3([StubFilter([hashes])], txs), routers=[ROUTER_ADDRESS], poll_interval=0.01)
+    try:
+        assert wait_for(lambda: feed.pending())
+        assert feed.pending() == [txs[hashes[0]]]
+        feed.on_block(1)
+        assert feed.pending() == []
+    finally:
+        feed.close()
+
+
+def test_poller_fetches_bodies_in_one_batch():
+    hashes = [bytes([i]) * 32 for i in range(3)]
+    batches = []
+
+    def post_batch(payload):
+        batches.append(payload)
+        # Out of order, one body missing and one malformed id
+        return [{"id": 2, "result": swap_tx()}, {"id": 0, "result": None}, {"id": "1", "result": swap_tx()}]
+
+    feed = MempoolFeed(StubWeb3([StubFilter([hashes])], {}), poll_interval=0.01, post_batch=post_batch)
+    try:
+        assert wait_for(lambda: feed.pending())
+        assert len(feed.pending()) == 1
+        assert [request["params"][0] for request in batches[0]] == ["0x" + tx_hash.hex() for tx_hash in hashes]
+    finally:
+        feed.close()
+
+
+def test_poller_recreates_a_failed_filter():
+    tx_hash = b"\x07" * 32
+    web3 = StubWeb3([StubFilter([], fail=True), StubFilter([[tx_hash]])], {tx_hash: swap_tx()})
+    feed = MempoolFeed(web3, poll_interval=0.01)
+    try:
+        assert wait_for(lambda: feed.pending())
+        assert web3.eth.created == 2
+    finally:
+        feed.close()
+
+
+@pytest.fixture
+def market_agent(tmp_path):
+    market = SyntheticMarket(200, 800, num_cycles=10, edge=0.05, seed=0)
+    mempool = StubMempool(market)
+    agent = make_offline_agent(market, str(tmp_path), pending_feed=mempool)
+    agent.build_graph(incremental=False, reserves=market.reserves())
+    yield market, mempool, agent
+    agent.close()
+
+
+def scored_orders(agent):
+    paths = agent.detect_arbitrage()
+    return [(path, amount) for path, amount in zip(paths, agent.score_paths(paths)) if amount]
+
+
+def test_execute_batch_sends_every_order_without_pending_swaps(market_agent):
+    _, _, agent = market_agent
+    orders = scored_orders(agent)
+    assert len(orders) >= 2
+
+    tx_hashes = agent.execute_arbitrage_batch(orders, agent.arbitrage_graph.snapshot())
+
+    assert all(tx_hashes)
+    assert len(agent.web3.eth.sent) == len(orders)
+
+
+def test_execute_batch_drops_orders_that_pending_swaps_make_unprofitable(market_agent):
+    market, mempool, agent = market_agent
+    orders = scored_orders(agent)
+    snapshot = agent.arbitrage_graph.snapshot()
+    # A competitor dumps a pool's whole reserve into the first hop of the first order
+    target = tuple(orders[0][0][:2])
+    reserve_in = market.pools[target][0] if target in market.pools else market.pools[target[::-1]][1]
+    mempool.submit(list(target), reserve_in)
+
+    tx_hashes = agent.execute_arbitrage_batch(orders, snapshot)
+
+    assert tx_hashes[0] is None
+    hit = [i for i, (path, _) in enumerate(orders) if target in zip(path, path[1:])]
+    assert all(tx_hashes[i] is None for i in hit)
+    assert len(agent.web3.eth.sent) == sum(tx_hash is not None for tx_hash in tx_hashes) > 0
@@ -0,0 +1,153 @@
+import math
+
+import pytest
+from eth_utils import to_checksum_address
+from web3 import Web3
+
+from rpc_stub import StubRPCNode
+from synthetic_market import CONTRACT_ADDRESS, PRIVATE_KEY, STUB_ABI
+
+TOKENS = [to_checksum_address(f"0x{i:040x}") for i in range(1, 7)]
+PAIRS = [(TOKENS[0], TOKENS[1]), (TOKENS[1], TOKENS[2]), (TOKENS[2], TOKENS[0]),
+         (TOKENS[3], TOKENS[4]), (TOKENS[4], TOKENS[5])]
+
+
+def reserves_of(index, scale=1):
+    return (10**18 * (index + 1) * scale, 2 * 10**18 * (index + 1) * scale, 1_700_000_000)
+
+
+@pytest.fixture
+def node():
+    node = StubRPCNode(PAIRS, {(t0.lower(), t1.lower()): reserves_of(i) for i, (t0, t1) in enumerate(PAIRS)})
+    yield node
+    node.close()
+
+
+@pytest.fixture
+def agent(node, tmp_path):
+    from script.ArbitrageAgent import ArbitrageAgent
+
+    contract = Web3(Web3.HTTPProvider(node.url)).eth.contract(address=to_checksum_address(CONTRACT_ADDRESS), abi=STUB_ABI)
+    agent = ArbitrageAgent(
+        rpc_url=node.url,
+        contract_address=to_checksum_address(CONTRACT_ADDRESS),
+        private_key=PRIVATE_KEY,
+        batch_size=2,
+        sizing_backend="fixed",
+        feature_store=str(tmp_path / "feature_store"),
+        journal=str(tmp_path / "trade_journal.bin"),
+        contract=contract,
+    )
+    yield agent
+    agent.close()
+
+
+def test_batched_fetch_splits_into_batches(agent, node):
+    reserves = agent.fetch_reserves()
+
+    assert reserves == {pair: list(reserves_of(i)) for i, pair in enumerate(PAIRS)}
+    assert [len(batch) for batch in node.batches()] == [2, 2, 1]
+    assert all(call["params"][1] == "latest" for batch in node.batches() for call in batch)
+
+
+def test_batched_fetch_pins_known_block_and_uses_cache(agent, node):
+    agent.on_new_block(1234)
+    first = agent.fetch_reserves()
+    second = agent.fetch_reserves()
+
+    assert first == second
+    assert len(node.batches()) == 3  # The second fetch is served from the block cache
+    assert all(call["params"][1] == hex(1234) for batch in node.batches() for call in batch)
+
+
+@pytest.mark.parametrize("block_number, block_identifier", [(None, "latest"), (1234, hex(1234))])
+def test_unbatched_reads_are_made_at_the_cached_block(agent, node, block_number, block_identifier):
+    agent.batch_size = None
+    agent.on_new_block(block_number)
+
+    reserves = agent.fetch_reserves()
+
+    assert reserves == {pair: list(reserves_of(i)) for i, pair in enumerate(PAIRS)}
+    calls = [request for request in node.received if isinstance(request, dict) and request["method"] == "eth_call"]
+    assert len(calls) == len(PAIRS) + 1
+    assert all(call["params"][1] == block_identifier for call in calls)
+
+
+def test_error_entries_map_to_none(agent, node):
+    node.reverting.add(tuple(token.lower() for token in PAIRS[1]))
+
+    reserves = agent.fetch_reserves()
+
+    assert reserves[PAIRS[1]] is None
+    assert all(reserves[pair] == list(reserves_of(i)) for i, pair in enumerate(PAIRS) if i != 1)
+
+
+@pytest.mark.parametrize("bad_id", [None, "0", -1, 2, 99])
+def test_malformed_or_out_of_range_ids_are_skipped(agent, node, bad_id):
+    def rewrite(responses):
+        # Corrupt the id of the first response of the first batch only
+        if len(node.batches()) == 1:
+            responses[0] = dict(responses[0], id=bad_id)
+        return responses
+
+    node.rewrite_batch = rewrite
+
+    reserves = agent.fetch_reserves()
+
+    assert set(reserves) == set(PAIRS)
+    assert reserves[PAIRS[0]] is None
+    assert all(reserves[pair] == list(reserves_of(i)) for i, pair in enumerate(PAIRS) if i != 0)
+
+
+def test_non_dict_and_missing_result_entries_are_skipped(agent, node):
+    def rewrite(responses):
+        if len(node.batches()) == 1:
+            return ["garbage", {"jsonrpc": "2.0", "id": 1}]
+        return responses
+
+    node.rewrite_batch = rewrite
+
+    reserves = agent.fetch_reserves()
+
+    assert reserves[PAIRS[0]] is None and reserves[PAIRS[1]] is None
+    assert reserves[PAIRS[2]] == list(reserves_of(2))
+
+
+def test_failed_batch_maps_its_pairs_to_none(agent, node):
+    def rewrite(responses):
+        if len(node.batches()) == 2:
+            return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batch too large"}}
+        return responses
+
+    node.rewrite_batch = rewrite
+
+    reserves = agent.fetch_reserves()
+
+    assert reserves[PAIRS[2]] is None and reserves[PAIRS[3]] is None
+    assert reserves[PAIRS[0]] == list(reserves_of(0)) and reserves[PAIRS[4]] == list(reserves_of(4))
+
+
+def test_unreadable_pair_list_raises(agent, node):
+    node.pairs = None  # getTokenPairs can no longer be encoded: the node answers with an HTTP error
+
+    with pytest.raises(Exception):
+        agent.fetch_reserves()
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_build_graph_keeps_previous_reserves_of_failed_pairs(agent, node, incremental):
+    agent.incremental = incremental
+    assert agent.build_graph()
+    edges = agent.arbitrage_graph.num_edges
+    weight = agent.arbitrage_graph.weight(*PAIRS[1])
+
+    # Next block: every pool moves, but the read of PAIRS[1] fails
+    node.reserves = {(t0.lower(), t1.lower()): reserves_of(i, scale=3 if i % 2 else 1) for i, (t0, t1) in enumerate(PAIRS)}
+    node.reserves[(PAIRS[3][0].lower(), PAIRS[3][1].lower())] = (10**18, 5 * 10**18, 1_700_000_012)
+    node.reverting.add(tuple(token.lower() for token in PAIRS[1]))
+    assert agent.build_graph()
+
+    assert agent.arbitrage_graph.num_edges == edges
+    assert agent.arbitrage_graph.weight(*PAIRS[1]) == pytest.approx(weight)
+    assert agent.reserve_snapshot[PAIRS[1]] == tuple(reserves_of(1)[:2])
+    assert agent.arbitrage_graph.weight(*PAIRS[3]) == pytest.approx(-math.log(5))
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from data.ShardedDetector import ShardedCycleDetector
+from synthetic_market import SyntheticMarket, make_offline_agent
+
+
+@pytest.fixture(scope="module")
+def graph(tmp_path_factory):
+    market = SyntheticMarket(400, 1600, num_cycles=8, seed=0)
+    agent = make_offline_agent(market, str(tmp_path_factory.mktemp("sharded")))
+    try:
+        agent.build_graph(incremental=False, reserves=market.reserves())
+        yield agent.arbitrage_graph.snapshot()
+    finally:
+        agent.close()
+
+
+@pytest.mark.parametrize("hubs", [None, 8])
+def test_parallel_search_matches_one_process(graph, hubs):
+    inline = ShardedCycleDetector(1).negative_cycles(graph)
+    detector = ShardedCycleDetector(2, hubs=hubs, min_parallel_edges=0)
+    try:
+        assert inline
+        assert detector.negative_cycles(graph) == inline
+        assert detector.negative_cycles(graph, max_cycles=3) == ShardedCycleDetector(1).negative_cycles(graph, max_cycles=3)
+    finally:
+        detector.close()
+
+
+@pytest.mark.parametrize("hubs", [None, 8])
+def test_every_component_edge_is_relaxed_by_one_block(graph, hubs):
+    detector = ShardedCycleDetector(4, hubs=hubs)
+    giant = detector.components(graph)[0]
+    src, dst = graph.edge_endpoints()
+    nodes, local = np.unique(np.concatenate([src[giant], dst[giant]]), return_inverse=True)
+
+    owner = detector.node_blocks(graph, nodes, local[len(giant):])
+
+    assert owner.shape == (len(nodes),)
+    assert set(owner.tolist()) == {0, 1, 2, 3}
+    # Each edge is relaxed by the block of its destination, and every block gets a share of them
+    assert (np.bincount(owner[local[len(giant):]], minlength=4) > 0).all()